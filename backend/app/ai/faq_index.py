@@ -0,0 +1,154 @@
+"""In-memory BM25 search over the FAQ table.
+
+The index is built from the cached `faq` rows (see `reference_cache`) and
+kept in sync with the cache entry's `version`. When the rows change, only
+FAQs whose question or answer text changed are re-tokenized; the postings
+lists are then rebuilt from the per-document term counts, which is cheap for
+a table of this size.
+
+Text is normalized with `preprocess.clean_text` and split into word tokens.
+The question is counted twice so that it weighs more than the answer. Queries
+are scored with Okapi BM25 against the postings of their terms only, so a
+lookup touches a handful of short lists and runs without any network call.
+"""
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from .preprocess import clean_text
+
+
+K1 = 1.2
+B = 0.75
+QUESTION_WEIGHT = 2
+
+_TOKEN_RE = re.compile(r'\w+')
+_STOPWORDS = frozenset(
+    'a an and are as at be by can do does for from how i if in is it my of on or the to what when where which who why will with you your'.split()
+)
+
+_state: Dict[str, Any] = {
+    'version': None,
+    'docs': [],          # FAQ rows in index order
+    'counts': {},        # faq key -> (text signature, Counter)
+    'postings': {},      # term -> list of (doc index, term frequency)
+    'idf': {},
+    'lengths': [],
+    'avgdl': 0.0,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalizes text and splits it into index terms, dropping stopwords."""
+    return [t for t in _TOKEN_RE.findall(clean_text(text)) if t not in _STOPWORDS]
+
+
+def _doc_key(row: Dict[str, Any], position: int) -> Any:
+    return row.get('id') if row.get('id') is not None else ('pos', position)
+
+
+def _term_counts(row: Dict[str, Any]) -> Tuple[Tuple[str, str], Counter]:
+    signature = (row.get('question') or '', row.get('answer') or '')
+    counts = Counter(tokenize(signature[0]) * QUESTION_WEIGHT)
+    counts.update(tokenize(signature[1]))
+    return signature, counts
+
+
+def build(rows: List[Dict[str, Any]], version: Any = None) -> Dict[str, int]:
+    """(Re)builds the index from FAQ rows, reusing unchanged documents.
+
+    Args:
+        rows: Rows of the `faq` table.
+        version: The reference cache version the rows belong to.
+
+    Returns:
+        How many documents were re-tokenized and how many were reused.
+    """
+    previous = _state['counts']
+    counts: Dict[Any, Tuple[Tuple[str, str], Counter]] = {}
+    docs: List[Dict[str, Any]] = []
+    retokenized = 0
+    for position, row in enumerate(rows):
+        if not (row.get('question') or row.get('answer')):
+            continue
+        key = _doc_key(row, position)
+        signature = (row.get('question') or '', row.get('answer') or '')
+        cached = previous.get(key)
+        if cached is None or cached[0] != signature:
+            cached = _term_counts(row)
+            retokenized += 1
+        counts[key] = cached
+        docs.append(row)
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths: List[int] = []
+    for index, (_, term_counts) in enumerate(counts.values()):
+        lengths.append(sum(term_counts.values()))
+        for term, tf in term_counts.items():
+            postings.setdefault(term, []).append((index, tf))
+    n = len(docs)
+    _state.update(
+        version=version,
+        docs=docs,
+        counts=counts,
+        postings=postings,
+        idf={term: math.log(1.0 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in postings.items()},
+        lengths=lengths,
+        avgdl=(sum(lengths) / n) if n else 0.0,
+    )
+    return {'retokenized': retokenized, 'reused': len(docs) - retokenized}
+
+
+def sync(rows: List[Dict[str, Any]], version: Any) -> bool:
+    """Rebuilds the index if `version` differs from the indexed one.
+
+    Returns:
+        True if the index was rebuilt.
+    """
+    if version is not None and version == _state['version']:
+        return False
+    build(rows, version)
+    return True
+
+
+def search(query: str, k: int = 3) -> List[Dict[str, Any]]:
+    """Returns the `k` best-matching FAQs for a query.
+
+    Args:
+        query: The user's question.
+        k: The maximum number of results.
+
+    Returns:
+        A list of `{'id', 'question', 'answer', 'score'}` dictionaries ordered
+        by descending BM25 score. FAQs sharing no term with the query are
+        never returned.
+    """
+    terms = set(tokenize(query))
+    if not terms or not _state['docs']:
+        return []
+    postings, idf, lengths = _state['postings'], _state['idf'], _state['lengths']
+    norm = K1 * (1.0 - B)
+    slope = K1 * B / (_state['avgdl'] or 1.0)
+    scores: Dict[int, float] = {}
+    for term in terms:
+        weight = idf.get(term)
+        if weight is None:
+            continue
+        for index, tf in postings[term]:
+            scores[index] = scores.get(index, 0.0) + weight * tf * (K1 + 1.0) / (tf + norm + slope * lengths[index])
+    best = sorted(scores.items(), key=lambda kv: -kv[1])[:max(1, k)]
+    docs = _state['docs']
+    return [
+        {
+            'id': docs[index].get('id'),
+            'question': docs[index].get('question'),
+            'answer': docs[index].get('answer'),
+            'score': round(score, 4),
+        }
+        for index, score in best
+    ]
+
+
+def index_stats() -> Dict[str, Optional[int]]:
+    """Returns the number of indexed FAQs and distinct terms."""
+    return {'documents': len(_state['docs']), 'terms': len(_state['postings']), 'version': _state['version']}
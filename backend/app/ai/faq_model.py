@@ -1,16 +1,330 @@
-def answer_question(question: str) -> str:
-    """Answers a question based on a pre-trained FAQ model.
+"""Semantic FAQ retrieval with dense embeddings.
 
-    Note:
-        This is a placeholder implementation. In a production system, this
-        function would use a transformer-based model for inference to find
-        the most relevant FAQ answer.
+Questions and FAQs are embedded into unit vectors by a pluggable encoder:
+
+-   `TransformerEncoder`: a local Hugging Face model (`FAQ_EMBEDDING_MODEL`,
+    loaded with `local_files_only`, mean-pooled). Used when `transformers`
+    and `torch` are installed and the model is available offline.
+-   `HashingEncoder`: a dependency-free fallback that hashes word tokens and
+    character trigrams into `FAQ_EMBEDDING_DIM` signed buckets. Stable across
+    processes (CRC32, not Python's randomized `hash`).
+
+NumPy and the encoder are only loaded on first use or during the model
+warmup (see `ai/registry.py`).
+
+FAQ embeddings are computed once per FAQ content and encoder and saved as a
+`.npy` matrix under `FAQ_EMBEDDINGS_DIR`. Every worker opens the same file
+with `mmap_mode='r'`, so the matrix is shared through the page cache instead
+of being held once per process. The worker that builds a new matrix deletes
+the ones of older contents that no worker has opened for a while.
+
+A search is one matrix product plus `argpartition`. Concurrent questions are
+collected for up to `FAQ_BATCH_WINDOW_MS` (at most `FAQ_BATCH_MAX_SIZE`) and
+encoded and scored together as one matrix-matrix product.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from ..config import settings
+from . import registry
+from .preprocess import clean_text
+
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+class HashingEncoder:
+    """Offline fallback encoder based on feature hashing."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.name = f'hashing-{dim}'
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        features = []
+        for word in _TOKEN_RE.findall(clean_text(text)):
+            features.append((f'w:{word}', 1.0))
+            padded = f'<{word}>'
+            features.extend((f'c:{padded[i:i + 3]}', 0.5) for i in range(len(padded) - 2))
+        return features
+
+    def encode(self, texts: Sequence[str]) -> 'np.ndarray':
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode('utf-8'))
+                out[row, h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class TransformerEncoder:
+    """Mean-pooled sentence embeddings from a local transformer model."""
+
+    def __init__(self, model_name: str):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=True)
+        self.model = AutoModel.from_pretrained(model_name, local_files_only=True).eval()
+        self.name = f'transformer-{model_name}'
+
+    def encode(self, texts: Sequence[str]) -> 'np.ndarray':
+        import numpy as np
+
+        torch = self._torch
+        batch = self.tokenizer(list(texts), padding=True, truncation=True, max_length=256, return_tensors='pt')
+        with torch.no_grad():
+            hidden = self.model(**batch).last_hidden_state
+        mask = batch['attention_mask'].unsqueeze(-1).float()
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, dim=1)
+        return pooled.cpu().numpy().astype(np.float32)
+
+
+_state: Dict[str, Any] = {
+    'encoder': None,
+    # (content key, matrix, docs), replaced as a whole so readers in other
+    # threads never pair a new matrix with old docs
+    'index': None,
+    'version': None,
+    'lock': None,
+}
+_pending: List[Tuple[str, int, asyncio.Future]] = []
+_flush_handle: Optional[asyncio.TimerHandle] = None
+# running batch tasks; the event loop only keeps weak references to tasks
+_tasks: Set[asyncio.Task] = set()
+_stats = {'queries': 0, 'batches': 0, 'max_batch': 0, 'matrix_builds': 0, 'matrix_loads': 0}
+# matrices nobody opened for this long are deleted after a build; workers that
+# are briefly on an older FAQ version keep theirs
+_STALE_MATRIX_SECONDS = 600.0
+
+
+def _load_encoder():
+    encoder = None
+    if settings.FAQ_EMBEDDING_MODEL:
+        try:
+            encoder = TransformerEncoder(settings.FAQ_EMBEDDING_MODEL)
+        except Exception as exc:
+            logger.warning('transformer encoder unavailable (%s), using hashing encoder', exc)
+    _state['encoder'] = encoder or HashingEncoder(settings.FAQ_EMBEDDING_DIM)
+    return _state['encoder']
+
+
+def get_encoder():
+    """Returns the configured encoder, falling back to `HashingEncoder`.
+
+    The encoder is loaded once through the model registry, by the warmup or
+    by the first caller.
+    """
+    return registry.get('faq_encoder')
+
+
+def _doc_text(row: Dict[str, Any]) -> str:
+    return f"{row.get('question') or ''} {row.get('answer') or ''}".strip()
+
+
+def _content_key(rows: List[Dict[str, Any]], encoder_name: str) -> str:
+    digest = hashlib.sha256(encoder_name.encode('utf-8'))
+    for row in rows:
+        digest.update(json.dumps([row.get('id'), row.get('question'), row.get('answer')], default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _build_matrix(path: str, encoder, docs: List[Dict[str, Any]]) -> None:
+    import numpy as np
+
+    matrix = encoder.encode([_doc_text(row) for row in docs]) if docs else np.zeros((0, 1), dtype=np.float32)
+    os.makedirs(settings.FAQ_EMBEDDINGS_DIR, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, matrix)
+    # atomic, so other workers never map a half-written file
+    os.replace(tmp, path)
+    _stats['matrix_builds'] += 1
+    _remove_stale_matrices(path)
+
+
+def _load_matrix(rows: List[Dict[str, Any]]) -> None:
+    """Opens (building if needed) the memory-mapped embedding matrix for `rows`."""
+    import numpy as np
+
+    encoder = get_encoder()
+    docs = [row for row in rows if _doc_text(row)]
+    key = _content_key(docs, encoder.name)
+    current = _state['index']
+    if current is not None and current[0] == key:
+        return
+    path = os.path.join(settings.FAQ_EMBEDDINGS_DIR, f'faq-{key}.npy')
+    if not os.path.exists(path):
+        _build_matrix(path, encoder, docs)
+    try:
+        # the mtime marks the file as in use for _remove_stale_matrices
+        os.utime(path)
+        matrix = np.load(path, mmap_mode='r')
+    except FileNotFoundError:
+        # removed by another worker between the check and the load
+        _build_matrix(path, encoder, docs)
+        matrix = np.load(path, mmap_mode='r')
+    _state['index'] = (key, matrix, docs)
+    _stats['matrix_loads'] += 1
+
+
+def _remove_stale_matrices(current: str) -> None:
+    """Deletes the matrices of older FAQ contents once `current` is in place.
+
+    Only files that no worker has opened for `_STALE_MATRIX_SECONDS` are
+    removed. Workers that still map one keep reading it until they switch;
+    on POSIX the data is only freed when the last mapping goes away.
+    """
+    directory = os.path.dirname(current)
+    cutoff = time.time() - _STALE_MATRIX_SECONDS
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not (name.startswith('faq-') and name.endswith('.npy')) or path == current:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError as exc:
+            # already gone, or still mapped on Windows; retried after the next build
+            logger.debug('could not remove stale FAQ matrix %s: %s', path, exc)
+
+
+async def sync(rows: List[Dict[str, Any]], version: Any = None) -> None:
+    """Makes the matrix match the given FAQ rows (encoding in a worker thread).
+
+    Args:
+        rows: Rows of the `faq` table.
+        version: The reference cache version of `rows`; nothing is done if it
+            is the version already loaded.
+    """
+    if version is not None and version == _state['version']:
+        return
+    if _state['lock'] is None:
+        _state['lock'] = asyncio.Lock()
+    async with _state['lock']:
+        if version is not None and version == _state['version']:
+            return
+        await asyncio.to_thread(_load_matrix, rows)
+        _state['version'] = version
+
+
+def search_batch(questions: Sequence[str], k: int) -> List[List[Dict[str, Any]]]:
+    """Scores several questions against all FAQs in one matrix product.
 
     Args:
-        question: The user's question string.
+        questions: The questions to answer.
+        k: The number of results per question.
 
     Returns:
-        A string containing the mocked answer to the question.
+        For each question, up to `k` FAQs with their cosine `score`, best first.
+    """
+    import numpy as np
+
+    index = _state['index']
+    if index is None or not index[2] or not questions:
+        return [[] for _ in questions]
+    _, matrix, docs = index
+    queries = get_encoder().encode(list(questions))
+    scores = queries @ np.asarray(matrix).T
+    k = min(max(1, k), len(docs))
+    results = []
+    for row in scores:
+        top = np.argpartition(-row, k - 1)[:k] if k < len(docs) else np.arange(len(docs))
+        top = top[np.argsort(-row[top])]
+        results.append([
+            {
+                'id': docs[i].get('id'),
+                'question': docs[i].get('question'),
+                'answer': docs[i].get('answer'),
+                'score': round(float(row[i]), 4),
+            }
+            for i in top
+        ])
+    return results
+
+
+def _flush() -> None:
+    """Answers all queued questions with one `search_batch` call."""
+    global _flush_handle
+    _flush_handle = None
+    batch = _pending[:]
+    del _pending[:]
+    if not batch:
+        return
+    _stats['batches'] += 1
+    _stats['max_batch'] = max(_stats['max_batch'], len(batch))
+    k = max(item[1] for item in batch)
+
+    async def _run():
+        try:
+            results = await asyncio.to_thread(search_batch, [item[0] for item in batch], k)
+        except Exception as exc:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for (_, item_k, fut), res in zip(batch, results):
+            if not fut.done():
+                fut.set_result(res[:item_k])
+
+    task = asyncio.ensure_future(_run())
+    _tasks.add(task)
+    task.add_done_callback(_batch_done)
+
+
+def _batch_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('FAQ search batch failed', exc_info=task.exception())
+
+
+async def search(question: str, k: int = 3) -> List[Dict[str, Any]]:
+    """Finds the `k` FAQs closest in meaning to `question`.
+
+    The question is queued and scored together with any other questions that
+    arrive within `FAQ_BATCH_WINDOW_MS`.
     """
-    # Placeholder: replace with transformer-based inference
-    return f"(FAQ) I can help with: {question}"
+    global _flush_handle
+    _stats['queries'] += 1
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    _pending.append((question or '', k, fut))
+    if len(_pending) >= settings.FAQ_BATCH_MAX_SIZE:
+        if _flush_handle is not None:
+            _flush_handle.cancel()
+        _flush()
+    elif _flush_handle is None:
+        _flush_handle = loop.call_later(settings.FAQ_BATCH_WINDOW_MS / 1000.0, _flush)
+    return await fut
+
+
+async def answer_question(question: str) -> Optional[str]:
+    """Returns the answer of the semantically closest FAQ, if any is indexed."""
+    results = await search(question, 1)
+    return results[0]['answer'] if results else None
+
+
+def model_stats() -> Dict[str, Any]:
+    """Returns the encoder in use, matrix shape and batching counters."""
+    matrix = _state['index'][1] if _state['index'] is not None else None
+    return dict(
+        _stats,
+        encoder=_state['encoder'].name if _state['encoder'] else None,
+        shape=list(matrix.shape) if matrix is not None else None,
+    )
+
+
+registry.register('faq_encoder', _load_encoder)
@@ -1,47 +1,55 @@
-from typing import Dict
-from ..db.supabase_client import supabase_request
+from typing import Dict, Optional
+from ..config import settings
+from ..services.reference_cache import get_entry
+from . import faq_index, faq_model, moderation
 
 
-async def answer_query(question: str) -> Dict:
-    """Finds an answer to a question using simple keyword matching against FAQs.
+NO_ANSWER = 'Sorry, I do not know the answer to that yet.'
 
-    This function attempts to find a relevant answer by searching for the
-    question text and keywords within the pre-existing FAQs stored in the
-    database.
+
+async def answer_query(question: str, top_k: Optional[int] = None, mode: Optional[str] = None) -> Dict:
+    """Finds answers to a question by searching the FAQs.
+
+    The FAQ rows come from the in-process reference cache and the search
+    structures are rebuilt only when they change, so a query normally
+    involves no network call. Two search modes are available:
+
+    -   `'keyword'`: BM25 over an inverted index (see `ai/faq_index.py`).
+    -   `'semantic'`: embedding similarity (see `ai/faq_model.py`).
 
     Args:
         question: The user's question string.
+        top_k: The number of ranked results to return; defaults to `FAQ_TOP_K`.
+        mode: `'keyword'` or `'semantic'`; defaults to `FAQ_SEARCH_MODE`.
 
     Returns:
-        A dictionary containing the answer, or a default message if no
-        relevant answer is found.
+        A dictionary with the best `answer` (or a default message if no FAQ
+        matches), the ranked `results` with their `score`, and the `mode` used.
     """
-    # Simple keyword matching against FAQ table
-    r = await supabase_request('GET', 'faq')
-    faqs = r.get('data') or []
-    q = (question or '').lower()
-    for item in faqs:
-        if item.get('question') and item.get('question').lower() in q:
-            return {'answer': item.get('answer')}
-    # fallback: return first similar by keyword
-    for item in faqs:
-        if any(k in q for k in (item.get('question') or '').lower().split()):
-            return {'answer': item.get('answer')}
-    return {'answer': 'Sorry, I do not know the answer to that yet.'}
+    mode = mode or settings.FAQ_SEARCH_MODE
+    k = top_k or settings.FAQ_TOP_K
+    entry = await get_entry('faq')
+    rows, version = (entry.rows, entry.version) if entry is not None else ([], None)
+    if mode == 'semantic':
+        await faq_model.sync(rows, version)
+        results = await faq_model.search(question or '', k)
+    else:
+        mode = 'keyword'
+        faq_index.sync(rows, version)
+        results = faq_index.search(question or '', k)
+    return {'answer': results[0]['answer'] if results else NO_ANSWER, 'results': results, 'mode': mode}
 
 
 def detect_unwanted_submission(text: str) -> bool:
-    """Performs a basic check for spam or unwanted content in a string.
+    """Checks whether a text would be rejected as spam or abuse.
 
-    This function uses a simple list of banned keywords to flag text.
-    It is not a sophisticated spam filter.
+    Thin synchronous wrapper around the moderation engine (see
+    `ai/moderation.py`); async callers should use `moderation.moderate`.
 
     Args:
         text: The input text to check.
 
     Returns:
-        True if a banned keyword is found, False otherwise.
+        True if the text is flagged, False otherwise.
     """
-    banned = ['spam', 'buy now', 'free', 'http', 'www.', 'offensive']
-    t = (text or '').lower()
-    return any(b in t for b in banned)
+    return moderation.score_text(text)['flagged']
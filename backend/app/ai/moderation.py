@@ -0,0 +1,251 @@
+"""Spam and abuse moderation for issues and comments.
+
+One engine replaces the old ad-hoc checks (`model.detect_unwanted_submission`
+and `spam_model.detect_spam`, which now delegate here). A text gets a score
+between 0 and 1 plus the reasons that contributed to it:
+
+-   A pattern scanner: every rule in `DEFAULT_RULES` (extended or overridden
+    by the JSON file `MODERATION_RULES_PATH`, `{"reason": {"pattern": "...",
+    "weight": 0.5}}`) is compiled into one regular expression with a named
+    group per rule, so the text is scanned once. Rule patterns must not use
+    backreferences. Length, shouting and character repetition are checked
+    separately.
+-   An optional linear model (`MODERATION_MODEL_PATH`, a joblib bundle with a
+    `vectorizer` and a probabilistic `classifier`, see `train`).
+
+Rule weights and the model probability are combined with a noisy-or, i.e.
+`1 - prod(1 - w)`, and a text is flagged at `MODERATION_THRESHOLD`.
+
+`score_batch` runs the scoring in a process pool of `MODERATION_WORKERS`
+processes (a thread when set to 0), so the event loop is never blocked.
+The engine and pool are started during the model warmup (see
+`ai/registry.py`) or on first use.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import settings
+from . import registry
+
+
+logger = logging.getLogger(__name__)
+
+# reason -> (pattern, weight)
+DEFAULT_RULES: Dict[str, Tuple[str, float]] = {
+    'link': (r'https?://|\bwww\.', 0.45),
+    'commercial': (r'\b(?:buy now|order now|click here|limited offer|free (?:money|gift|trial|shipping)|100% free|act now|discount code)\b', 0.6),
+    'scam': (r'\b(?:you(?: have)? won|winner|lottery|prize claim|bitcoin|crypto(?:currency)?|casino|viagra|loan offer)\b', 0.6),
+    'spam_word': (r'\bspam\b', 0.3),
+    'contact_bait': (r'\b(?:whatsapp|telegram) (?:me|us)\b|\bcall now\b', 0.4),
+    'abuse': (r'\b(?:offensive|idiot|stupid|moron)\b', 0.5),
+}
+
+_REPETITION = re.compile(r'(.)\1{7,}')
+
+_engine: Dict[str, Any] = {'regex': None, 'weights': {}, 'model': None, 'model_mtime': None}
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_stats = {'texts': 0, 'flagged': 0, 'batches': 0, 'seconds': 0.0}
+
+
+def _load_rules() -> Dict[str, Tuple[str, float]]:
+    rules = dict(DEFAULT_RULES)
+    path = settings.MODERATION_RULES_PATH
+    if not path:
+        return rules
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            extra = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning('could not read moderation rules from %s: %s', path, exc)
+        return rules
+    for reason, rule in (extra.items() if isinstance(extra, dict) else []):
+        try:
+            re.compile(rule['pattern'])
+            rules[str(reason)] = (rule['pattern'], float(rule.get('weight', 0.5)))
+        except (KeyError, TypeError, ValueError, re.error) as exc:
+            logger.warning('skipping moderation rule %r: %s', reason, exc)
+    return rules
+
+
+def _compile() -> None:
+    rules = _load_rules()
+    groups = []
+    weights = {}
+    for i, (reason, (pattern, weight)) in enumerate(rules.items()):
+        name = f'r{i}'
+        groups.append(f'(?P<{name}>{pattern})')
+        weights[name] = (reason, weight)
+    _engine['regex'] = re.compile('|'.join(groups), re.IGNORECASE)
+    _engine['weights'] = weights
+
+
+def _load_model() -> Optional[Dict[str, Any]]:
+    path = settings.MODERATION_MODEL_PATH
+    if not path:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _engine['model'] is None or _engine['model_mtime'] != mtime:
+        try:
+            import joblib
+
+            _engine['model'] = joblib.load(path)
+            _engine['model_mtime'] = mtime
+        except Exception:
+            logger.exception('could not load moderation model from %s', path)
+    return _engine['model']
+
+
+def load() -> bool:
+    """Compiles the rules and loads the model in the current process.
+
+    Returns:
+        True if a trained model is in use.
+    """
+    _compile()
+    return _load_model() is not None
+
+
+def score_texts(texts: Sequence[str]) -> List[Dict[str, Any]]:
+    """Scores texts synchronously. Runs inside the worker processes.
+
+    Args:
+        texts: The texts to moderate.
+
+    Returns:
+        One `{'score', 'flagged', 'reasons'}` dictionary per text.
+    """
+    if _engine['regex'] is None:
+        load()
+    regex, weights = _engine['regex'], _engine['weights']
+    model = _load_model()
+    probabilities = None
+    if model is not None and texts:
+        probabilities = model['classifier'].predict_proba(model['vectorizer'].transform(list(texts)))[:, 1]
+    threshold = settings.MODERATION_THRESHOLD
+    results = []
+    for i, text in enumerate(texts):
+        text = text or ''
+        reasons: Dict[str, float] = {}
+        for match in regex.finditer(text):
+            reason, weight = weights[match.lastgroup]
+            reasons[reason] = weight
+        stripped = text.strip()
+        if len(stripped) < 10:
+            reasons['too_short'] = 0.4
+        else:
+            letters = sum(1 for ch in stripped if ch.isalpha())
+            if letters > 30 and sum(1 for ch in stripped if ch.isupper()) > 0.7 * letters:
+                reasons['shouting'] = 0.2
+        if _REPETITION.search(text):
+            reasons['repetition'] = 0.3
+        keep = 1.0
+        for weight in reasons.values():
+            keep *= 1.0 - weight
+        if probabilities is not None:
+            p = float(probabilities[i])
+            keep *= 1.0 - p
+            if p >= 0.5:
+                reasons['model'] = round(p, 4)
+        score = round(1.0 - keep, 4)
+        results.append({'score': score, 'flagged': score >= threshold, 'reasons': sorted(reasons)})
+    return results
+
+
+def score_text(text: str) -> Dict[str, Any]:
+    """Scores one text synchronously in the calling thread."""
+    return score_texts([text])[0]
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    # the warmup thread and request handlers may get here at the same time
+    with _executor_lock:
+        if _executor is None and settings.MODERATION_WORKERS > 0:
+            _executor = ProcessPoolExecutor(max_workers=settings.MODERATION_WORKERS, initializer=load)
+        return _executor
+
+
+async def score_batch(texts: Sequence[str]) -> List[Dict[str, Any]]:
+    """Scores many texts off the event loop.
+
+    Args:
+        texts: The texts to moderate.
+
+    Returns:
+        One `{'score', 'flagged', 'reasons'}` dictionary per text.
+    """
+    if not texts:
+        return []
+    # the first call waits for (or performs) the warmup load, see ai/registry.py
+    await registry.aget('moderation')
+    started = time.perf_counter()
+    executor = _get_executor()
+    if executor is None:
+        results = await asyncio.to_thread(score_texts, list(texts))
+    else:
+        results = await asyncio.get_running_loop().run_in_executor(executor, score_texts, list(texts))
+    _stats['texts'] += len(results)
+    _stats['flagged'] += sum(1 for r in results if r['flagged'])
+    _stats['batches'] += 1
+    _stats['seconds'] += time.perf_counter() - started
+    return results
+
+
+async def moderate(text: str) -> Dict[str, Any]:
+    """Scores a single text off the event loop (see `score_batch`)."""
+    return (await score_batch([text]))[0]
+
+
+def warm() -> bool:
+    """Loads the engine and starts the worker pool. Runs during model warmup.
+
+    Returns:
+        True if a trained model is in use.
+    """
+    has_model = load()
+    executor = _get_executor()
+    if executor is not None:
+        executor.submit(score_texts, ['warm up']).result()
+    logger.info('moderation engine ready (%d rules, model: %s)', len(_engine['weights']), 'yes' if has_model else 'no')
+    return has_model
+
+
+def shutdown() -> None:
+    """Stops the worker processes."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def train(texts: Sequence[str], labels: Sequence[int]) -> Dict[str, Any]:
+    """Fits a linear spam model (1 = unwanted) for `MODERATION_MODEL_PATH`.
+
+    Save the returned bundle with `joblib.dump(bundle, path)`.
+    """
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+
+    vectorizer = HashingVectorizer(n_features=2 ** 18, ngram_range=(1, 2), alternate_sign=False, norm='l2')
+    clf = SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=20, tol=None, class_weight='balanced', random_state=0)
+    clf.fit(vectorizer.transform(list(texts)), list(labels))
+    return {'vectorizer': vectorizer, 'classifier': clf, 'trained_at': time.time(), 'samples': len(texts)}
+
+
+def moderation_stats() -> Dict[str, Any]:
+    """Returns counters of scored and flagged texts."""
+    return dict(_stats, rules=len(_engine['weights']), model=_engine['model'] is not None, workers=settings.MODERATION_WORKERS)
+
+
+registry.register('moderation', warm)
@@ -0,0 +1,135 @@
+"""Registry of lazily loaded models.
+
+Heavy libraries (scikit-learn, transformers, torch) and model files are not
+imported when the application starts. Each model is registered here with a
+loader function that runs on first use (`get`) or during the background
+warmup started from the lifespan hook (`start_warmup`), whichever comes
+first. Loading happens at most once per process; concurrent callers wait for
+the same load.
+
+`readiness` reports the state of every model and backs `/health` and
+`/health/ready`.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class _Model:
+    """A registered model and its load state."""
+
+    __slots__ = ('name', 'loader', 'warm', 'value', 'status', 'error', 'load_seconds', 'lock')
+
+    def __init__(self, name: str, loader: Callable[[], Any], warm: bool):
+        self.name = name
+        self.loader = loader
+        self.warm = warm
+        self.value = None
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+_models: Dict[str, _Model] = {}
+_warmup: Dict[str, Any] = {'task': None, 'started_at': None, 'finished_at': None}
+
+
+def register(name: str, loader: Callable[[], Any], warm: bool = True) -> None:
+    """Registers a model loader.
+
+    Args:
+        name: The model name used with `get`.
+        loader: A synchronous function returning the loaded model. It runs in
+            a worker thread during warmup.
+        warm: Whether the model is loaded during warmup (and counts towards
+            readiness) or only on first use.
+    """
+    _models[name] = _Model(name, loader, warm)
+
+
+def get(name: str) -> Any:
+    """Returns a model, loading it now if needed (blocking the caller).
+
+    Raises:
+        KeyError: If no model is registered under `name`.
+        Exception: Whatever the loader raised, if loading failed.
+    """
+    model = _models[name]
+    if model.status == READY:
+        return model.value
+    with model.lock:
+        if model.status != READY:
+            model.status = LOADING
+            started = time.perf_counter()
+            try:
+                model.value = model.loader()
+            except Exception as exc:
+                model.status = FAILED
+                model.error = f'{type(exc).__name__}: {exc}'
+                raise
+            model.load_seconds = round(time.perf_counter() - started, 3)
+            model.status = READY
+            model.error = None
+            logger.info('loaded model %s in %.3fs', name, model.load_seconds)
+    return model.value
+
+
+async def aget(name: str) -> Any:
+    """Async variant of `get` that loads in a worker thread."""
+    model = _models[name]
+    if model.status == READY:
+        return model.value
+    return await asyncio.to_thread(get, name)
+
+
+async def warmup(names: Optional[Iterable[str]] = None) -> None:
+    """Loads the given models (default: all `warm` ones) concurrently.
+
+    Failures are logged and recorded; they do not stop other models.
+    """
+    selected = list(names) if names is not None else [m.name for m in _models.values() if m.warm]
+    _warmup['started_at'] = time.time()
+
+    async def _one(name: str):
+        try:
+            await aget(name)
+        except Exception:
+            logger.exception('warming up model %s failed', name)
+
+    await asyncio.gather(*(_one(name) for name in selected))
+    _warmup['finished_at'] = time.time()
+
+
+def start_warmup() -> asyncio.Task:
+    """Starts `warmup` in the background. Called from the lifespan hook."""
+    _warmup['task'] = asyncio.ensure_future(warmup())
+    return _warmup['task']
+
+
+def is_ready() -> bool:
+    """Returns True once every warm model is loaded (failed ones count as done)."""
+    return all(m.status in (READY, FAILED) for m in _models.values() if m.warm)
+
+
+def readiness() -> Dict[str, Any]:
+    """Returns overall readiness plus the status and load time of each model."""
+    started, finished = _warmup['started_at'], _warmup['finished_at']
+    return {
+        'ready': is_ready(),
+        'warmup_seconds': round(finished - started, 3) if started and finished else None,
+        'models': {
+            m.name: {'status': m.status, 'load_seconds': m.load_seconds, 'error': m.error, 'warm': m.warm}
+            for m in _models.values()
+        },
+    }
@@ -0,0 +1,212 @@
+"""Re-scores existing issues and comments with the moderation engine.
+
+    python -m app.cli.remoderate [--table issues|comments|all] [--page-size N] [--limit N]
+                                 [--checkpoint PATH] [--restart] [--dry-run]
+
+Run it after changing the moderation rules or model (see `ai/moderation.py`).
+Rows are streamed in `(created_at, id)` order with keyset pagination, one
+page in memory at a time (the next page is fetched while the current one is
+scored), so memory stays constant however large the tables are. Each page is
+scored with one `moderation.score_batch` call, and the verdicts are written
+back to the `moderation_*` columns with one PATCH per distinct verdict
+(`id=in.(...)`). Rows whose stored verdict is unchanged are not written.
+
+After every page the last `(created_at, id)` of each table is written to the
+checkpoint file, and a later run resumes from there. Use `--restart` to start
+over. Throughput is reported in rows per second.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from ..ai import moderation
+from ..db import http_clients
+from ..db.supabase_client import supabase_request
+from ..utils.pagination import KEYSET_ORDER_ASC, keyset_filter
+
+
+logger = logging.getLogger('remoderate')
+
+_VERDICT_COLUMNS = 'moderation_score,moderation_flagged,moderation_reasons,moderated_at'
+
+# table -> (columns to fetch, text columns scored together)
+TABLES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'issues': (f'id,created_at,title,description,{_VERDICT_COLUMNS}', ('title', 'description')),
+    'comments': (f'id,created_at,text,{_VERDICT_COLUMNS}', ('text',)),
+}
+
+# keeps the id=in.(...) filter well below common URL length limits
+MAX_IDS_PER_PATCH = 200
+
+DEFAULT_CHECKPOINT = 'data/remoderate_checkpoint.json'
+
+
+def _load_checkpoint(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        raise SystemExit(f'could not read checkpoint {path}: {exc}; use --restart to start over')
+    return data if isinstance(data, dict) else {}
+
+
+def _save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Writes the checkpoint atomically so an interrupted run never leaves it half-written."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+async def _fetch(table: str, last: Optional[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    filters = keyset_filter(last['created_at'], last['id'], descending=False) if last else None
+    r = await supabase_request('GET', table, filters=filters, select=TABLES[table][0], order=KEYSET_ORDER_ASC, limit=size)
+    if r.get('status_code') != 200:
+        raise RuntimeError(f"fetching {table} failed: {r.get('data')}")
+    return r.get('data') or []
+
+
+async def _pages(table: str, start_after: Optional[Dict[str, Any]], page_size: int, limit: Optional[int]) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yields pages of `table` after the `start_after` key until exhausted or `limit` rows.
+
+    The request for the next page is already in flight while the caller
+    processes the current one.
+    """
+    seen = 0
+    size = page_size if limit is None else min(page_size, limit)
+    pending = asyncio.ensure_future(_fetch(table, start_after, size)) if size > 0 else None
+    try:
+        while pending is not None:
+            rows = await pending
+            pending = None
+            if not rows:
+                return
+            seen += len(rows)
+            next_size = page_size if limit is None else min(page_size, limit - seen)
+            if len(rows) == size and next_size > 0:
+                pending = asyncio.ensure_future(_fetch(table, rows[-1], next_size))
+            size = next_size
+            yield rows
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def _row_text(table: str, row: Dict[str, Any]) -> str:
+    return ' '.join(str(row.get(k) or '') for k in TABLES[table][1]).strip()
+
+
+def _unchanged(row: Dict[str, Any], verdict: Dict[str, Any]) -> bool:
+    """Returns True if the stored verdict already matches (the score is stored as `real`)."""
+    if row.get('moderated_at') is None or row.get('moderation_score') is None:
+        return False
+    return (
+        bool(row.get('moderation_flagged')) == verdict['flagged']
+        and sorted(row.get('moderation_reasons') or []) == verdict['reasons']
+        and abs(float(row['moderation_score']) - verdict['score']) < 1e-4
+    )
+
+
+async def _write(table: str, verdict: Tuple[bool, float, Tuple[str, ...]], ids: List[str], moderated_at: str) -> None:
+    """Stores one verdict on many rows with one filtered PATCH."""
+    flagged, score, reasons = verdict
+    r = await supabase_request(
+        'PATCH', table,
+        payload={
+            'moderation_flagged': flagged,
+            'moderation_score': score,
+            'moderation_reasons': list(reasons),
+            'moderated_at': moderated_at,
+        },
+        filters={'id.in': '(' + ','.join(f'"{i}"' for i in ids) + ')'},
+        headers={'Prefer': 'return=minimal'},
+    )
+    if r.get('status_code') not in (200, 204):
+        raise RuntimeError(f"updating {len(ids)} {table} failed: {r.get('data')}")
+
+
+async def remoderate_table(
+    table: str,
+    checkpoint: Dict[str, Any],
+    checkpoint_path: Optional[str],
+    page_size: int,
+    limit: Optional[int],
+) -> Dict[str, Any]:
+    """Re-scores one table, resuming after the key stored in `checkpoint[table]`.
+
+    Args:
+        table: `'issues'` or `'comments'`.
+        checkpoint: The checkpoint of all tables; updated in place.
+        checkpoint_path: Where to save the checkpoint after each page, or
+            None to not save it (dry runs).
+        page_size: Rows fetched and scored per batch.
+        limit: Stop after this many rows.
+
+    Returns:
+        The checkpoint entry of the table, including its counters.
+    """
+    state = checkpoint.setdefault(table, {'last': None, 'scanned': 0, 'flagged': 0, 'updated': 0})
+    if state['last']:
+        logger.info('%s: resuming after %s %s', table, state['last']['created_at'], state['last']['id'])
+    started = time.perf_counter()
+    scanned = 0
+    async for rows in _pages(table, state['last'], page_size, limit):
+        results = await moderation.score_batch([_row_text(table, row) for row in rows])
+        groups: Dict[Tuple[bool, float, Tuple[str, ...]], List[str]] = {}
+        for row, result in zip(rows, results):
+            if not _unchanged(row, result):
+                groups.setdefault((result['flagged'], result['score'], tuple(result['reasons'])), []).append(str(row['id']))
+        if checkpoint_path:
+            moderated_at = datetime.now(timezone.utc).isoformat()
+            await asyncio.gather(*(
+                _write(table, verdict, ids[i:i + MAX_IDS_PER_PATCH], moderated_at)
+                for verdict, ids in groups.items()
+                for i in range(0, len(ids), MAX_IDS_PER_PATCH)
+            ))
+        scanned += len(rows)
+        state['last'] = {'created_at': rows[-1]['created_at'], 'id': rows[-1]['id']}
+        state['scanned'] += len(rows)
+        state['flagged'] += sum(1 for r in results if r['flagged'])
+        state['updated'] += sum(len(ids) for ids in groups.values())
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            '%s: %d scanned, %d flagged, %d %s, %.0f rows/s',
+            table, state['scanned'], state['flagged'], state['updated'],
+            'updated' if checkpoint_path else 'would be updated', scanned / elapsed if elapsed else 0.0,
+        )
+    elapsed = time.perf_counter() - started
+    logger.info('%s: done, %d rows in %.1fs (%.0f rows/s)', table, scanned, elapsed, scanned / elapsed if elapsed else 0.0)
+    return state
+
+
+async def main(args: argparse.Namespace) -> None:
+    tables = list(TABLES) if args.table == 'all' else [args.table]
+    checkpoint = {} if args.restart else _load_checkpoint(args.checkpoint)
+    await http_clients.startup()
+    try:
+        for table in tables:
+            await remoderate_table(table, checkpoint, None if args.dry_run else args.checkpoint, args.page_size, args.limit)
+    finally:
+        moderation.shutdown()
+        await http_clients.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-score existing issues and comments with the moderation engine.')
+    parser.add_argument('--table', choices=('issues', 'comments', 'all'), default='all')
+    parser.add_argument('--page-size', type=int, default=1000, help='rows fetched and scored per batch (default: 1000)')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many rows per table')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help=f'resume file (default: {DEFAULT_CHECKPOINT})')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and rescan from the start')
+    parser.add_argument('--dry-run', action='store_true', help='score without writing verdicts or the checkpoint')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,39 @@
+"""Standalone job queue worker.
+
+Runs the background jobs (routing, notifications, Cloudinary cleanup) outside
+the API process. Use it together with `JOB_WORKER_IN_PROCESS=false` on the API
+workers, pointing both at the same `JOB_QUEUE_PATH`:
+
+    python -m app.cli.worker [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from ..db import http_clients
+from ..services import issue_jobs  # noqa: F401  (registers job handlers)
+from ..services.job_queue import run_worker
+
+
+async def main(concurrency: int = 0) -> None:
+    """Runs the worker until SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+    await http_clients.startup()
+    try:
+        await run_worker(stop, concurrency=concurrency or None)
+    finally:
+        await http_clients.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process background jobs from the local job queue.')
+    parser.add_argument('--concurrency', type=int, default=0, help='parallel jobs (default: JOB_WORKER_CONCURRENCY)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    asyncio.run(main(args.concurrency))
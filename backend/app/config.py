@@ -5,7 +5,8 @@ them from a .env file and environment variables. It uses Pydantic's `BaseSetting
 for robust validation and type casting, with a simple fallback mechanism for
 testing environments where `pydantic-settings` may not be available.
 
-It also handles the configuration of the Cloudinary SDK if credentials are provided.
+It also configures the Cloudinary SDK, lazily, if credentials are provided
+(see `cloudinary_sdk`).
 """
 import os
 try:
@@ -14,11 +15,7 @@ except Exception:
 	# pydantic v2 may require pydantic-settings. Provide a light fallback to avoid import-time failures in tests.
 	BaseSettings = None
 	AnyUrl = str
-from typing import Optional
-try:
-	import cloudinary
-except Exception:
-	cloudinary = None
+from typing import Any, Optional
 from dotenv import load_dotenv
 
 
@@ -40,9 +37,91 @@ if BaseSettings:
 		CLOUDINARY_CLOUD_NAME: Optional[str] = None
 		CLOUDINARY_API_KEY: Optional[str] = None
 		CLOUDINARY_API_SECRET: Optional[str] = None
-		JWT_SECRET: str = 'dev-secret'
+		JWT_SECRET: Optional[str] = None
 		JWT_ALGORITHM: str = 'HS256'
 		JWT_EXPIRY_MINUTES: int = 60
+		# Access token verification (see utils/auth_dependencies.py)
+		JWT_AUDIENCE: Optional[str] = 'authenticated'
+		JWT_LOCAL_VERIFY: bool = True
+		JWT_REMOTE_VERIFY: bool = False
+		JWT_REMOTE_RECHECK_SECONDS: int = 60
+		JWT_CACHE_SIZE: int = 10000
+		# Shared upstream HTTP client pools (see db/http_clients.py)
+		HTTP_MAX_CONNECTIONS: int = 100
+		HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+		HTTP_KEEPALIVE_EXPIRY: float = 30.0
+		HTTP2_ENABLED: bool = False
+		SUPABASE_TIMEOUT: float = 10.0
+		SUPABASE_AUTH_TIMEOUT: float = 5.0
+		CLOUDINARY_TIMEOUT: float = 30.0
+		SUPABASE_COALESCE_GETS: bool = True
+		UPLOAD_CONCURRENCY: int = 4
+		UPLOAD_CHUNK_SIZE: int = 256 * 1024
+		# Image preprocessing (see services/image_pipeline.py)
+		IMAGE_PREPROCESS_ENABLED: bool = False
+		IMAGE_MAX_DIMENSION: int = 2048
+		IMAGE_FORMAT: str = 'WEBP'
+		IMAGE_QUALITY: int = 80
+		IMAGE_THUMBNAIL_SIZE: int = 320
+		IMAGE_PROCESS_WORKERS: int = 2
+		# Upload deduplication (see services/image_index.py)
+		IMAGE_DEDUP_ENABLED: bool = True
+		IMAGE_PHASH_ENABLED: bool = False
+		IMAGE_PHASH_MAX_DISTANCE: int = 3
+		IMAGE_INDEX_PATH: str = 'data/image_index.sqlite3'
+		# Background job queue (see services/job_queue.py)
+		JOB_QUEUE_PATH: str = 'data/jobs.sqlite3'
+		JOB_WORKER_IN_PROCESS: bool = True
+		JOB_WORKER_CONCURRENCY: int = 4
+		JOB_MAX_ATTEMPTS: int = 8
+		JOB_BACKOFF_BASE_SECONDS: float = 2.0
+		JOB_BACKOFF_MAX_SECONDS: float = 600.0
+		JOB_POLL_INTERVAL: float = 1.0
+		JOB_LEASE_SECONDS: float = 120.0
+		JOB_RETENTION_SECONDS: float = 86400.0
+		# Reference table cache (see services/reference_cache.py)
+		REFERENCE_CACHE_TTL_SECONDS: float = 300.0
+		REFERENCE_CACHE_STALE_SECONDS: float = 3600.0
+		REFERENCE_CACHE_MAX_ENTRIES: int = 32
+		# Department routing rules (see services/routing_engine.py)
+		ROUTING_RULES_PATH: Optional[str] = None
+		ROUTING_RELOAD_INTERVAL: float = 30.0
+		# Department classifier (see services/department_classifier.py)
+		DEPARTMENT_MODEL_PATH: str = 'data/department_model.joblib'
+		DEPARTMENT_CLASSIFIER_HASH_BITS: int = 18
+		DEPARTMENT_CLASSIFIER_MIN_CONFIDENCE: float = 0.6
+		# FAQ search (see ai/faq_index.py)
+		FAQ_TOP_K: int = 3
+		FAQ_SEARCH_MODE: str = 'keyword'
+		# Semantic FAQ search (see ai/faq_model.py)
+		FAQ_EMBEDDING_MODEL: Optional[str] = None
+		FAQ_EMBEDDING_DIM: int = 512
+		FAQ_EMBEDDINGS_DIR: str = 'data/faq_embeddings'
+		FAQ_BATCH_WINDOW_MS: float = 2.0
+		FAQ_BATCH_MAX_SIZE: int = 32
+		# Spam/abuse moderation (see ai/moderation.py)
+		MODERATION_THRESHOLD: float = 0.7
+		MODERATION_WORKERS: int = 1
+		MODERATION_RULES_PATH: Optional[str] = None
+		MODERATION_MODEL_PATH: Optional[str] = None
+		# Per-user submission rate limits (see utils/rate_limit.py)
+		RATE_LIMIT_ENABLED: bool = True
+		RATE_LIMIT_WINDOW_SECONDS: float = 600.0
+		RATE_LIMIT_ISSUES: int = 10
+		RATE_LIMIT_COMMENTS: int = 30
+		RATE_LIMIT_MAX_WAIT_SECONDS: float = 0.0
+		RATE_LIMIT_MAX_KEYS: int = 100000
+		RATE_LIMIT_SHARED_PATH: Optional[str] = None
+		# Admin analytics source: 'rollups' (SQL aggregate tables) or 'snapshot' (see services/issue_snapshot.py)
+		ANALYTICS_SOURCE: str = 'rollups'
+		ISSUE_SNAPSHOT_MAX_AGE_SECONDS: float = 30.0
+		ISSUE_SNAPSHOT_FULL_REFRESH_SECONDS: float = 3600.0
+		ISSUE_SNAPSHOT_OVERLAP_SECONDS: float = 5.0
+		ISSUE_SNAPSHOT_PAGE_SIZE: int = 5000
+		ADMIN_SUMMARY_CACHE_SECONDS: float = 15.0
+		# Bulk issue operations (POST /issues/bulk)
+		ISSUE_BULK_MAX_IDS: int = 1000
+		ISSUE_BULK_CHUNK_SIZE: int = 200
 
 		class Config:
 			"""Pydantic configuration options."""
@@ -51,6 +130,13 @@ if BaseSettings:
 
 	settings = Settings()
 else:
+	def _env_bool(name: str, default: bool) -> bool:
+		"""Reads a boolean flag from the environment ('1', 'true', 'yes', 'on')."""
+		value = os.environ.get(name)
+		if value is None:
+			return default
+		return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 	# Minimal fallback settings using environment variables for test runs.
 	class Settings:
 		"""A fallback settings class for environments without `pydantic-settings`.
@@ -64,20 +150,107 @@ else:
 		CLOUDINARY_CLOUD_NAME = os.environ.get('CLOUDINARY_CLOUD_NAME')
 		CLOUDINARY_API_KEY = os.environ.get('CLOUDINARY_API_KEY')
 		CLOUDINARY_API_SECRET = os.environ.get('CLOUDINARY_API_SECRET')
-		JWT_SECRET = os.environ.get('JWT_SECRET', 'dev-secret')
+		JWT_SECRET = os.environ.get('JWT_SECRET')
 		JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 		JWT_EXPIRY_MINUTES = int(os.environ.get('JWT_EXPIRY_MINUTES', '60'))
+		JWT_AUDIENCE = os.environ.get('JWT_AUDIENCE', 'authenticated')
+		JWT_LOCAL_VERIFY = _env_bool('JWT_LOCAL_VERIFY', True)
+		JWT_REMOTE_VERIFY = _env_bool('JWT_REMOTE_VERIFY', False)
+		JWT_REMOTE_RECHECK_SECONDS = int(os.environ.get('JWT_REMOTE_RECHECK_SECONDS', '60'))
+		JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', '10000'))
+		HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+		HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+		HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '30'))
+		HTTP2_ENABLED = _env_bool('HTTP2_ENABLED', False)
+		SUPABASE_TIMEOUT = float(os.environ.get('SUPABASE_TIMEOUT', '10'))
+		SUPABASE_AUTH_TIMEOUT = float(os.environ.get('SUPABASE_AUTH_TIMEOUT', '5'))
+		CLOUDINARY_TIMEOUT = float(os.environ.get('CLOUDINARY_TIMEOUT', '30'))
+		SUPABASE_COALESCE_GETS = _env_bool('SUPABASE_COALESCE_GETS', True)
+		UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', '4'))
+		UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(256 * 1024)))
+		IMAGE_PREPROCESS_ENABLED = _env_bool('IMAGE_PREPROCESS_ENABLED', False)
+		IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', '2048'))
+		IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'WEBP')
+		IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', '80'))
+		IMAGE_THUMBNAIL_SIZE = int(os.environ.get('IMAGE_THUMBNAIL_SIZE', '320'))
+		IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS', '2'))
+		IMAGE_DEDUP_ENABLED = _env_bool('IMAGE_DEDUP_ENABLED', True)
+		IMAGE_PHASH_ENABLED = _env_bool('IMAGE_PHASH_ENABLED', False)
+		IMAGE_PHASH_MAX_DISTANCE = int(os.environ.get('IMAGE_PHASH_MAX_DISTANCE', '3'))
+		IMAGE_INDEX_PATH = os.environ.get('IMAGE_INDEX_PATH', 'data/image_index.sqlite3')
+		JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', 'data/jobs.sqlite3')
+		JOB_WORKER_IN_PROCESS = _env_bool('JOB_WORKER_IN_PROCESS', True)
+		JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '4'))
+		JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '8'))
+		JOB_BACKOFF_BASE_SECONDS = float(os.environ.get('JOB_BACKOFF_BASE_SECONDS', '2'))
+		JOB_BACKOFF_MAX_SECONDS = float(os.environ.get('JOB_BACKOFF_MAX_SECONDS', '600'))
+		JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1'))
+		JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '120'))
+		JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', '86400'))
+		REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '300'))
+		REFERENCE_CACHE_STALE_SECONDS = float(os.environ.get('REFERENCE_CACHE_STALE_SECONDS', '3600'))
+		REFERENCE_CACHE_MAX_ENTRIES = int(os.environ.get('REFERENCE_CACHE_MAX_ENTRIES', '32'))
+		ROUTING_RULES_PATH = os.environ.get('ROUTING_RULES_PATH')
+		ROUTING_RELOAD_INTERVAL = float(os.environ.get('ROUTING_RELOAD_INTERVAL', '30'))
+		DEPARTMENT_MODEL_PATH = os.environ.get('DEPARTMENT_MODEL_PATH', 'data/department_model.joblib')
+		DEPARTMENT_CLASSIFIER_HASH_BITS = int(os.environ.get('DEPARTMENT_CLASSIFIER_HASH_BITS', '18'))
+		DEPARTMENT_CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get('DEPARTMENT_CLASSIFIER_MIN_CONFIDENCE', '0.6'))
+		FAQ_TOP_K = int(os.environ.get('FAQ_TOP_K', '3'))
+		FAQ_SEARCH_MODE = os.environ.get('FAQ_SEARCH_MODE', 'keyword')
+		FAQ_EMBEDDING_MODEL = os.environ.get('FAQ_EMBEDDING_MODEL')
+		FAQ_EMBEDDING_DIM = int(os.environ.get('FAQ_EMBEDDING_DIM', '512'))
+		FAQ_EMBEDDINGS_DIR = os.environ.get('FAQ_EMBEDDINGS_DIR', 'data/faq_embeddings')
+		FAQ_BATCH_WINDOW_MS = float(os.environ.get('FAQ_BATCH_WINDOW_MS', '2'))
+		FAQ_BATCH_MAX_SIZE = int(os.environ.get('FAQ_BATCH_MAX_SIZE', '32'))
+		MODERATION_THRESHOLD = float(os.environ.get('MODERATION_THRESHOLD', '0.7'))
+		MODERATION_WORKERS = int(os.environ.get('MODERATION_WORKERS', '1'))
+		MODERATION_RULES_PATH = os.environ.get('MODERATION_RULES_PATH')
+		MODERATION_MODEL_PATH = os.environ.get('MODERATION_MODEL_PATH')
+		RATE_LIMIT_ENABLED = _env_bool('RATE_LIMIT_ENABLED', True)
+		RATE_LIMIT_WINDOW_SECONDS = float(os.environ.get('RATE_LIMIT_WINDOW_SECONDS', '600'))
+		RATE_LIMIT_ISSUES = int(os.environ.get('RATE_LIMIT_ISSUES', '10'))
+		RATE_LIMIT_COMMENTS = int(os.environ.get('RATE_LIMIT_COMMENTS', '30'))
+		RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', '0'))
+		RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+		RATE_LIMIT_SHARED_PATH = os.environ.get('RATE_LIMIT_SHARED_PATH')
+		ANALYTICS_SOURCE = os.environ.get('ANALYTICS_SOURCE', 'rollups')
+		ISSUE_SNAPSHOT_MAX_AGE_SECONDS = float(os.environ.get('ISSUE_SNAPSHOT_MAX_AGE_SECONDS', '30'))
+		ISSUE_SNAPSHOT_FULL_REFRESH_SECONDS = float(os.environ.get('ISSUE_SNAPSHOT_FULL_REFRESH_SECONDS', '3600'))
+		ISSUE_SNAPSHOT_OVERLAP_SECONDS = float(os.environ.get('ISSUE_SNAPSHOT_OVERLAP_SECONDS', '5'))
+		ISSUE_SNAPSHOT_PAGE_SIZE = int(os.environ.get('ISSUE_SNAPSHOT_PAGE_SIZE', '5000'))
+		ADMIN_SUMMARY_CACHE_SECONDS = float(os.environ.get('ADMIN_SUMMARY_CACHE_SECONDS', '15'))
+		ISSUE_BULK_MAX_IDS = int(os.environ.get('ISSUE_BULK_MAX_IDS', '1000'))
+		ISSUE_BULK_CHUNK_SIZE = int(os.environ.get('ISSUE_BULK_CHUNK_SIZE', '200'))
 
 
 	settings = Settings()
 
 
-if cloudinary and settings.CLOUDINARY_CLOUD_NAME and settings.CLOUDINARY_API_KEY and settings.CLOUDINARY_API_SECRET:
-	cloudinary.config(
-		cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-		api_key=settings.CLOUDINARY_API_KEY,
-		api_secret=settings.CLOUDINARY_API_SECRET,
-		secure=True,
-	)
+_cloudinary_sdk = {'module': None, 'loaded': False}
+
+
+def cloudinary_sdk() -> Any:
+	"""Imports and configures the Cloudinary SDK on first use.
 
+	Uploads and deletions go through `services/cloudinary_service.py` over
+	plain HTTP, so the SDK is not imported at startup. Code that needs the SDK
+	should call this function.
 
+	Returns:
+		The configured `cloudinary` module, or None if it is not installed.
+	"""
+	if not _cloudinary_sdk['loaded']:
+		_cloudinary_sdk['loaded'] = True
+		try:
+			import cloudinary
+		except Exception:
+			cloudinary = None
+		if cloudinary and settings.CLOUDINARY_CLOUD_NAME and settings.CLOUDINARY_API_KEY and settings.CLOUDINARY_API_SECRET:
+			cloudinary.config(
+				cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+				api_key=settings.CLOUDINARY_API_KEY,
+				api_secret=settings.CLOUDINARY_API_SECRET,
+				secure=True,
+			)
+		_cloudinary_sdk['module'] = cloudinary
+	return _cloudinary_sdk['module']
@@ -0,0 +1,169 @@
+"""Long-lived, pooled HTTP clients for upstream services.
+
+Each upstream (Supabase REST, Supabase Auth, Cloudinary) gets a single
+`httpx.AsyncClient` with its own keep-alive pool and timeout, so requests reuse
+TCP/TLS connections instead of paying a fresh handshake per call. The clients
+are opened in the FastAPI lifespan hook (`main.py`) and closed on shutdown;
+code running outside the app (scripts, workers) gets them created lazily on
+first use.
+"""
+import time
+from typing import Any, Dict, Optional
+import httpx
+from ..config import settings
+
+
+SUPABASE = 'supabase'
+AUTH = 'auth'
+CLOUDINARY = 'cloudinary'
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def _timeouts() -> Dict[str, float]:
+    """Returns the configured request timeout (seconds) for each upstream."""
+    return {
+        SUPABASE: float(settings.SUPABASE_TIMEOUT),
+        AUTH: float(settings.SUPABASE_AUTH_TIMEOUT),
+        CLOUDINARY: float(settings.CLOUDINARY_TIMEOUT),
+    }
+
+
+def _http2_available() -> bool:
+    """Checks whether HTTP/2 was requested and the optional `h2` package is installed."""
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {'requests': 0, 'errors': 0, 'in_flight': 0, 'peak_in_flight': 0, 'total_seconds': 0.0}
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    """Builds a pooled client for the named upstream using the configured limits."""
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(_timeouts().get(name, 10.0))
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_available())
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Returns the shared client for an upstream, creating it on first use.
+
+    Args:
+        name: The upstream name (`SUPABASE`, `AUTH` or `CLOUDINARY`).
+
+    Returns:
+        The long-lived `httpx.AsyncClient` for that upstream.
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _create_client(name)
+        _clients[name] = client
+        _stats.setdefault(name, _new_stats())
+    return client
+
+
+async def startup() -> None:
+    """Opens one client per upstream. Called from the application lifespan."""
+    for name in (SUPABASE, AUTH, CLOUDINARY):
+        get_client(name)
+
+
+async def shutdown() -> None:
+    """Closes all shared clients and releases their pooled connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+
+
+async def request(name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Sends a request through the shared client of an upstream.
+
+    This is a thin wrapper around `httpx.AsyncClient.request` that records
+    request counts, errors, latency and concurrent in-flight requests so the
+    pool can be sized from `pool_stats()`.
+
+    Args:
+        name: The upstream name.
+        method: The HTTP method.
+        url: The absolute request URL.
+        **kwargs: Passed through to `httpx.AsyncClient.request`.
+
+    Returns:
+        The `httpx.Response`.
+    """
+    client = get_client(name)
+    stats = _stats.setdefault(name, _new_stats())
+    stats['requests'] += 1
+    stats['in_flight'] += 1
+    stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+    started = time.perf_counter()
+    try:
+        return await client.request(method, url, **kwargs)
+    except Exception:
+        stats['errors'] += 1
+        raise
+    finally:
+        stats['in_flight'] -= 1
+        stats['total_seconds'] += time.perf_counter() - started
+
+
+def _connection_counts(client: httpx.AsyncClient) -> Optional[Dict[str, int]]:
+    """Inspects the underlying httpcore pool for open/idle connection counts.
+
+    httpx does not expose pool state publicly, so this is best effort and
+    returns None when the transport does not look like the default one.
+    """
+    pool = getattr(getattr(client, '_transport', None), '_pool', None)
+    connections = getattr(pool, 'connections', None)
+    if connections is None:
+        return None
+    idle = 0
+    for conn in connections:
+        try:
+            if conn.is_idle():
+                idle += 1
+        except Exception:
+            pass
+    return {'open': len(connections), 'idle': idle, 'active': len(connections) - idle}
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Reports pool configuration and usage for every upstream client.
+
+    Returns:
+        A dictionary keyed by upstream name with request counters, average
+        latency, in-flight/peak concurrency and open/idle connection counts.
+    """
+    out: Dict[str, Any] = {}
+    timeouts = _timeouts()
+    for name, stats in _stats.items():
+        client = _clients.get(name)
+        requests = stats['requests']
+        out[name] = {
+            'requests': requests,
+            'errors': stats['errors'],
+            'in_flight': stats['in_flight'],
+            'peak_in_flight': stats['peak_in_flight'],
+            'avg_ms': round(stats['total_seconds'] * 1000.0 / requests, 2) if requests else None,
+            'timeout_seconds': timeouts.get(name),
+            'max_connections': settings.HTTP_MAX_CONNECTIONS,
+            'max_keepalive_connections': settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            'http2': _http2_available(),
+            'connections': _connection_counts(client) if client is not None and not client.is_closed else None,
+        }
+    return out
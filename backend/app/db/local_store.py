@@ -0,0 +1,70 @@
+"""Helpers for small node-local SQLite stores shared between worker processes.
+
+Several features keep state on local disk so that every Uvicorn worker on the
+host sees the same data without an extra service. The database runs in WAL
+mode with a busy timeout, so concurrent readers and writers from different
+processes do not fail with "database is locked". Connections are opened per
+store and guarded by a lock; callers run queries through `run` so that the
+blocking SQLite work happens in a thread instead of on the event loop.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Iterable, Optional
+
+
+class LocalStore:
+    """A lazily opened SQLite database file with a one-time schema setup."""
+
+    def __init__(self, path: str, schema: Iterable[str] = ()):
+        self.path = path
+        self.schema = list(schema)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            for statement in self.schema:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def call(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Runs `fn(connection)` synchronously while holding the store lock."""
+        with self._lock:
+            return fn(self._connect())
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Runs `fn(connection)` in a worker thread and returns its result."""
+        return await asyncio.to_thread(self.call, fn)
+
+    def close(self) -> None:
+        """Closes the connection; it is reopened on next use."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def transaction(conn: sqlite3.Connection, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+    """Runs `fn` inside `BEGIN IMMEDIATE ... COMMIT`, rolling back on error.
+
+    `BEGIN IMMEDIATE` takes the write lock up front, so read-then-write
+    sequences are atomic across processes.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(conn)
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return result
@@ -1,6 +1,9 @@
-from typing import Any, Dict, Optional
-import httpx
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+import asyncio
+import copy
 from ..config import settings
+from . import http_clients
 
 
 BASE_REST = str(settings.SUPABASE_URL).rstrip('/') + '/rest/v1'
@@ -9,12 +12,20 @@ BASE_AUTH = str(settings.SUPABASE_URL).rstrip('/') + '/auth/v1'
 API_KEY = getattr(settings, 'SUPABASE_SERVICE_ROLE_KEY', None) or settings.SUPABASE_KEY
 
 
+def _encode_value(value: Any) -> str:
+    """URL-encodes a filter value while keeping PostgREST syntax characters readable."""
+    return quote(str(value), safe=',.():*"')
+
+
 def _build_filters(filters: Optional[Dict[str, Any]]) -> Optional[str]:
     """Builds a Supabase filter query string from a dictionary.
 
     Example:
         `{'id.eq': 5, 'status': 'pending'}` becomes `"id=eq.5&status=eq.pending"`
 
+    The logical operators `or` and `and` are passed through verbatim, e.g.
+    `{'or': '(status.eq.pending,status.eq.assigned)'}`.
+
     Args:
         filters: A dictionary of filters. Keys can include operators
             (e.g., 'column.operator') or be simple column names for equality.
@@ -27,67 +38,254 @@ def _build_filters(filters: Optional[Dict[str, Any]]) -> Optional[str]:
         return None
     parts = []
     for k, v in filters.items():
-        if '.' in k:
+        if k in ('or', 'and'):
+            parts.append(f"{k}={_encode_value(v)}")
+        elif '.' in k:
             col, op = k.split('.', 1)
-            parts.append(f"{col}={op}.{v}")
+            parts.append(f"{col}={op}.{_encode_value(v)}")
         else:
-            parts.append(f"{k}=eq.{v}")
+            parts.append(f"{k}=eq.{_encode_value(v)}")
     return '&'.join(parts)
 
 
-async def supabase_request(method: str, table: str, payload: Optional[Dict] = None, filters: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None):
+def _build_query(filters: Optional[Dict[str, Any]], select: Optional[str] = None, order: Optional[str] = None, limit: Optional[int] = None, offset: Optional[int] = None) -> Optional[str]:
+    """Combines filters with the PostgREST `select`, `order`, `limit` and `offset` options.
+
+    Args:
+        filters: Filters as accepted by `_build_filters`.
+        select: Columns to return, e.g. `'id,status'`.
+        order: Ordering, e.g. `'created_at.desc,id.desc'`.
+        limit: The maximum number of rows to return.
+        offset: The number of rows to skip.
+
+    Returns:
+        The query string, or None if there is nothing to send.
+    """
+    parts = []
+    built = _build_filters(filters)
+    if built:
+        parts.append(built)
+    if select:
+        parts.append(f"select={_encode_value(select)}")
+    if order:
+        parts.append(f"order={_encode_value(order)}")
+    if limit is not None:
+        parts.append(f"limit={int(limit)}")
+    if offset:
+        parts.append(f"offset={int(offset)}")
+    return '&'.join(parts) or None
+
+
+def _parse_content_range(value: Optional[str]) -> Optional[int]:
+    """Extracts the total row count from a PostgREST `Content-Range` header.
+
+    Example:
+        `'0-24/3573'` returns `3573`; `'0-24/*'` returns None.
+    """
+    if not value or '/' not in value:
+        return None
+    total = value.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+async def supabase_request(
+    method: str,
+    table: str,
+    payload: Optional[Any] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    select: Optional[str] = None,
+    order: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    row_range: Optional[Tuple[int, int]] = None,
+    count: Optional[str] = None,
+):
     """Performs a generic request to a Supabase REST endpoint.
 
-    This function is a wrapper around httpx to interact with the Supabase
-    `/rest/v1` API, handling authentication and request construction.
+    This function sends requests through the shared, pooled Supabase client
+    (see `db/http_clients.py`) to interact with the `/rest/v1` API, handling
+    authentication and request construction. Pagination and ordering are
+    pushed down to PostgREST so only the requested rows are transferred.
+    Concurrent identical GETs share a single upstream call (see
+    `_coalesced_get`); writes are always sent individually.
 
     Args:
         method: The HTTP method (GET, POST, PATCH, DELETE).
         table: The name of the database table to interact with.
-        payload: A dictionary for the request body (for POST, PATCH).
+        payload: A dictionary (or list of dictionaries for bulk inserts) for
+            the request body (for POST, PATCH).
         filters: A dictionary of filters to apply (for GET, PATCH, DELETE).
         headers: Optional additional headers to include in the request.
+        select: Optional column list for the `select` query parameter.
+        order: Optional ordering for the `order` query parameter, e.g.
+            `'created_at.desc,id.desc'`.
+        limit: Optional maximum number of rows to return.
+        offset: Optional number of rows to skip.
+        row_range: Optional inclusive `(start, end)` row range sent as a
+            `Range` header.
+        count: Optional count strategy (`'exact'`, `'planned'` or
+            `'estimated'`) sent as `Prefer: count=...`.
 
     Returns:
         A dictionary containing the response status code, data, and headers.
+        When `count` is requested it also contains the total row `count`
+        parsed from the `Content-Range` header.
     """
     url = f"{BASE_REST}/{table}"
-    params = _build_filters(filters)
+    params = _build_query(filters, select=select, order=order, limit=limit, offset=offset)
     req_headers = {
         'apikey': API_KEY,
         'Authorization': f'Bearer {API_KEY}',
         'Accept': 'application/json',
     }
+    if row_range is not None:
+        req_headers['Range-Unit'] = 'items'
+        req_headers['Range'] = f"{int(row_range[0])}-{int(row_range[1])}"
+    if count:
+        req_headers['Prefer'] = f"count={count}"
     if headers:
+        if count and headers.get('Prefer'):
+            req_headers['Prefer'] = f"{headers['Prefer']},count={count}"
+            headers = {k: v for k, v in headers.items() if k != 'Prefer'}
         req_headers.update(headers)
 
-    async with httpx.AsyncClient() as client:
-        if method.upper() == 'GET':
-            full_url = url + (f"?{params}" if params else '')
-            r = await client.get(full_url, headers=req_headers)
-        elif method.upper() == 'POST':
-            r = await client.post(url, json=payload, headers=req_headers)
-        elif method.upper() == 'PATCH':
-            full_url = url + (f"?{params}" if params else '')
-            r = await client.patch(full_url, json=payload, headers=req_headers)
-        elif method.upper() == 'DELETE':
-            full_url = url + (f"?{params}" if params else '')
-            r = await client.delete(full_url, headers=req_headers)
-        else:
-            raise ValueError('Unsupported method')
+    method = method.upper()
+    if method == 'GET':
+        full_url = url + (f"?{params}" if params else '')
+        if settings.SUPABASE_COALESCE_GETS:
+            return await _coalesced_get(full_url, req_headers, count)
+        _coalesce_stats['bypassed'] += 1
+        return await _send_rest('GET', full_url, req_headers, count=count)
+    _coalesce_stats['bypassed'] += 1
+    if method == 'POST':
+        result = await _send_rest('POST', url, req_headers, payload=payload, count=count)
+    elif method == 'PATCH':
+        full_url = url + (f"?{params}" if params else '')
+        result = await _send_rest('PATCH', full_url, req_headers, payload=payload, count=count)
+    elif method == 'DELETE':
+        full_url = url + (f"?{params}" if params else '')
+        result = await _send_rest('DELETE', full_url, req_headers, count=count)
+    else:
+        raise ValueError('Unsupported method')
+    if result.get('status_code', 500) < 300:
+        _notify_write(table)
+    return result
+
+
+async def supabase_rpc(function: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Calls a Postgres function exposed by PostgREST (`POST /rest/v1/rpc/<function>`).
+
+    RPCs let several statements run server-side in one transaction and one
+    round trip. They are never coalesced, since functions may write.
+
+    Args:
+        function: The SQL function name.
+        params: Named arguments of the function.
+        headers: Optional additional headers to include in the request.
+
+    Returns:
+        A dictionary containing the response status code, data (the function's
+        return value), and headers.
+    """
+    req_headers = {
+        'apikey': API_KEY,
+        'Authorization': f'Bearer {API_KEY}',
+        'Accept': 'application/json',
+    }
+    if headers:
+        req_headers.update(headers)
+    _coalesce_stats['bypassed'] += 1
+    return await _send_rest('POST', f"{BASE_REST}/rpc/{function}", req_headers, payload=params or {})
+
+
+_write_listeners: List[Callable[[str], None]] = []
+
 
+def add_write_listener(listener: Callable[[str], None]) -> None:
+    """Registers a callback invoked with the table name after every successful write.
+
+    Used by in-process caches to invalidate themselves when this backend
+    modifies the underlying table.
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def _notify_write(table: str) -> None:
+    for listener in _write_listeners:
         try:
-            data = r.json()
+            listener(table)
         except Exception:
-            data = {'text': r.text}
-        return {'status_code': r.status_code, 'data': data, 'headers': dict(r.headers)}
+            pass
+
+
+async def _send_rest(method: str, url: str, req_headers: Dict[str, str], payload: Optional[Any] = None, count: Optional[str] = None) -> Dict[str, Any]:
+    """Sends one request to PostgREST and normalizes the response into a dictionary."""
+    if method in ('POST', 'PATCH'):
+        r = await http_clients.request(http_clients.SUPABASE, method, url, json=payload, headers=req_headers)
+    else:
+        r = await http_clients.request(http_clients.SUPABASE, method, url, headers=req_headers)
+    try:
+        data = r.json()
+    except Exception:
+        data = {'text': r.text}
+    result = {'status_code': r.status_code, 'data': data, 'headers': dict(r.headers)}
+    if count:
+        result['count'] = _parse_content_range(r.headers.get('content-range'))
+    return result
+
+
+# In-flight GETs keyed by (url, headers). Each entry is [task, follower_count].
+_inflight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[Any]] = {}
+_coalesce_stats = {'upstream': 0, 'collapsed': 0, 'bypassed': 0}
+
+
+async def _coalesced_get(full_url: str, req_headers: Dict[str, str], count: Optional[str]) -> Dict[str, Any]:
+    """Shares one upstream call between concurrent, byte-identical GETs (single flight).
+
+    The key covers the full URL (table, filters, ordering, paging) and every
+    request header, including the auth context, so only truly identical
+    requests are merged. The upstream call runs in its own task and is
+    shielded, so a cancelled caller does not cancel it for the others. When
+    a result was shared, each caller receives its own deep copy so one
+    caller mutating rows cannot affect another.
+    """
+    key = (full_url, tuple(sorted(req_headers.items())))
+    entry = _inflight.get(key)
+    if entry is None:
+        task = asyncio.ensure_future(_send_rest('GET', full_url, req_headers, count=count))
+        entry = [task, 0]
+        _inflight[key] = entry
+        _coalesce_stats['upstream'] += 1
+
+        def _done(_task, key=key, entry=entry):
+            if _inflight.get(key) is entry:
+                del _inflight[key]
+        task.add_done_callback(_done)
+    else:
+        entry[1] += 1
+        _coalesce_stats['collapsed'] += 1
+    result = await asyncio.shield(entry[0])
+    return copy.deepcopy(result) if entry[1] else result
+
+
+def coalescing_stats() -> Dict[str, int]:
+    """Returns single-flight counters.
+
+    `upstream` counts GETs actually sent, `collapsed` counts GETs that
+    reused another caller's in-flight request, and `bypassed` counts
+    requests that skipped coalescing (writes, or GETs when disabled).
+    """
+    return dict(_coalesce_stats, in_flight=len(_inflight))
 
 
 async def auth_request(method: str, path: str, payload: Optional[Dict] = None, token: Optional[str] = None, form: bool = False):
     """Performs a request to a Supabase Auth endpoint.
 
-    This function is a wrapper around httpx to interact with the Supabase
-    `/auth/v1` API, handling authentication and request construction.
+    This function sends requests through the shared, pooled Auth client
+    (see `db/http_clients.py`) to interact with the `/auth/v1` API, handling
+    authentication and request construction.
 
     Args:
         method: The HTTP method (GET, POST, DELETE).
@@ -104,23 +302,21 @@ async def auth_request(method: str, path: str, payload: Optional[Dict] = None, t
     if token:
         req_headers['Authorization'] = f'Bearer {token}'
 
-    async with httpx.AsyncClient() as client:
-        if method.upper() == 'GET':
-            r = await client.get(url, headers=req_headers)
-        elif method.upper() == 'POST':
-            # For form posts we still want to include Authorization and apikey headers
-            if form:
-                r = await client.post(url, data=payload, headers=req_headers)
-            else:
-                r = await client.post(url, json=payload, headers=req_headers)
-        elif method.upper() == 'DELETE':
-            r = await client.delete(url, headers=req_headers)
+    method = method.upper()
+    if method == 'GET':
+        r = await http_clients.request(http_clients.AUTH, 'GET', url, headers=req_headers)
+    elif method == 'POST':
+        # For form posts we still want to include Authorization and apikey headers
+        if form:
+            r = await http_clients.request(http_clients.AUTH, 'POST', url, data=payload, headers=req_headers)
         else:
-            raise ValueError('Unsupported auth method')
-        try:
-            data = r.json()
-        except Exception:
-            data = {'text': r.text}
-        return {'status_code': r.status_code, 'data': data, 'headers': dict(r.headers)}
-
-
+            r = await http_clients.request(http_clients.AUTH, 'POST', url, json=payload, headers=req_headers)
+    elif method == 'DELETE':
+        r = await http_clients.request(http_clients.AUTH, 'DELETE', url, headers=req_headers)
+    else:
+        raise ValueError('Unsupported auth method')
+    try:
+        data = r.json()
+    except Exception:
+        data = {'text': r.text}
+    return {'status_code': r.status_code, 'data': data, 'headers': dict(r.headers)}
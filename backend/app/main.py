@@ -2,20 +2,64 @@
 
 This module initializes the FastAPI application, configures middleware (CORS),
 includes all the API routers from the `routes` directory, sets up custom
-exception handlers, and defines a simple health check endpoint.
+exception handlers, and defines simple health check and metrics endpoints.
+
+Long-lived resources (the pooled upstream HTTP clients, the image processing
+pool, the in-process job worker) are opened and closed in the application
+lifespan hook.
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import os
 
 from .routes import issues, auth, faq, notifications
 from .routes import users
 from .routes import admin
 from .utils.error_handler import validation_exception_handler, http_exception_handler, generic_exception_handler
+from .db import http_clients
+from .db.supabase_client import coalescing_stats
+from .utils.auth_dependencies import token_cache_stats
+from .utils.rate_limit import rate_limit_stats
+from .services.reference_cache import reference_cache_stats
+from .services import dashboard, department_classifier, image_index, image_pipeline, issue_snapshot, job_queue
+from .services import issue_jobs  # noqa: F401  (registers job handlers)
+from .services.routing_engine import routing_stats
+from .ai import faq_index, faq_model, moderation, registry
+from .config import settings
 from fastapi.exceptions import RequestValidationError
 from fastapi import HTTPException
 
-app = FastAPI(title='Civic Reporting Backend')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens shared resources on startup and releases them on shutdown.
+
+    Unless `JOB_WORKER_IN_PROCESS` is disabled (when running
+    `python -m app.cli.worker` separately), the background job worker runs
+    alongside the API in this process. Models are loaded by a background
+    warmup (see `ai/registry.py`) so that startup is not delayed; readiness is
+    reported by `/health/ready`.
+    """
+    await http_clients.startup()
+    warmup = registry.start_warmup()
+    stop_worker = asyncio.Event()
+    worker = asyncio.ensure_future(job_queue.run_worker(stop_worker)) if settings.JOB_WORKER_IN_PROCESS else None
+    try:
+        yield
+    finally:
+        stop_worker.set()
+        if worker is not None:
+            await worker
+        if not warmup.done():
+            warmup.cancel()
+        image_pipeline.shutdown()
+        moderation.shutdown()
+        await http_clients.shutdown()
+
+
+app = FastAPI(title='Civic Reporting Backend', lifespan=lifespan)
 
 # Allow only the local frontend origin during development
 app.add_middleware(
@@ -24,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Register routers (each router sets its own prefix/tag)
@@ -40,10 +85,57 @@ def health():
     """Provides a simple health check endpoint.
 
     Returns:
-        A dictionary with a single key 'ok' set to True, indicating the
-        service is running.
+        A dictionary with 'ok' set to True, indicating the service is running,
+        plus whether all models have been loaded ('ready') and the status of
+        each model.
+    """
+    return dict(registry.readiness(), ok=True)
+
+
+@app.get('/health/ready')
+def health_ready(response: Response):
+    """Readiness probe: 200 once the model warmup finished, 503 before.
+
+    Returns:
+        The model readiness report (see `health`).
+    """
+    report = registry.readiness()
+    if not report['ready']:
+        response.status_code = 503
+    return report
+
+
+@app.get('/metrics')
+async def metrics():
+    """Reports in-process runtime metrics used for capacity planning.
+
+    Returns:
+        A dictionary with per-upstream HTTP pool usage statistics, the
+        validated-token cache counters, the GET coalescing counters, the
+        reference table cache counters, image preprocessing totals, image
+        deduplication counters, job queue depth, the routing rule set size and
+        department classifier counters, the FAQ search index size and semantic
+        FAQ search counters, moderation counters, rate limiting counters and the
+        size, memory footprint and refresh cost of the analytics issue snapshot,
+        and the dashboard summary build and cache counters.
     """
-    return {'ok': True}
+    return {
+        'http': http_clients.pool_stats(),
+        'auth_cache': token_cache_stats(),
+        'coalescing': coalescing_stats(),
+        'reference_cache': reference_cache_stats(),
+        'image_pipeline': image_pipeline.pipeline_stats(),
+        'image_dedup': image_index.index_stats(),
+        'jobs': await job_queue.queue_stats(),
+        'routing': routing_stats(),
+        'department_classifier': department_classifier.classifier_stats(),
+        'faq_index': faq_index.index_stats(),
+        'faq_semantic': faq_model.model_stats(),
+        'moderation': moderation.moderation_stats(),
+        'rate_limit': rate_limit_stats(),
+        'issue_snapshot': issue_snapshot.snapshot_stats(),
+        'dashboard_summary': dashboard.summary_stats(),
+    }
 
 
 # Custom exception handler for validation errors
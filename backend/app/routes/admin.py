@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Literal, Optional
 from ..db.supabase_client import supabase_request
 from ..utils.auth_dependencies import get_current_user
 from ..schemas.api_models import (
     SimpleOK,
     IssuesByTimeItem,
     ResponseTimesModel,
+    ResponseTimeBreakdownItem,
     HotspotItem,
+    DashboardSummaryModel,
 )
 from ..utils.validation import validate_list, validate_single
+from ..services.job_queue import get_job
+from ..services import analytics, dashboard
+from ..services.hotspots import find_hotspots
 
 router = APIRouter(prefix='/admin', tags=['admin'])
 
@@ -73,15 +78,39 @@ async def delete_user(user_id: str, user=Depends(get_current_user)):
 
 
 
+@router.get('/jobs/{job_id}', response_model=dict)
+async def job_status(job_id: int, user=Depends(get_current_user)):
+    """Returns the status of a background job.
+
+    This is a protected endpoint available only to admin users.
+
+    Args:
+        job_id: The ID returned when the job was enqueued.
+        user: The authenticated user, injected by FastAPI.
+
+    Returns:
+        The job's kind, status, attempts, last error and payload.
+    """
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail='Forbidden')
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return job
+
+
 @router.get('/analytics/issues-by-time', response_model=List[IssuesByTimeItem])
-async def issues_by_time(days: int = 7, user=Depends(get_current_user)):
+async def issues_by_time(days: int = 7, department_id: Optional[str] = None, status: Optional[str] = None, user=Depends(get_current_user)):
     """Gets the number of issues created per day for a recent period.
 
     This is a protected endpoint available only to admin users. It provides
-    data suitable for time-series charts.
+    data suitable for time-series charts and reads the daily rollup table
+    rather than the issues themselves (see `services/analytics.py`).
 
     Args:
         days: The number of past days to include in the analysis.
+        department_id: Only count issues currently assigned to this department.
+        status: Only count issues currently in this status.
         user: The authenticated user, injected by FastAPI.
 
     Returns:
@@ -90,113 +119,132 @@ async def issues_by_time(days: int = 7, user=Depends(get_current_user)):
     """
     if not user or user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail='Forbidden')
-    # simple implementation: fetch recent issues and group by created_at date
-    r = await supabase_request('GET', 'issues')
-    rows = r.get('data') or []
-    # naive grouping
-    from collections import defaultdict
-    from datetime import datetime, timedelta
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    counts = defaultdict(int)
-    for it in rows:
-        ca = it.get('created_at')
-        if not ca:
-            continue
-        try:
-            d = datetime.fromisoformat(ca)
-        except Exception:
-            continue
-        if d < cutoff:
-            continue
-        counts[d.date().isoformat()] += 1
-    return validate_list(IssuesByTimeItem, [{'date': k, 'count': v} for k, v in sorted(counts.items())])
+    return validate_list(IssuesByTimeItem, await analytics.issues_by_day(days, department_id, status))
 
 
 @router.get('/analytics/response-times', response_model=ResponseTimesModel)
-async def response_times(days: int = 30, user=Depends(get_current_user)):
-    """Calculates the average issue response time over a recent period.
+async def response_times(days: int = 30, department_id: Optional[str] = None, category: Optional[str] = None, user=Depends(get_current_user)):
+    """Calculates issue response time statistics over a recent period.
 
     This is a protected endpoint available only to admin users. "Response time"
-    is defined as the duration between issue creation and resolution.
+    is defined as the duration between issue creation and resolution. The
+    values are merged from pre-aggregated histograms rather than computed
+    from the issues (see `services/analytics.py`).
 
     Args:
         days: The number of past days to include in the analysis.
+        department_id: Only include issues assigned to this department.
+        category: Only include issues in this category.
         user: The authenticated user, injected by FastAPI.
 
     Returns:
-        An object containing the average response time in hours and the
-        total number of issues included in the calculation.
+        An object containing the average and the 50th, 90th and 99th
+        percentile response times in hours, and the total number of issues
+        included in the calculation.
     """
     if not user or user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail='Forbidden')
-    r = await supabase_request('GET', 'issues')
-    rows = r.get('data') or []
-    from datetime import datetime, timedelta
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    total = 0.0
-    count = 0
-    for it in rows:
-        created = it.get('created_at')
-        resolved = it.get('resolved_at')
-        if not created or not resolved:
-            continue
-        try:
-            c = datetime.fromisoformat(created)
-            rtime = datetime.fromisoformat(resolved)
-        except Exception:
-            continue
-        if c < cutoff:
-            continue
-        total += (rtime - c).total_seconds() / 3600.0
-        count += 1
-    avg = (total / count) if count else None
-    return validate_single(ResponseTimesModel, {'average_hours': avg, 'count': count})
+    return validate_single(ResponseTimesModel, await analytics.response_time_summary(days, department_id, category))
+
+
+@router.get('/analytics/response-times/breakdown', response_model=List[ResponseTimeBreakdownItem])
+async def response_times_breakdown(days: int = 30, group_by: Literal['department', 'category'] = 'department', user=Depends(get_current_user)):
+    """Calculates response time statistics per department or per category.
+
+    This is a protected endpoint available only to admin users.
+
+    Args:
+        days: The number of past days to include in the analysis.
+        group_by: Either `department` or `category`.
+        user: The authenticated user, injected by FastAPI.
+
+    Returns:
+        One item per department or category, with the same statistics as
+        `/analytics/response-times` and a `key` identifying the group.
+    """
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail='Forbidden')
+    return validate_list(ResponseTimeBreakdownItem, await analytics.response_time_breakdown(days, group_by))
 
 
 @router.get('/analytics/hotspots', response_model=List[HotspotItem])
-async def hotspots(radius_meters: int = 250, days: int = 30, user=Depends(get_current_user)):
+async def hotspots(
+    radius_meters: int = 250,
+    days: int = 30,
+    min_points: int = 3,
+    limit: int = 20,
+    member_limit: int = 100,
+    user=Depends(get_current_user),
+):
     """Identifies geographic hotspots with a high density of reported issues.
 
-    This is a protected endpoint available only to admin users. It uses a naive
-    clustering algorithm based on rounding coordinates.
+    This is a protected endpoint available only to admin users. Issue
+    locations are clustered with a grid-based density clustering (see
+    `services/hotspots.py`).
 
     Args:
-        radius_meters: The radius to consider for clustering (currently unused
-            as the implementation uses a simple rounding approach).
+        radius_meters: Issues within this distance of each other are
+            neighbours.
         days: The number of past days to include in the analysis.
+        min_points: The number of issues within `radius_meters` that makes
+            an area a hotspot.
+        limit: The maximum number of hotspots to return.
+        member_limit: The maximum number of issue IDs listed per hotspot.
+        user: The authenticated user, injected by FastAPI.
+
+    Returns:
+        A list of hotspot items ordered by issue count, each containing the
+        centroid latitude and longitude, the count of issues in the cluster,
+        its radius and the member issue IDs.
+    """
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail='Forbidden')
+    if radius_meters <= 0 or min_points < 1:
+        raise HTTPException(status_code=400, detail='radius_meters and min_points must be positive')
+    items = await find_hotspots(radius_meters, days, min_points, limit, member_limit)
+    return validate_list(HotspotItem, items)
+
+
+@router.get('/dashboard/summary', response_model=DashboardSummaryModel)
+async def dashboard_summary(
+    response: Response,
+    days: int = 7,
+    response_days: int = 30,
+    radius_meters: int = 250,
+    hotspot_days: int = 30,
+    user_limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
+    user=Depends(get_current_user),
+):
+    """Returns everything the admin dashboard shows in one response.
+
+    This is a protected endpoint available only to admin users. It combines
+    the issues-by-time series, the response time statistics, the hotspots
+    and the first page of users, computed concurrently and cached briefly on
+    the server (see `services/dashboard.py`). The response carries an ETag;
+    a request whose `If-None-Match` matches it gets an empty 304 response.
+
+    Args:
+        response: The outgoing response, used to set caching headers.
+        days: The number of past days in the issues-by-time series.
+        response_days: The number of past days for the response times.
+        radius_meters: The hotspot clustering radius.
+        hotspot_days: The number of past days for the hotspots.
+        user_limit: The maximum number of users to include.
+        if_none_match: The ETag(s) the client already has.
         user: The authenticated user, injected by FastAPI.
 
     Returns:
-        A list of hotspot items, each containing a latitude, longitude, and
-        the count of issues in that cluster.
+        The combined dashboard data, or 304 Not Modified.
     """
     if not user or user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail='Forbidden')
-    r = await supabase_request('GET', 'issues')
-    rows = r.get('data') or []
-    # naive approach: group by rounded lat/lon
-    from collections import defaultdict
-    def round_coord(coord):
-        try:
-            return round(float(coord), 3)
-        except Exception:
-            return None
-    groups = defaultdict(int)
-    for it in rows:
-        loc = it.get('location')
-        if not loc:
-            continue
-        # expect 'lat,lon'
-        parts = str(loc).split(',')
-        if len(parts) < 2:
-            continue
-        lat = round_coord(parts[0])
-        lon = round_coord(parts[1])
-        if lat is None or lon is None:
-            continue
-        groups[(lat, lon)] += 1
-    hotspots = []
-    for (lat, lon), cnt in groups.items():
-        hotspots.append({'lat': lat, 'lon': lon, 'count': cnt})
-    hotspots.sort(key=lambda x: x['count'], reverse=True)
-    return validate_list(HotspotItem, hotspots[:20])
+    if radius_meters <= 0:
+        raise HTTPException(status_code=400, detail='radius_meters must be positive')
+    payload, etag = await dashboard.get_summary(days, response_days, radius_meters, hotspot_days, user_limit)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip().removeprefix('W/') for t in if_none_match.split(',')]):
+        dashboard.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return validate_single(DashboardSummaryModel, payload)
@@ -4,6 +4,7 @@ from ..schemas.auth import SignupRequest, LoginRequest
 from ..schemas.api_models import AuthLoginResponse, SimpleOK
 from ..services.auth_service import signup_user, login_user
 from ..db.supabase_client import auth_request
+from ..utils.auth_dependencies import invalidate_token
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 
@@ -65,6 +66,7 @@ async def logout(authorization: Optional[str] = Header(None)):
     if not authorization:
         raise HTTPException(status_code=401, detail='Missing Authorization')
     token = authorization.split(' ', 1)[1] if authorization.startswith('Bearer ') else authorization
+    invalidate_token(token)
     res = await auth_request('POST', '/logout', token=token)
     if res.get('status_code') not in (200, 204):
         raise HTTPException(status_code=400, detail='Failed to logout')
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from ..db.supabase_client import supabase_request
+from ..services.reference_cache import get_reference_rows
 from ..ai.model import answer_query
 
 router = APIRouter(prefix='/faq', tags=['faq'])
@@ -7,25 +7,34 @@ router = APIRouter(prefix='/faq', tags=['faq'])
 
 @router.get('/')
 async def get_faqs():
-    """Retrieves all Frequently Asked Questions (FAQs) from the database.
+    """Retrieves all Frequently Asked Questions (FAQs).
+
+    Rows are served from the in-process reference cache and refreshed from
+    the database in the background once they go stale.
 
     Returns:
         A list of FAQ objects, each typically containing a question and an answer.
     """
-    r = await supabase_request('GET', 'faq')
-    return r.get('data')
+    return await get_reference_rows('faq')
 
 
 @router.post('/ask')
 async def ask_question(payload: dict):
-    """Answers a user's question using a pre-trained AI model.
+    """Answers a user's question from the FAQs.
 
     Args:
-        payload: A dictionary containing the user's question under the key 'question'.
+        payload: A dictionary containing the user's question under the key
+            'question', and optionally the number of results under 'top_k'
+            and the search mode ('keyword' or 'semantic') under 'mode'.
 
     Returns:
-        The answer generated by the AI model.
+        The best answer plus the top-k matching FAQs with their scores.
     """
     q = payload.get('question')
-    return await answer_query(q)
+    try:
+        top_k = min(max(int(payload.get('top_k') or 0), 0), 20)
+    except (TypeError, ValueError):
+        top_k = 0
+    mode = payload.get('mode') if payload.get('mode') in ('keyword', 'semantic') else None
+    return await answer_query(q, top_k or None, mode)
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query, Form, Response, Header
 from typing import List, Optional, Dict, Any
 from ..schemas.api_models import (
     IssueCreateModel,
@@ -6,12 +6,18 @@ from ..schemas.api_models import (
     IssueUpdateModel,
     CommentCreateModel,
     CommentResponseModel,
+    BulkIssueOperationModel,
+    BulkIssueResponseModel,
 )
-from ..services.issue_service import create_issue, get_issue, update_issue, delete_issue
+from ..services.issue_service import create_issue, get_issue, update_issue, delete_issue, bulk_update_issues, IssueConflictError
 from ..utils.auth_dependencies import get_current_user
+from ..utils.rate_limit import rate_limit
+from ..config import settings
+from ..ai import moderation
 
 from ..db.supabase_client import supabase_request
 from ..utils.validation import validate_list, validate_single
+from ..utils.pagination import KEYSET_ORDER_DESC, InvalidCursor, decode_cursor, encode_cursor, keyset_filter
 
 router = APIRouter(prefix='/issues', tags=['issues'])
 
@@ -23,7 +29,7 @@ async def post_issue(
     lat: Optional[float] = Form(None),
     lng: Optional[float] = Form(None),
     images: Optional[List[UploadFile]] = File(None),
-    user: Dict[str, Any] = Depends(get_current_user),
+    user: Dict[str, Any] = Depends(rate_limit('issues')),
 ):
     """Submits a new issue, including optional image uploads.
 
@@ -40,6 +46,10 @@ async def post_issue(
 
     Returns:
         The created issue object.
+
+    Raises:
+        HTTPException: If the user exceeded the submission rate limit (429)
+            or the submission is flagged by moderation (422).
     """
     # Build a lightweight payload compatible with IssueCreateModel
     payload = {
@@ -48,31 +58,63 @@ async def post_issue(
         'location': f'{lat},{lng}' if lat is not None and lng is not None else None,
         'images': None,
     }
-    return await create_issue(payload, image_files=images, user=user)
+    res = await create_issue(payload, image_files=images, user=user)
+    if isinstance(res, dict) and res.get('ok') is False:
+        raise HTTPException(status_code=422, detail={'error': res.get('error'), 'reasons': res.get('reasons') or []})
+    return res
 
 
 @router.get('/', response_model=List[IssueResponseModel])
-async def list_issues(status: Optional[str] = None, category: Optional[str] = None, limit: int = Query(50, le=200), offset: int = 0):
-    """Lists all issues, with optional filters and pagination.
+async def list_issues(
+    response: Response,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+):
+    """Lists issues newest first, with optional filters and keyset pagination.
+
+    Filtering, ordering and page size are pushed down to PostgREST, so only
+    one page of rows is transferred. Pages are chained with an opaque cursor
+    on `(created_at, id)`: the cursor for the following page is returned in
+    the `X-Next-Cursor` response header and is absent on the last page.
 
     Args:
+        response: The outgoing response, used to set the cursor header.
         status: Filter issues by their status (e.g., 'pending', 'resolved').
         category: Filter issues by their category.
         limit: The maximum number of issues to return.
-        offset: The starting offset for pagination.
+        cursor: The `X-Next-Cursor` value from the previous page.
+        offset: Legacy offset pagination, ignored when `cursor` is given.
 
     Returns:
         A list of issue objects matching the filter criteria.
+
+    Raises:
+        HTTPException(400): If the cursor is malformed.
     """
     filters: Dict[str, Any] = {}
     if status:
         filters['status.eq'] = status
     if category:
         filters['category.eq'] = category
-    r = await supabase_request('GET', 'issues', filters=filters)
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+        filters.update(keyset_filter(created_at, last_id))
+        offset = 0
+    # fetch one extra row to learn whether another page exists
+    r = await supabase_request('GET', 'issues', filters=filters, order=KEYSET_ORDER_DESC, limit=limit + 1, offset=offset)
     data = r.get('data') or []
-    validated = validate_list(IssueResponseModel, data)
-    return validated[offset: offset + limit]
+    page = data[:limit]
+    if len(data) > limit and page:
+        next_cursor = encode_cursor(page[-1])
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+    return validate_list(IssueResponseModel, page)
 
 
 @router.get('/staff/me', response_model=List[IssueResponseModel])
@@ -114,22 +156,30 @@ async def read_issue(issue_id: str):
 
 
 @router.patch('/{issue_id}', response_model=IssueResponseModel)
-async def patch_issue(issue_id: str, payload: IssueUpdateModel, user: Dict[str, Any] = Depends(get_current_user)):
+async def patch_issue(issue_id: str, payload: IssueUpdateModel, user: Dict[str, Any] = Depends(get_current_user), if_match: Optional[str] = Header(None)):
     """Updates the details of an existing issue.
 
+    Clients can send the issue's last seen `updated_at` value in an
+    `If-Match` header; the update is then rejected with 409 if someone else
+    modified the issue in the meantime.
+
     Args:
         issue_id: The unique identifier of the issue to update.
         payload: An `IssueUpdateModel` with the fields to be updated.
         user: The authenticated user, injected by FastAPI.
+        if_match: Optional `updated_at` precondition.
 
     Returns:
         The updated issue object.
 
     Raises:
         HTTPException: If the issue is not found or the user is not permitted
-            to perform the update.
+            to perform the update (404), or if the precondition failed (409).
     """
-    updated = await update_issue(issue_id, payload, user)
+    try:
+        updated = await update_issue(issue_id, payload, user, expected_updated_at=if_match.strip('"') if if_match else None)
+    except IssueConflictError:
+        raise HTTPException(status_code=409, detail='Issue was modified by someone else')
     if not updated:
         raise HTTPException(status_code=404, detail='Issue not found or not allowed')
     return validate_single(IssueResponseModel, updated)
@@ -156,6 +206,44 @@ async def remove_issue(issue_id: str, user: Dict[str, Any] = Depends(get_current
     return None
 
 
+@router.post('/bulk', response_model=BulkIssueResponseModel)
+async def bulk_issues(payload: BulkIssueOperationModel, user: Dict[str, Any] = Depends(get_current_user)):
+    """Assigns, re-statuses or resolves many issues at once.
+
+    This is a protected endpoint available only to users with 'staff' or 'admin' roles.
+
+    Args:
+        payload: A `BulkIssueOperationModel` with the issue IDs and operation.
+        user: The authenticated user, injected by FastAPI.
+
+    Returns:
+        Counts of updated and failed issues plus a result for every ID.
+
+    Raises:
+        HTTPException: If the user is not staff (403), or the request is
+            incomplete or exceeds `ISSUE_BULK_MAX_IDS` (400).
+    """
+    if not user or user.get('role') not in ('staff', 'admin'):
+        raise HTTPException(status_code=403, detail='Forbidden')
+    if not payload.ids:
+        raise HTTPException(status_code=400, detail='No issue ids given')
+    if len(payload.ids) > settings.ISSUE_BULK_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f'At most {settings.ISSUE_BULK_MAX_IDS} issues per request')
+    if payload.operation == 'assign':
+        if not payload.department_id:
+            raise HTTPException(status_code=400, detail='department_id is required for assign')
+        changes = {'status': 'assigned', 'department_id': payload.department_id}
+    elif payload.operation == 'set_status':
+        if not payload.status:
+            raise HTTPException(status_code=400, detail='status is required for set_status')
+        changes = {'status': payload.status}
+    else:
+        changes = {'status': 'resolved'}
+    results = await bulk_update_issues(payload.ids, changes)
+    updated = sum(1 for r in results if r['ok'])
+    return {'updated': updated, 'failed': len(results) - updated, 'results': results}
+
+
 @router.post('/{issue_id}/assign')
 async def assign_issue(issue_id: str, department_id: str, user: Dict[str, Any] = Depends(get_current_user)):
     """Assigns an issue to a department.
@@ -198,7 +286,7 @@ async def resolve_issue(issue_id: str, user: Dict[str, Any] = Depends(get_curren
 
 
 @router.post('/{issue_id}/comments', response_model=CommentResponseModel)
-async def add_comment(issue_id: str, payload: CommentCreateModel, user: Optional[Dict[str, Any]] = Depends(get_current_user)):
+async def add_comment(issue_id: str, payload: CommentCreateModel, user: Optional[Dict[str, Any]] = Depends(rate_limit('comments'))):
     """Adds a comment to an issue.
 
     This can be performed by an authenticated user or anonymously, depending
@@ -211,7 +299,14 @@ async def add_comment(issue_id: str, payload: CommentCreateModel, user: Optional
 
     Returns:
         The newly created comment object.
+
+    Raises:
+        HTTPException: If the user exceeded the comment rate limit (429) or
+            the comment is flagged by moderation (422).
     """
+    verdict = await moderation.moderate(payload.text)
+    if verdict['flagged']:
+        raise HTTPException(status_code=422, detail={'error': 'Comment flagged as spam', 'reasons': verdict['reasons']})
     note = {
         'issue_id': issue_id,
         'user_id': user.get('id') if user else None,
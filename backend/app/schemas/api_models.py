@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 
@@ -38,9 +38,20 @@ class UserProfile(BaseModel):
 
 # --- Issue models
 class ImageItem(BaseModel):
-    """Schema representing an uploaded image."""
+    """Schema representing an uploaded image.
+
+    The thumbnail, dimension and size fields are only present for images
+    that went through server-side preprocessing.
+    """
     url: str
     public_id: Optional[str]
+    thumbnail_url: Optional[str] = None
+    thumbnail_public_id: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = None
+    bytes: Optional[int] = None
+    original_bytes: Optional[int] = None
 
 
 class IssueCreateModel(BaseModel):
@@ -80,6 +91,32 @@ class IssueUpdateModel(BaseModel):
     department_id: Optional[str]
 
 
+class BulkIssueOperationModel(BaseModel):
+    """Request schema for applying one operation to many issues.
+
+    `department_id` is required for `assign`, `status` for `set_status`.
+    """
+    ids: List[str]
+    operation: Literal['assign', 'set_status', 'resolve']
+    department_id: Optional[str] = None
+    status: Optional[str] = None
+
+
+class BulkIssueResult(BaseModel):
+    """Outcome of a bulk operation for a single issue."""
+    id: str
+    ok: bool
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkIssueResponseModel(BaseModel):
+    """Response schema for a bulk issue operation."""
+    updated: int
+    failed: int
+    results: List[BulkIssueResult]
+
+
 # --- Comment models
 class CommentCreateModel(BaseModel):
     """Request schema for creating a new comment."""
@@ -118,14 +155,42 @@ class IssuesByTimeItem(BaseModel):
 
 
 class ResponseTimesModel(BaseModel):
-    """Response schema for the average issue response time analytic."""
+    """Response schema for the issue response time analytic.
+
+    The percentiles are estimated from log-bucketed histograms and are within
+    1% of the exact values.
+    """
     average_hours: Optional[float]
     count: int
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p99_hours: Optional[float] = None
+
+
+class ResponseTimeBreakdownItem(ResponseTimesModel):
+    """Response times of one department or category."""
+    key: Optional[str] = None
 
 
 class HotspotItem(BaseModel):
-    """Schema for a single geographic hotspot in an analytics query."""
+    """Schema for a single geographic hotspot in an analytics query.
+
+    `lat`/`lon` is the centroid of the cluster, `radius_meters` the distance
+    from it to the farthest member, and `member_ids` lists (up to a limit)
+    the issues in the cluster.
+    """
     lat: float
     lon: float
     count: int
-
+    radius_meters: Optional[float] = None
+    member_ids: List[str] = []
+
+
+class DashboardSummaryModel(BaseModel):
+    """Response schema for the composite admin dashboard summary."""
+    issues_by_time: List[IssuesByTimeItem]
+    response_times: ResponseTimesModel
+    hotspots: List[HotspotItem]
+    users: List[dict]
+    user_count: Optional[int] = None
+    generated_at: str
@@ -0,0 +1,324 @@
+"""Time-series analytics for the admin dashboard.
+
+The admin endpoints used to download the whole `issues` table and parse every
+timestamp on each request. They now read small aggregate tables that triggers
+on `issues` keep current (see `supabase/schema.sql`):
+
+-   `issue_daily_stats`: one row per creation day, status and department with
+    the issue count. Summed per day in SQL (`issue_daily_counts`), it backs
+    `issues_by_day`.
+-   `issue_resolution_histograms`: per creation day, department and category,
+    a log-bucketed histogram of resolution times in the style of DDSketch.
+    Bucket `i` holds durations in `(gamma^(i-1), gamma^i]` seconds with
+    `gamma = (1 + a) / (1 - a)`, so a quantile estimated from the buckets is
+    within the relative accuracy `a` (`SKETCH_RELATIVE_ACCURACY`, 1%) of the
+    true value. Histograms merge by adding bucket counts, which is how any
+    window, department or category is answered; the merge runs in SQL
+    (`issue_resolution_histogram_merge`), so a request reads one value per
+    group rather than one row per bucket and day. Backs the response times.
+
+Requests therefore read a number of rows that depends on the window, not on
+the size of the issues table.
+
+Days are UTC calendar days, and a window of `days` covers today plus the
+`days` previous days. If an aggregate table or function has not been created
+yet, the functions fall back to scanning the issues created in the window
+page by page.
+
+With `ANALYTICS_SOURCE=snapshot`, the public functions are answered from the
+in-memory columnar issue snapshot instead (see `services/issue_snapshot.py`),
+with exact rather than sketched percentiles.
+"""
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from ..config import settings
+from ..db.supabase_client import supabase_request, supabase_rpc
+from ..utils.pagination import KEYSET_ORDER_ASC, keyset_filter
+from . import issue_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+DAILY_COUNTS_RPC = 'issue_daily_counts'
+HISTOGRAM_MERGE_RPC = 'issue_resolution_histogram_merge'
+# must match the gamma used by issue_resolution_histogram_apply in schema.sql
+SKETCH_RELATIVE_ACCURACY = 0.01
+_GAMMA = (1.0 + SKETCH_RELATIVE_ACCURACY) / (1.0 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# department_id under which the rollup stores unassigned issues
+NO_DEPARTMENT = '00000000-0000-0000-0000-000000000000'
+# rows per page of the fallback scans; at most PostgREST's default max-rows
+_SCAN_PAGE_SIZE = 1000
+
+
+def _function_missing(r: Dict[str, Any]) -> bool:
+    """Detects PostgREST's "function not found" answer (schema not migrated yet)."""
+    data = r.get('data')
+    return r.get('status_code') == 404 and isinstance(data, dict) and data.get('code') == 'PGRST202'
+
+
+async def _scan(filters: Dict[str, Any], select: str) -> List[Dict[str, Any]]:
+    """Reads all matching issues page by page, so PostgREST's max-rows cannot truncate them."""
+    rows: List[Dict[str, Any]] = []
+    last = None
+    while True:
+        page_filters = dict(filters)
+        if last is not None:
+            page_filters.update(keyset_filter(last['created_at'], last['id'], descending=False))
+        r = await supabase_request('GET', 'issues', filters=page_filters, select=select, order=KEYSET_ORDER_ASC, limit=_SCAN_PAGE_SIZE)
+        if r.get('status_code') != 200:
+            raise RuntimeError(f"scanning issues failed: {r.get('data')}")
+        page = r.get('data') or []
+        if not page:
+            return rows
+        rows.extend(page)
+        last = page[-1]
+
+
+def _first_day(days: int) -> datetime:
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=max(days, 0))
+
+
+def _filters(department_id: Optional[str], status: Optional[str]) -> Dict[str, str]:
+    filters = {}
+    if department_id:
+        filters['department_id.eq'] = department_id
+    if status:
+        filters['status.eq'] = status
+    return filters
+
+
+async def daily_rollups(days: int, department_id: Optional[str] = None, status: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """Reads the issue counts of the last `days` days, summed per day in SQL.
+
+    Args:
+        days: The number of past days to include.
+        department_id: Only include issues currently in this department.
+        status: Only include issues currently in this status.
+
+    Returns:
+        The count per ISO day for the days that have rollup rows, or None if
+        the `issue_daily_counts` function does not exist.
+
+    Raises:
+        RuntimeError: If the rollup could not be read.
+    """
+    r = await supabase_rpc(DAILY_COUNTS_RPC, {
+        'p_since': _first_day(days).date().isoformat(),
+        'p_department_id': department_id,
+        'p_status': status,
+    })
+    if _function_missing(r):
+        return None
+    if r.get('status_code') != 200:
+        raise RuntimeError(f"{DAILY_COUNTS_RPC} failed: {r.get('data')}")
+    return {str(day): int(n or 0) for day, n in (r.get('data') or {}).items()}
+
+
+async def _scan_issues(days: int, department_id: Optional[str], status: Optional[str]) -> Dict[str, int]:
+    """Fallback for databases without the rollup: counts the issues of the window."""
+    logger.warning('%s not found; scanning issues instead (apply supabase/schema.sql)', DAILY_COUNTS_RPC)
+    filters = _filters(department_id, status)
+    filters['created_at.gte'] = _first_day(days).isoformat()
+    counts: Dict[str, int] = defaultdict(int)
+    for it in await _scan(filters, 'id,created_at'):
+        try:
+            created = datetime.fromisoformat(it['created_at'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        day = created.astimezone(timezone.utc).date().isoformat() if created.tzinfo else created.date().isoformat()
+        counts[day] += 1
+    return counts
+
+
+async def issues_by_day(days: int, department_id: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Counts the issues created on each day of the window.
+
+    Returns:
+        `{'date', 'count'}` items in date order; days without issues are
+        omitted.
+    """
+    if settings.ANALYTICS_SOURCE == 'snapshot':
+        return await issue_snapshot.issues_by_day(days, department_id, status)
+    counts = await daily_rollups(days, department_id, status)
+    if counts is None:
+        counts = await _scan_issues(days, department_id, status)
+    return [{'date': day, 'count': n} for day, n in sorted(counts.items()) if n > 0]
+
+
+def sketch_bucket(seconds: float) -> int:
+    """Returns the histogram bucket of a resolution time (as computed in SQL)."""
+    return math.ceil(math.log(max(seconds, 1.0)) / _LOG_GAMMA)
+
+
+def bucket_value(bucket: int) -> float:
+    """Returns the representative duration in seconds of a bucket (its relative midpoint)."""
+    return 2.0 * _GAMMA ** bucket / (_GAMMA + 1.0)
+
+
+def quantile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """Estimates a quantile in seconds from merged bucket counts.
+
+    Args:
+        histogram: Maps bucket index to count.
+        q: The quantile, between 0 and 1.
+
+    Returns:
+        The estimate, or None for an empty histogram.
+    """
+    total = sum(histogram.values())
+    if total <= 0:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen > rank:
+            return bucket_value(bucket)
+    return bucket_value(max(histogram))
+
+
+async def resolution_histograms(
+    days: int,
+    department_id: Optional[str] = None,
+    category: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Reads the histograms of the last `days` days, merged in SQL.
+
+    Args:
+        days: The number of past days to include.
+        department_id: Only include issues in this department.
+        category: Only include issues in this category.
+        group_by: `'department'`, `'category'` or None for a single group.
+
+    Returns:
+        One `{'key', 'histogram', 'count', 'total_seconds'}` item per group,
+        where `histogram` maps bucket to count and `key` is the department
+        ID or category (`''` without `group_by`), or None if the merge
+        function does not exist.
+
+    Raises:
+        RuntimeError: If the histograms could not be read.
+    """
+    r = await supabase_rpc(HISTOGRAM_MERGE_RPC, {
+        'p_since': _first_day(days).date().isoformat(),
+        'p_department_id': department_id,
+        'p_category': category,
+        'p_group_by': group_by,
+    })
+    if _function_missing(r):
+        return None
+    if r.get('status_code') != 200:
+        raise RuntimeError(f"{HISTOGRAM_MERGE_RPC} failed: {r.get('data')}")
+    return [
+        {
+            'key': item.get('key') or '',
+            'histogram': {int(bucket): int(n) for bucket, n in (item.get('buckets') or {}).items()},
+            'count': int(item.get('count') or 0),
+            'total_seconds': float(item.get('total_seconds') or 0.0),
+        }
+        for item in r.get('data') or []
+    ]
+
+
+async def _scan_resolutions(days: int, department_id: Optional[str], category: Optional[str], group_by: Optional[str]) -> List[Dict[str, Any]]:
+    """Fallback for databases without the histograms: builds them from the issues of the window."""
+    logger.warning('%s not found; scanning issues instead (apply supabase/schema.sql)', HISTOGRAM_MERGE_RPC)
+    filters = {}
+    if department_id:
+        filters['department_id.eq'] = department_id
+    if category:
+        filters['category.eq'] = category
+    filters['created_at.gte'] = _first_day(days).isoformat()
+    filters['resolved_at.not.is'] = 'null'
+    groups: Dict[str, Dict[str, Any]] = {}
+    for it in await _scan(filters, 'id,created_at,resolved_at,department_id,category'):
+        try:
+            seconds = (datetime.fromisoformat(it['resolved_at']) - datetime.fromisoformat(it['created_at'])).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            continue
+        seconds = max(seconds, 0.0)
+        if group_by == 'department':
+            key = it.get('department_id') or NO_DEPARTMENT
+        elif group_by == 'category':
+            key = it.get('category') or ''
+        else:
+            key = ''
+        group = groups.setdefault(key, {'key': key, 'histogram': defaultdict(int), 'count': 0, 'total_seconds': 0.0})
+        group['histogram'][sketch_bucket(seconds)] += 1
+        group['count'] += 1
+        group['total_seconds'] += seconds
+    return list(groups.values())
+
+
+def _summarize(group: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    histogram = group['histogram'] if group else {}
+    count = group['count'] if group else 0
+
+    def hours(q: float) -> Optional[float]:
+        value = quantile(histogram, q)
+        return None if value is None else value / 3600.0
+
+    return {
+        'average_hours': group['total_seconds'] / count / 3600.0 if count else None,
+        'count': count,
+        'p50_hours': hours(0.5),
+        'p90_hours': hours(0.9),
+        'p99_hours': hours(0.99),
+    }
+
+
+async def _histogram_groups(days: int, department_id: Optional[str], category: Optional[str], group_by: Optional[str]) -> List[Dict[str, Any]]:
+    groups = await resolution_histograms(days, department_id, category, group_by)
+    if groups is None:
+        groups = await _scan_resolutions(days, department_id, category, group_by)
+    return groups
+
+
+async def response_time_summary(days: int, department_id: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+    """Summarizes the time from creation to resolution of issues created in the window.
+
+    Returns:
+        `{'average_hours', 'count', 'p50_hours', 'p90_hours', 'p99_hours'}`,
+        where `count` is the number of resolved issues and the other values
+        are None when there are none. The average is exact; the percentiles
+        are within `SKETCH_RELATIVE_ACCURACY`.
+    """
+    if settings.ANALYTICS_SOURCE == 'snapshot':
+        return await issue_snapshot.response_time_summary(days, department_id, category)
+    groups = await _histogram_groups(days, department_id, category, None)
+    return _summarize(groups[0] if groups else None)
+
+
+async def response_time_breakdown(days: int, group_by: str) -> List[Dict[str, Any]]:
+    """Summarizes resolution times per department or per category.
+
+    Args:
+        days: The number of past days to include.
+        group_by: `'department'` or `'category'`.
+
+    Returns:
+        One summary (see `response_time_summary`) per group with a `key`
+        (the department ID or category; None for unassigned or
+        uncategorized issues), largest group first.
+
+    Raises:
+        ValueError: If `group_by` is not supported.
+    """
+    if settings.ANALYTICS_SOURCE == 'snapshot':
+        return await issue_snapshot.response_time_breakdown(days, group_by)
+    if group_by not in ('department', 'category'):
+        raise ValueError(f'cannot group response times by {group_by!r}')
+    items = []
+    for group in await _histogram_groups(days, None, None, group_by):
+        summary = _summarize(group)
+        if summary['count']:
+            summary['key'] = None if group['key'] in ('', NO_DEPARTMENT) else group['key']
+            items.append(summary)
+    items.sort(key=lambda item: item['count'], reverse=True)
+    return items
@@ -1,19 +1,92 @@
-from typing import Dict, Optional
-import httpx
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+import asyncio
+import os
+import uuid
 from ..config import settings
+from ..db import http_clients
 
 
-async def upload_image(file_path: str, folder: str = 'issues') -> Dict[str, Optional[str]]:
-    """Uploads an image file to Cloudinary.
+def _multipart_parts(fields: Dict[str, str], filename: str, content_type: str, boundary: str):
+    """Builds the bytes surrounding the file content of a multipart/form-data body."""
+    head = b''
+    for name, value in fields.items():
+        head += (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+            f'{value}\r\n'
+        ).encode()
+    safe_name = filename.replace('"', '').replace('\r', '').replace('\n', '')
+    head += (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    return head, tail
 
-    This function reads a file from the local filesystem and uploads it to a
-    specified folder in Cloudinary using the Cloudinary REST API. It
-    authenticates using credentials from the application settings.
+
+async def _iter_source(source: Any, chunk_size: int) -> AsyncIterator[bytes]:
+    """Yields the bytes of an upload source without blocking the event loop.
+
+    Supports raw bytes, a local file path (read in a worker thread) and
+    file-like objects. `UploadFile.read` is awaited directly (Starlette runs
+    it in its thread pool); plain synchronous file objects are read with
+    `asyncio.to_thread`.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield bytes(source)
+        return
+    if isinstance(source, str):
+        f = await asyncio.to_thread(open, source, 'rb')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+        return
+    read = getattr(source, 'read')
+    while True:
+        if asyncio.iscoroutinefunction(read):
+            chunk = await read(chunk_size)
+        else:
+            chunk = await asyncio.to_thread(read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _source_size(source: Any) -> Optional[int]:
+    """Returns the byte size of an upload source when it is cheaply known."""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    if isinstance(source, str):
+        try:
+            return os.path.getsize(source)
+        except OSError:
+            return None
+    size = getattr(source, 'size', None)
+    return size if isinstance(size, int) else None
+
+
+async def upload_image(source: Union[str, bytes, Any], folder: str = 'issues', filename: Optional[str] = None, content_type: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """Uploads an image to Cloudinary, streaming it from its source.
+
+    The image is sent as a multipart body generated on the fly, so the content
+    is never buffered in full or copied to a temporary file. It authenticates
+    using credentials from the application settings.
 
     Args:
-        file_path: The local path to the image file to upload.
+        source: The image to upload: a FastAPI `UploadFile` (or any file-like
+            object), raw bytes, or a local file path.
         folder: The name of the folder in Cloudinary to upload the image to.
             Defaults to 'issues'.
+        filename: The file name reported to Cloudinary. Defaults to the
+            source's `filename` attribute or path.
+        content_type: The MIME type of the image. Defaults to the source's
+            `content_type` attribute or `application/octet-stream`.
 
     Returns:
         A dictionary containing the 'secure_url' and 'public_id' of the
@@ -22,20 +95,28 @@ async def upload_image(file_path: str, folder: str = 'issues') -> Dict[str, Opti
     url = f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/image/upload"
     auth = (settings.CLOUDINARY_API_KEY, settings.CLOUDINARY_API_SECRET)
 
-    # Read file bytes
-    with open(file_path, 'rb') as f:
-        file_bytes = f.read()
+    filename = filename or getattr(source, 'filename', None) or (source if isinstance(source, str) else 'upload')
+    content_type = content_type or getattr(source, 'content_type', None) or 'application/octet-stream'
+    boundary = uuid.uuid4().hex
+    head, tail = _multipart_parts({'folder': folder}, os.path.basename(str(filename)), content_type, boundary)
 
-    files = {'file': (file_path, file_bytes)}
-    data = {'folder': folder}
+    async def body() -> AsyncIterator[bytes]:
+        yield head
+        async for chunk in _iter_source(source, settings.UPLOAD_CHUNK_SIZE):
+            yield chunk
+        yield tail
 
-    async with httpx.AsyncClient() as client:
-        r = await client.post(url, auth=auth, files=files, data=data, timeout=30)
-        try:
-            body = r.json()
-        except Exception:
-            body = {'text': r.text}
-    return {'secure_url': body.get('secure_url'), 'public_id': body.get('public_id')}
+    headers = {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+    size = _source_size(source)
+    if size is not None:
+        headers['Content-Length'] = str(len(head) + size + len(tail))
+
+    r = await http_clients.request(http_clients.CLOUDINARY, 'POST', url, auth=auth, content=body(), headers=headers)
+    try:
+        body_json = r.json()
+    except Exception:
+        body_json = {'text': r.text}
+    return {'secure_url': body_json.get('secure_url'), 'public_id': body_json.get('public_id')}
 
 
 async def delete_image(public_id: str) -> Dict:
@@ -51,9 +132,58 @@ async def delete_image(public_id: str) -> Dict:
     url = f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/resources/image/upload"
     auth = (settings.CLOUDINARY_API_KEY, settings.CLOUDINARY_API_SECRET)
     params = {'public_ids[]': public_id}
-    async with httpx.AsyncClient() as client:
-        r = await client.delete(url, auth=auth, params=params)
-        try:
-            return r.json()
-        except Exception:
-            return {'text': r.text}
+    r = await http_clients.request(http_clients.CLOUDINARY, 'DELETE', url, auth=auth, params=params)
+    try:
+        return r.json()
+    except Exception:
+        return {'text': r.text}
+
+
+DELETE_BATCH_SIZE = 100
+
+
+async def _delete_batch(url: str, auth: tuple, batch: List[str]) -> Tuple[List[str], List[str]]:
+    """Deletes up to `DELETE_BATCH_SIZE` assets in one Admin API call."""
+    params = [('public_ids[]', public_id) for public_id in batch]
+    try:
+        r = await http_clients.request(http_clients.CLOUDINARY, 'DELETE', url, auth=auth, params=params)
+        body = r.json()
+    except Exception:
+        return [], list(batch)
+    results = body.get('deleted') if isinstance(body, dict) else None
+    if not isinstance(results, dict):
+        return [], list(batch)
+    deleted, failed = [], []
+    for public_id in batch:
+        # 'not_found' means a previous attempt already removed it
+        if results.get(public_id) in ('deleted', 'not_found'):
+            deleted.append(public_id)
+        else:
+            failed.append(public_id)
+    return deleted, failed
+
+
+async def delete_images(public_ids: List[str]) -> Dict[str, List[str]]:
+    """Deletes many images from Cloudinary with as few requests as possible.
+
+    The IDs are split into batches of `DELETE_BATCH_SIZE` (the Admin API
+    limit for `public_ids[]`), which are sent concurrently.
+
+    Args:
+        public_ids: The public IDs to delete. Duplicates are ignored.
+
+    Returns:
+        A dictionary with the `deleted` public IDs (including ones that were
+        already gone) and the `failed` ones that should be retried.
+    """
+    unique = list(dict.fromkeys(p for p in public_ids if p))
+    if not unique:
+        return {'deleted': [], 'failed': []}
+    url = f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/resources/image/upload"
+    auth = (settings.CLOUDINARY_API_KEY, settings.CLOUDINARY_API_SECRET)
+    batches = [unique[i:i + DELETE_BATCH_SIZE] for i in range(0, len(unique), DELETE_BATCH_SIZE)]
+    results = await asyncio.gather(*(_delete_batch(url, auth, batch) for batch in batches))
+    return {
+        'deleted': [p for deleted, _ in results for p in deleted],
+        'failed': [p for _, failed in results for p in failed],
+    }
@@ -0,0 +1,111 @@
+"""Composite summary for the admin dashboard (`GET /admin/dashboard/summary`).
+
+The dashboard used to call the issues-by-time, response-times, hotspots and
+users endpoints one by one. `get_summary` runs the same aggregations
+concurrently with `asyncio.gather` and returns them as one payload. With
+`ANALYTICS_SOURCE=snapshot` all of them read the same in-memory issue
+snapshot, so a dashboard load fetches the issues at most once.
+
+Results are cached per parameter set for `ADMIN_SUMMARY_CACHE_SECONDS`, and
+concurrent requests for the same parameters share one computation. Each
+payload carries an ETag derived from its content (not from the time it was
+generated), so clients can revalidate with `If-None-Match` and get a 304 as
+long as the numbers have not changed.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Tuple
+from ..config import settings
+from ..db.supabase_client import supabase_request
+from ..utils.cache import LRUCache
+from . import analytics
+from .hotspots import find_hotspots
+
+
+_cache = LRUCache(maxsize=64)
+_inflight: Dict[Hashable, asyncio.Future] = {}
+_stats = {'builds': 0, 'coalesced': 0, 'not_modified': 0, 'last_build_ms': None}
+
+
+async def _users(limit: int) -> Tuple[list, Any]:
+    r = await supabase_request('GET', 'profiles', limit=limit, count='exact')
+    return r.get('data') or [], r.get('count')
+
+
+def etag_for(payload: Dict[str, Any]) -> str:
+    """Returns a strong ETag over the payload, ignoring `generated_at`."""
+    content = {k: v for k, v in payload.items() if k != 'generated_at'}
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True, default=str, separators=(',', ':')).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+async def _build(days: int, response_days: int, radius_meters: int, hotspot_days: int, user_limit: int) -> Tuple[Dict[str, Any], str]:
+    started = time.perf_counter()
+    by_day, response_times, hotspots, (users, user_count) = await asyncio.gather(
+        analytics.issues_by_day(days),
+        analytics.response_time_summary(response_days),
+        find_hotspots(radius_meters, hotspot_days),
+        _users(user_limit),
+    )
+    payload = {
+        'issues_by_time': by_day,
+        'response_times': response_times,
+        'hotspots': hotspots,
+        'users': users,
+        'user_count': user_count,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+    }
+    _stats['builds'] += 1
+    _stats['last_build_ms'] = round((time.perf_counter() - started) * 1000.0, 1)
+    return payload, etag_for(payload)
+
+
+async def get_summary(
+    days: int = 7,
+    response_days: int = 30,
+    radius_meters: int = 250,
+    hotspot_days: int = 30,
+    user_limit: int = 50,
+) -> Tuple[Dict[str, Any], str]:
+    """Returns the dashboard payload and its ETag, from the cache when possible.
+
+    Args:
+        days: Window of the issues-by-time series.
+        response_days: Window of the response time statistics.
+        radius_meters: Hotspot clustering radius.
+        hotspot_days: Window of the hotspot clustering.
+        user_limit: The number of user profiles to include.
+
+    Returns:
+        A `(payload, etag)` tuple.
+    """
+    key = (days, response_days, radius_meters, hotspot_days, user_limit)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    pending = _inflight.get(key)
+    if pending is not None:
+        _stats['coalesced'] += 1
+        return await asyncio.shield(pending)
+    future = asyncio.ensure_future(_build(*key))
+    _inflight[key] = future
+    try:
+        result = await asyncio.shield(future)
+    finally:
+        _inflight.pop(key, None)
+    if settings.ADMIN_SUMMARY_CACHE_SECONDS > 0:
+        _cache.set(key, result, expires_at=time.time() + settings.ADMIN_SUMMARY_CACHE_SECONDS)
+    return result
+
+
+def record_not_modified() -> None:
+    """Counts a request answered with 304."""
+    _stats['not_modified'] += 1
+
+
+def summary_stats() -> Dict[str, Any]:
+    """Returns build, coalescing and 304 counters plus the result cache counters."""
+    return dict(_stats, cache=_cache.stats())
@@ -0,0 +1,161 @@
+"""Trainable text classifier for department routing.
+
+Keyword rules (see `routing_engine`) only route issues that mention a known
+keyword. This module learns from issues that already have a department: the
+title, description and category are hashed into sparse features with
+`HashingVectorizer` (word unigrams and bigrams, no vocabulary to store) and
+fed to a linear model (`SGDClassifier` with logistic loss).
+
+`predict_batch` scores many texts with one sparse matrix product, which is
+what the backlog re-routing CLI (`python -m app.cli.reroute`) uses. The
+trained model is stored with joblib at `DEPARTMENT_MODEL_PATH`, loaded during
+the model warmup (see `ai/registry.py`) and reloaded when the file changes.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import settings
+from ..ai import registry
+
+
+logger = logging.getLogger(__name__)
+
+_model: Dict[str, Any] = {'bundle': None, 'mtime': None}
+_lock = threading.Lock()
+_stats = {'predictions': 0, 'batches': 0, 'seconds': 0.0}
+
+
+def issue_text(row: Dict[str, Any]) -> str:
+    """Builds the classifier input from an issue row."""
+    return ' '.join(str(row.get(k) or '') for k in ('title', 'description', 'category')).strip()
+
+
+def _vectorizer():
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=2 ** settings.DEPARTMENT_CLASSIFIER_HASH_BITS,
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm='l2',
+        lowercase=True,
+    )
+
+
+def train(texts: Sequence[str], labels: Sequence[str]) -> Dict[str, Any]:
+    """Fits a classifier on labelled issue texts.
+
+    Args:
+        texts: Issue texts (see `issue_text`).
+        labels: The department ID of each text.
+
+    Returns:
+        A model bundle to pass to `save`.
+
+    Raises:
+        ValueError: If fewer than two departments are present.
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    if len(set(labels)) < 2:
+        raise ValueError('need issues from at least two departments to train')
+    vectorizer = _vectorizer()
+    clf = SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=20, tol=None, class_weight='balanced', random_state=0)
+    clf.fit(vectorizer.transform(texts), list(labels))
+    return {
+        'vectorizer': vectorizer,
+        'classifier': clf,
+        'trained_at': time.time(),
+        'samples': len(texts),
+    }
+
+
+def save(bundle: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Writes a model bundle to disk atomically and returns its path."""
+    import joblib
+
+    path = path or settings.DEPARTMENT_MODEL_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f'{path}.tmp'
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _load() -> Optional[Dict[str, Any]]:
+    """Returns the stored model, reloading it when the file changed."""
+    path = settings.DEPARTMENT_MODEL_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _lock:
+        if _model['bundle'] is None or _model['mtime'] != mtime:
+            import joblib
+
+            try:
+                _model['bundle'] = joblib.load(path)
+                _model['mtime'] = mtime
+            except Exception:
+                logger.exception('could not load department model from %s', path)
+                return _model['bundle']
+        return _model['bundle']
+
+
+def is_available() -> bool:
+    """Returns True when a trained model exists and scikit-learn is installed."""
+    try:
+        return _load() is not None
+    except ImportError:
+        return False
+
+
+def predict_batch(texts: Sequence[str], min_confidence: Optional[float] = None) -> List[Optional[Tuple[str, float]]]:
+    """Predicts the department of many texts in one vectorized call.
+
+    Args:
+        texts: Issue texts (see `issue_text`).
+        min_confidence: Predictions below this probability are returned as
+            None; defaults to `DEPARTMENT_CLASSIFIER_MIN_CONFIDENCE`.
+
+    Returns:
+        One `(department_id, confidence)` tuple or None per text. All None if
+        no model has been trained yet.
+    """
+    if not texts:
+        return []
+    # the first load goes through the registry (shared with the warmup, and
+    # reported by /health); later calls only check the file for a retrained model
+    registry.get('department_classifier')
+    bundle = _load()
+    if bundle is None:
+        return [None] * len(texts)
+    threshold = settings.DEPARTMENT_CLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    started = time.perf_counter()
+    proba = bundle['classifier'].predict_proba(bundle['vectorizer'].transform(texts))
+    best = proba.argmax(axis=1)
+    confidence = proba[range(len(texts)), best]
+    classes = bundle['classifier'].classes_
+    _stats['predictions'] += len(texts)
+    _stats['batches'] += 1
+    _stats['seconds'] += time.perf_counter() - started
+    return [
+        (str(classes[b]), float(c)) if c >= threshold else None
+        for b, c in zip(best, confidence)
+    ]
+
+
+def classifier_stats() -> Dict[str, Any]:
+    """Returns prediction counters and information about the loaded model."""
+    bundle = _model['bundle']
+    return dict(
+        _stats,
+        loaded=bundle is not None,
+        samples=bundle.get('samples') if bundle else None,
+        classes=len(bundle['classifier'].classes_) if bundle else None,
+    )
+
+
+registry.register('department_classifier', _load)
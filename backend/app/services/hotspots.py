@@ -0,0 +1,268 @@
+"""Radius-based hotspot detection for issue locations.
+
+Locations (`"lat,lon"` strings) are parsed into NumPy arrays and projected to
+metres around the data's median longitude. Clustering is a grid
+approximation of DBSCAN with `eps = radius_meters`, and runs in roughly O(n):
+
+1.  Points are bucketed into square cells of side `radius / sqrt(2)`, so any
+    two points in the same cell are within the radius of each other. Occupied
+    cells and their point counts come from one `np.unique` over integer cell
+    keys.
+2.  The density of a cell is the number of points in the 21 cells (5x5
+    without the corners) that can hold points within the radius of it.
+    Cells with a density of at least `min_points` are core cells.
+3.  Adjacent core cells (8-neighbourhood) are joined into clusters with
+    vectorized min-label propagation plus pointer jumping, so clusters are
+    not split at cell edges. Occupied non-core cells next to a core cell join
+    that cluster (DBSCAN's border points); other points are noise.
+
+All neighbour lookups are `searchsorted` calls on the sorted cell keys, so
+the cost grows with the number of points and occupied cells, not with the
+map area. With `ANALYTICS_SOURCE=snapshot` the points come from the in-memory
+issue snapshot (see `services/issue_snapshot.py`) instead of a query.
+`python -m benchmarks.bench_hotspots` measures it at 1M points.
+"""
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import settings
+from ..db.supabase_client import supabase_request
+
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# cell offsets that can hold points within the radius of a cell of side radius/sqrt(2)
+_DENSITY_OFFSETS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 4]
+# half of the 8-neighbourhood; each edge is only needed once
+_LINK_OFFSETS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+_NEIGHBOUR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+
+def parse_location(location: Any) -> Optional[Tuple[float, float]]:
+    """Parses a `"lat,lon"` location string; returns None if it is not valid."""
+    parts = str(location or '').split(',')
+    if len(parts) < 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def parse_locations(rows: Sequence[Dict[str, Any]]) -> Tuple[List[str], 'np.ndarray', 'np.ndarray']:
+    """Extracts coordinates from issue rows, skipping unparsable locations.
+
+    Args:
+        rows: Issue rows with `id` and `location` (`"lat,lon"`).
+
+    Returns:
+        The IDs of the parsed rows and float64 arrays of their latitudes and
+        longitudes.
+    """
+    import numpy as np
+
+    ids: List[str] = []
+    lats: List[float] = []
+    lons: List[float] = []
+    for row in rows:
+        point = parse_location(row.get('location'))
+        if point is None:
+            continue
+        ids.append(str(row.get('id')))
+        lats.append(point[0])
+        lons.append(point[1])
+    return ids, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+
+
+def _project(lat: 'np.ndarray', lon: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray']:
+    """Projects to metres (sinusoidal around the median longitude); accurate at city scale."""
+    import numpy as np
+
+    lon0 = float(np.median(lon))
+    dlon = (lon - lon0 + 180.0) % 360.0 - 180.0
+    phi = np.radians(lat)
+    return EARTH_RADIUS_M * np.radians(dlon) * np.cos(phi), EARTH_RADIUS_M * phi
+
+
+def _lookup(keys: 'np.ndarray', wanted: 'np.ndarray') -> 'np.ndarray':
+    """Returns the index of each wanted key in the sorted `keys`, or -1 if absent."""
+    import numpy as np
+
+    idx = np.searchsorted(keys, wanted)
+    idx[idx == len(keys)] = 0
+    return np.where(keys[idx] == wanted, idx, -1)
+
+
+def _components(n: int, src: 'np.ndarray', dst: 'np.ndarray') -> 'np.ndarray':
+    """Labels the connected components of a graph with n nodes by their smallest node."""
+    import numpy as np
+
+    labels = np.arange(n)
+    if not len(src):
+        return labels
+    while True:
+        ls, ld = labels[src], labels[dst]
+        low = np.minimum(ls, ld)
+        hooked = labels.copy()
+        np.minimum.at(hooked, ls, low)
+        np.minimum.at(hooked, ld, low)
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def cluster(lat: 'np.ndarray', lon: 'np.ndarray', radius_meters: float, min_points: int = 3) -> 'np.ndarray':
+    """Assigns every point to a hotspot.
+
+    Args:
+        lat: Latitudes in degrees.
+        lon: Longitudes in degrees.
+        radius_meters: The neighbourhood radius.
+        min_points: The number of points within the radius that makes an
+            area dense.
+
+    Returns:
+        An int64 array with a cluster number (0, 1, ...) per point, or -1 for
+        noise.
+    """
+    import numpy as np
+
+    n = len(lat)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    side = max(float(radius_meters), 1.0) / math.sqrt(2.0)
+    x, y = _project(lat, lon)
+    cx = np.floor(x / side).astype(np.int64)
+    cy = np.floor(y / side).astype(np.int64)
+    cx -= cx.min() - 2
+    cy -= cy.min() - 2
+    width = int(cy.max()) + 3
+    cell_keys, point_cell, counts = np.unique(cx * width + cy, return_inverse=True, return_counts=True)
+    point_cell = point_cell.reshape(-1)
+
+    density = np.zeros(len(cell_keys), dtype=np.int64)
+    for dx, dy in _DENSITY_OFFSETS:
+        idx = _lookup(cell_keys, cell_keys + (dx * width + dy))
+        density += np.where(idx >= 0, counts[idx], 0)
+    core = density >= min_points
+
+    core_cells = np.flatnonzero(core)
+    src_parts, dst_parts = [], []
+    for dx, dy in _LINK_OFFSETS:
+        idx = _lookup(cell_keys, cell_keys[core_cells] + (dx * width + dy))
+        linked = (idx >= 0) & core[np.maximum(idx, 0)]
+        src_parts.append(core_cells[linked])
+        dst_parts.append(idx[linked])
+    labels = _components(len(cell_keys), np.concatenate(src_parts), np.concatenate(dst_parts))
+
+    cell_label = np.where(core, labels, -1)
+    border = np.flatnonzero(~core)
+    for dx, dy in _NEIGHBOUR_OFFSETS:
+        if not len(border):
+            break
+        idx = _lookup(cell_keys, cell_keys[border] + (dx * width + dy))
+        hit = (idx >= 0) & core[np.maximum(idx, 0)]
+        cell_label[border[hit]] = labels[idx[hit]]
+        border = border[~hit]
+
+    # renumber the cluster labels 0..k-1
+    clustered = cell_label >= 0
+    _, dense_label = np.unique(cell_label[clustered], return_inverse=True)
+    cell_label[clustered] = dense_label.reshape(-1)
+    return cell_label[point_cell]
+
+
+def summarize(
+    ids: Sequence[str],
+    lat: 'np.ndarray',
+    lon: 'np.ndarray',
+    labels: 'np.ndarray',
+    limit: int = 20,
+    member_limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Builds the hotspot list for the largest clusters.
+
+    Args:
+        ids: The issue ID of each point.
+        lat: Latitudes in degrees.
+        lon: Longitudes in degrees.
+        labels: The cluster of each point, as returned by `cluster`.
+        limit: The number of clusters to return.
+        member_limit: The maximum number of member IDs listed per cluster.
+
+    Returns:
+        Hotspots ordered by size, each with the centroid (`lat`, `lon`),
+        `count`, `radius_meters` (distance from the centroid to the farthest
+        member) and `member_ids`.
+    """
+    import numpy as np
+
+    clustered = labels >= 0
+    if not clustered.any():
+        return []
+    k = int(labels.max()) + 1
+    counts = np.bincount(labels[clustered], minlength=k)
+    lat_sum = np.bincount(labels[clustered], weights=lat[clustered], minlength=k)
+    lon_sum = np.bincount(labels[clustered], weights=lon[clustered], minlength=k)
+    top = np.argsort(-counts, kind='stable')[:limit]
+    hotspots = []
+    for c in top:
+        members = np.flatnonzero(labels == c)
+        clat, clon = lat_sum[c] / counts[c], lon_sum[c] / counts[c]
+        dy = np.radians(lat[members] - clat) * EARTH_RADIUS_M
+        dx = np.radians(lon[members] - clon) * EARTH_RADIUS_M * math.cos(math.radians(clat))
+        hotspots.append({
+            'lat': round(float(clat), 6),
+            'lon': round(float(clon), 6),
+            'count': int(counts[c]),
+            'radius_meters': round(float(np.sqrt(dx * dx + dy * dy).max()), 1),
+            'member_ids': [ids[i] for i in members[:member_limit]],
+        })
+    return hotspots
+
+
+async def find_hotspots(
+    radius_meters: float,
+    days: int,
+    min_points: int = 3,
+    limit: int = 20,
+    member_limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Clusters the locations of the issues reported in the last `days` days.
+
+    Args:
+        radius_meters: The neighbourhood radius (see `cluster`).
+        days: Only issues created within this many days are considered.
+        min_points: The number of issues within the radius that makes an area
+            a hotspot.
+        limit: The number of hotspots to return.
+        member_limit: The maximum number of issue IDs listed per hotspot.
+
+    Returns:
+        Hotspots ordered by issue count (see `summarize`).
+    """
+    if settings.ANALYTICS_SOURCE == 'snapshot':
+        from . import issue_snapshot
+
+        points = await issue_snapshot.locations(days)
+        rows = None
+    else:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        r = await supabase_request('GET', 'issues', filters={'created_at.gte': since, 'location.not.is': 'null'}, select='id,location')
+        points, rows = None, r.get('data') or []
+
+    def _run() -> List[Dict[str, Any]]:
+        ids, lat, lon = points if points is not None else parse_locations(rows)
+        labels = cluster(lat, lon, radius_meters, min_points)
+        return summarize(ids, lat, lon, labels, limit, member_limit)
+
+    return await asyncio.to_thread(_run)
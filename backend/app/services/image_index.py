@@ -0,0 +1,233 @@
+"""Content-hash index of uploaded images for deduplication.
+
+Citizens often re-submit the same photo, and mobile clients retry uploads on
+flaky networks. Before uploading, `create_issue` fingerprints each image with
+SHA-256 of its bytes (and, with `IMAGE_PHASH_ENABLED`, a 64-bit perceptual
+dHash). If the index already knows the fingerprint, the existing Cloudinary
+asset (`url`, `public_id`, thumbnail...) is reused instead of uploading again.
+
+The index is a node-local SQLite file (`IMAGE_INDEX_PATH`) shared by all
+workers on the host. Each entry is reference counted, because one asset can now
+back several issues: deleting an issue releases its references. Because the
+file is local to one host (and lost with a container's `data/`), an asset whose
+count drops to zero, or that this index does not know, is only removed from
+Cloudinary once no row in `issues` lists it any more.
+
+Perceptual lookups use four 16-bit bands of the hash. Two hashes within a
+Hamming distance of 3 must agree on at least one band, so candidates come from
+indexed equality lookups instead of a table scan. That guarantee does not hold
+for larger distances, so an `IMAGE_PHASH_MAX_DISTANCE` above
+`MAX_PHASH_DISTANCE` is rejected when this module is loaded.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings
+from ..db.local_store import LocalStore, transaction
+from ..db.supabase_client import supabase_request
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    '''create table if not exists image_index (
+        sha256 text primary key,
+        phash integer,
+        band0 integer, band1 integer, band2 integer, band3 integer,
+        public_id text,
+        item text not null,
+        refcount integer not null default 1,
+        created_at real not null
+    )''',
+    'create index if not exists image_index_public_id on image_index (public_id)',
+    'create index if not exists image_index_band0 on image_index (band0)',
+    'create index if not exists image_index_band1 on image_index (band1)',
+    'create index if not exists image_index_band2 on image_index (band2)',
+    'create index if not exists image_index_band3 on image_index (band3)',
+)
+
+_BAND_COUNT = 4
+# pigeonhole bound: more differing bits than this can touch every band
+MAX_PHASH_DISTANCE = _BAND_COUNT - 1
+
+if settings.IMAGE_PHASH_ENABLED and not 0 <= settings.IMAGE_PHASH_MAX_DISTANCE <= MAX_PHASH_DISTANCE:
+    raise ValueError(
+        f'IMAGE_PHASH_MAX_DISTANCE must be between 0 and {MAX_PHASH_DISTANCE}, '
+        f'got {settings.IMAGE_PHASH_MAX_DISTANCE}: the band lookup would miss near-duplicates'
+    )
+
+_store = LocalStore(settings.IMAGE_INDEX_PATH, _SCHEMA)
+_stats = {'exact_hits': 0, 'perceptual_hits': 0, 'misses': 0, 'recorded': 0, 'races': 0, 'released': 0, 'kept_referenced': 0}
+
+
+def is_enabled() -> bool:
+    """Returns True when image deduplication is switched on."""
+    return bool(settings.IMAGE_DEDUP_ENABLED)
+
+
+def _to_signed(value: int) -> int:
+    """Maps an unsigned 64-bit hash into SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _bands(phash: Optional[int]) -> Tuple[Optional[int], ...]:
+    if phash is None:
+        return (None,) * _BAND_COUNT
+    return tuple((phash >> (16 * i)) & 0xFFFF for i in range(_BAND_COUNT))
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+
+def _acquire(conn, sha256: str, phash: Optional[int]) -> Tuple[Optional[Dict[str, Any]], str]:
+    row = conn.execute('select sha256, item from image_index where sha256 = ?', (sha256,)).fetchone()
+    kind = 'exact'
+    if row is None and phash is not None:
+        kind = 'perceptual'
+        bands = _bands(phash)
+        candidates = conn.execute(
+            'select sha256, item, phash from image_index where band0 = ? or band1 = ? or band2 = ? or band3 = ?',
+            bands,
+        ).fetchall()
+        best = None
+        for cand in candidates:
+            if cand['phash'] is None:
+                continue
+            distance = _hamming(cand['phash'], phash)
+            if distance <= settings.IMAGE_PHASH_MAX_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, cand)
+        row = best[1] if best else None
+    if row is None:
+        return None, 'miss'
+    conn.execute('update image_index set refcount = refcount + 1 where sha256 = ?', (row['sha256'],))
+    return json.loads(row['item']), kind
+
+
+async def acquire(sha256: str, phash: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Looks up an already uploaded copy of an image and takes a reference on it.
+
+    Args:
+        sha256: The hex SHA-256 of the image bytes.
+        phash: An optional 64-bit perceptual hash for near-duplicate matching.
+
+    Returns:
+        The stored image item to reuse, or None if the image is new.
+    """
+    signed = _to_signed(phash) if phash is not None else None
+    item, kind = await _store.run(lambda conn: transaction(conn, lambda c: _acquire(c, sha256, signed)))
+    _stats['misses' if item is None else f'{kind}_hits'] += 1
+    return item
+
+
+def _record(conn, sha256: str, phash: Optional[int], item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    row = conn.execute('select item from image_index where sha256 = ?', (sha256,)).fetchone()
+    if row is not None:
+        # another worker uploaded the same bytes concurrently; keep theirs
+        conn.execute('update image_index set refcount = refcount + 1 where sha256 = ?', (sha256,))
+        return json.loads(row['item'])
+    conn.execute(
+        'insert into image_index (sha256, phash, band0, band1, band2, band3, public_id, item, refcount, created_at) values (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)',
+        (sha256, phash) + _bands(phash) + (item.get('public_id'), json.dumps(item), time.time()),
+    )
+    return None
+
+
+async def record(sha256: str, phash: Optional[int], item: Dict[str, Any]) -> Dict[str, Any]:
+    """Registers a freshly uploaded image and returns the item to store on the issue.
+
+    If another worker recorded the same bytes in the meantime, its item is
+    returned instead and the caller should delete its own, redundant upload.
+
+    Args:
+        sha256: The hex SHA-256 of the image bytes.
+        phash: The optional 64-bit perceptual hash.
+        item: The uploaded image item (`url`, `public_id`, ...).
+
+    Returns:
+        The canonical image item for these bytes.
+    """
+    if not item.get('public_id'):
+        return item
+    signed = _to_signed(phash) if phash is not None else None
+    existing = await _store.run(lambda conn: transaction(conn, lambda c: _record(c, sha256, signed, item)))
+    if existing is not None:
+        _stats['races'] += 1
+        return existing
+    _stats['recorded'] += 1
+    return item
+
+
+def _release(conn, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    candidates: List[Dict[str, Any]] = []
+    for item in items:
+        public_id = item.get('public_id')
+        if not public_id:
+            continue
+        row = conn.execute('select sha256, refcount, item from image_index where public_id = ?', (public_id,)).fetchone()
+        if row is None:
+            # unknown here; another host or a lost index may still share it
+            candidates.append(item)
+        elif row['refcount'] > 1:
+            conn.execute('update image_index set refcount = refcount - 1 where sha256 = ?', (row['sha256'],))
+        else:
+            conn.execute('delete from image_index where sha256 = ?', (row['sha256'],))
+            candidates.append(json.loads(row['item']))
+    return candidates
+
+
+async def _referenced(public_id: str) -> bool:
+    """Returns True unless no issue's `images` contains `public_id` any more.
+
+    The issues table is the only reference list every host sees, so it has
+    the final say over the node-local refcounts. Errors count as referenced:
+    keeping an orphaned asset is cheaper than breaking another issue.
+    """
+    r = await supabase_request(
+        'GET', 'issues',
+        filters={'images.cs': json.dumps([{'public_id': public_id}], separators=(',', ':'))},
+        select='id',
+        limit=1,
+    )
+    if r.get('status_code') != 200:
+        logger.warning('could not check references to image %s, keeping it: %s', public_id, r.get('data'))
+        return True
+    return bool(r.get('data'))
+
+
+async def release(items: List[Dict[str, Any]]) -> List[str]:
+    """Drops one reference per image item and returns the public IDs safe to delete.
+
+    Call it after the issue holding `items` was deleted (or never created).
+    An image is only returned if the local refcount allows it and no issue in
+    the database still lists it, so assets shared through another host's
+    index, or through an index that was lost or switched off, are kept.
+
+    Args:
+        items: Image items previously stored on an issue.
+
+    Returns:
+        The Cloudinary public IDs (images and thumbnails) that no other issue
+        references any more.
+    """
+    if not items:
+        return []
+    if is_enabled():
+        candidates = await _store.run(lambda conn: transaction(conn, lambda c: _release(c, items)))
+        _stats['released'] += len(items)
+    else:
+        candidates = [im for im in items if im.get('public_id')]
+    referenced = await asyncio.gather(*(_referenced(im['public_id']) for im in candidates))
+    _stats['kept_referenced'] += sum(referenced)
+    return [
+        im.get(key)
+        for im, keep in zip(candidates, referenced) if not keep
+        for key in ('public_id', 'thumbnail_public_id') if im.get(key)
+    ]
+
+
+def index_stats() -> Dict[str, Any]:
+    """Returns dedup hit/miss counters."""
+    return dict(_stats, enabled=is_enabled())
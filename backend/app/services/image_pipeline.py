@@ -0,0 +1,197 @@
+"""Optional server-side image preprocessing before upload.
+
+Phones send multi-megabyte photos. When `IMAGE_PREPROCESS_ENABLED` is set,
+each image is decoded, rotated according to its EXIF orientation, stripped
+of all metadata (EXIF/GPS), downscaled to `IMAGE_MAX_DIMENSION`, re-encoded
+as `IMAGE_FORMAT` at `IMAGE_QUALITY` and given a `IMAGE_THUMBNAIL_SIZE`
+thumbnail. The CPU-heavy work runs in a `ProcessPoolExecutor` so it neither
+blocks the event loop nor contends for the GIL.
+
+Pillow is optional: without it, or when processing fails (e.g. the upload is
+not a decodable image), callers fall back to uploading the original bytes.
+"""
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from ..config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_stats = {'images': 0, 'failures': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0}
+
+
+def _encode(img: Any, fmt: str, quality: int) -> bytes:
+    """Encodes a Pillow image without any metadata."""
+    if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif fmt == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+    out = io.BytesIO()
+    # no exif=/icc_profile= arguments, so nothing from the original is carried over
+    img.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue()
+
+
+def process_image(data: bytes, max_dimension: int, fmt: str, quality: int, thumbnail_size: int) -> Dict[str, Any]:
+    """Resizes, re-encodes and thumbnails one image. Runs inside a worker process.
+
+    Args:
+        data: The original encoded image bytes.
+        max_dimension: The maximum width/height of the output image.
+        fmt: The output format (`'WEBP'`, `'JPEG'` or `'PNG'`).
+        quality: The encoder quality (1-100).
+        thumbnail_size: The maximum width/height of the thumbnail.
+
+    Returns:
+        A dictionary with the processed `data` and `thumbnail` bytes, the
+        output `width`/`height`/`format`, byte sizes and the `cpu_seconds`
+        spent in this process.
+    """
+    from PIL import Image, ImageOps
+
+    started = time.process_time()
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src)
+        img.load()
+    img.thumbnail((max_dimension, max_dimension))
+    processed = _encode(img, fmt, quality)
+    thumb = img.copy()
+    thumb.thumbnail((thumbnail_size, thumbnail_size))
+    thumbnail = _encode(thumb, fmt, quality)
+    return {
+        'data': processed,
+        'thumbnail': thumbnail,
+        'width': img.width,
+        'height': img.height,
+        'format': fmt.lower(),
+        'content_type': _CONTENT_TYPES.get(fmt, 'application/octet-stream'),
+        'extension': _EXTENSIONS.get(fmt, 'bin'),
+        'original_bytes': len(data),
+        'bytes': len(processed),
+        'cpu_seconds': time.process_time() - started,
+    }
+
+
+def perceptual_hash(data: bytes) -> int:
+    """Computes a 64-bit difference hash (dHash) of an image. Runs in a worker process.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records
+    whether a pixel is brighter than its right-hand neighbour, so re-encoded
+    or slightly resized copies of a photo hash to (nearly) the same value.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src).convert('L').resize((9, 8))
+    pixels = list(img.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def pillow_available() -> bool:
+    """Returns True when Pillow can be imported."""
+    try:
+        import PIL  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def is_enabled() -> bool:
+    """Returns True when preprocessing is switched on and Pillow is importable."""
+    return bool(settings.IMAGE_PREPROCESS_ENABLED) and pillow_available()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, settings.IMAGE_PROCESS_WORKERS))
+    return _executor
+
+
+async def preprocess(data: bytes) -> Optional[Dict[str, Any]]:
+    """Runs `process_image` in the process pool.
+
+    Args:
+        data: The original image bytes.
+
+    Returns:
+        The processing result (see `process_image`), or None if preprocessing
+        is disabled or the image could not be processed.
+    """
+    if not is_enabled():
+        return None
+    fmt = (settings.IMAGE_FORMAT or 'WEBP').upper()
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(
+            _get_executor(),
+            process_image,
+            data,
+            settings.IMAGE_MAX_DIMENSION,
+            fmt,
+            settings.IMAGE_QUALITY,
+            settings.IMAGE_THUMBNAIL_SIZE,
+        )
+    except Exception as exc:
+        _stats['failures'] += 1
+        logger.warning('image preprocessing failed, uploading original: %s', exc)
+        return None
+    _stats['images'] += 1
+    _stats['bytes_in'] += result['original_bytes']
+    _stats['bytes_out'] += result['bytes']
+    _stats['cpu_seconds'] += result['cpu_seconds']
+    logger.info(
+        'preprocessed image %d -> %d bytes (saved %d) in %.1f ms CPU',
+        result['original_bytes'], result['bytes'], result['original_bytes'] - result['bytes'], result['cpu_seconds'] * 1000.0,
+    )
+    return result
+
+
+async def compute_phash(data: bytes) -> Optional[int]:
+    """Runs `perceptual_hash` in the process pool.
+
+    Returns:
+        The 64-bit hash, or None if Pillow is missing or the data is not a
+        decodable image.
+    """
+    if not pillow_available():
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), perceptual_hash, data)
+    except Exception:
+        return None
+
+
+def shutdown() -> None:
+    """Stops the worker processes. Called from the application lifespan."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def pipeline_stats() -> Dict[str, Any]:
+    """Returns totals and per-image averages for bytes saved and CPU time."""
+    images = _stats['images']
+    return dict(
+        _stats,
+        enabled=is_enabled(),
+        bytes_saved=_stats['bytes_in'] - _stats['bytes_out'],
+        avg_bytes_saved=round((_stats['bytes_in'] - _stats['bytes_out']) / images) if images else None,
+        avg_cpu_ms=round(_stats['cpu_seconds'] * 1000.0 / images, 2) if images else None,
+    )
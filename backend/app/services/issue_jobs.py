@@ -0,0 +1,122 @@
+"""Background job handlers for issue post-processing.
+
+These run on the job queue (see `job_queue`) instead of inside the request
+that triggered them:
+
+-   `route_issue`: detect the department from the issue text and assign it.
+-   `notify`: persist a notification for a user.
+-   `cloudinary_cleanup`: delete images that are no longer referenced.
+
+Importing this module registers the handlers.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from ..config import settings
+from ..db.supabase_client import supabase_request
+from . import department_classifier
+from .cloudinary_service import delete_images
+from .job_queue import enqueue, handler
+from .reference_cache import get_reference_rows
+from .routing_engine import detect_department_from_text, map_department_name_to_id, refresh_rules
+
+
+logger = logging.getLogger(__name__)
+
+
+@handler('route_issue')
+async def route_issue(payload: Dict[str, Any]) -> None:
+    """Assigns a department to a new issue based on its title and description.
+
+    Keyword rules are tried first; if none match, the trained department
+    classifier is used when available. Issues that were assigned manually in
+    the meantime are left untouched.
+    """
+    await refresh_rules()
+    text = payload.get('text') or ''
+    department_id = None
+    dept_name = detect_department_from_text(text)
+    if dept_name:
+        rows = await get_reference_rows('departments')
+        id_to_name = {r.get('id'): r.get('name') for r in rows}
+        department_id = map_department_name_to_id(id_to_name, dept_name)
+    if not department_id:
+        # no keyword hit: fall back to the trained classifier (None without a model),
+        # fed the same text it was trained on; jobs queued before that only carry `text`
+        classifier_text = payload.get('classifier_text') or text
+        prediction = (await asyncio.to_thread(department_classifier.predict_batch, [classifier_text]))[0]
+        department_id = prediction[0] if prediction else None
+    if not department_id:
+        return
+    filters = {'id.eq': payload['issue_id'], 'department_id.is': 'null'}
+    r = await supabase_request('PATCH', 'issues', payload={'department_id': department_id}, filters=filters)
+    if r.get('status_code') not in (200, 204):
+        raise RuntimeError(f"routing update failed: {r.get('data')}")
+
+
+@handler('notify')
+async def notify(payload: Dict[str, Any]) -> None:
+    """Stores a notification row for a user."""
+    note = {
+        'user_id': payload.get('user_id'),
+        'title': payload.get('title'),
+        'body': payload.get('body'),
+        'metadata': payload.get('metadata'),
+    }
+    r = await supabase_request('POST', 'notifications', payload=note)
+    if r.get('status_code') not in (200, 201, 204):
+        raise RuntimeError(f"notification insert failed: {r.get('data')}")
+
+
+@handler('cloudinary_cleanup')
+async def cloudinary_cleanup(payload: Dict[str, Any]) -> None:
+    """Deletes Cloudinary assets in bulk.
+
+    If only some deletions fail, the failed IDs are re-queued as a new job so
+    that retries do not repeat the ones that succeeded. If nothing could be
+    deleted, the job raises and is retried with backoff as a whole.
+    """
+    public_ids = payload.get('public_ids') or []
+    res = await delete_images(public_ids)
+    failed = res['failed']
+    if not failed:
+        return
+    if not res['deleted']:
+        raise RuntimeError(f'failed to delete {len(failed)} image(s): {failed[:10]}')
+    logger.warning('re-queueing %d of %d image deletions', len(failed), len(public_ids))
+    await enqueue('cloudinary_cleanup', {'public_ids': failed}, delay=settings.JOB_BACKOFF_BASE_SECONDS)
+
+
+async def enqueue_routing(issue: Dict[str, Any]) -> Optional[int]:
+    """Schedules department detection for a freshly created issue row."""
+    return await enqueue('route_issue', {
+        'issue_id': issue['id'],
+        'text': f"{issue.get('title') or ''} {issue.get('description') or ''}",
+        'classifier_text': department_classifier.issue_text(issue),
+    })
+
+
+async def enqueue_notification(user_id: Optional[str], title: str, body: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """Schedules a notification for a user; does nothing without a user."""
+    if not user_id:
+        return None
+    return await enqueue('notify', {'user_id': user_id, 'title': title, 'body': body, 'metadata': metadata or {}})
+
+
+async def enqueue_image_cleanup(public_ids: List[str]) -> Optional[int]:
+    """Schedules deletion of Cloudinary assets, falling back to inline deletion.
+
+    If the queue itself is unavailable, the images are deleted right away on a
+    best-effort basis so that they are not silently orphaned.
+    """
+    if not public_ids:
+        return None
+    try:
+        return await enqueue('cloudinary_cleanup', {'public_ids': list(public_ids)})
+    except Exception:
+        logger.exception('could not enqueue image cleanup, deleting inline')
+        try:
+            await delete_images(public_ids)
+        except Exception:
+            pass
+        return None
@@ -1,24 +1,125 @@
-from typing import Optional, Dict, Any, List, Union
-from ..db.supabase_client import supabase_request
-from ..services.cloudinary_service import upload_image, delete_image
+from typing import Optional, Dict, Any, List, Tuple, Union
+from ..db.supabase_client import supabase_request, supabase_rpc
+from ..services.cloudinary_service import upload_image
 from ..schemas.issue import IssueCreate, IssueUpdate
 from ..schemas.api_models import IssueCreateModel, IssueUpdateModel
-from ..ai.model import detect_unwanted_submission
-from .routing_engine import detect_department_from_text, map_department_name_to_id
-import tempfile
-import shutil
+from ..ai import moderation
+from . import image_index, image_pipeline, issue_jobs, issue_snapshot
+from ..config import settings
+from datetime import datetime, timezone
+import asyncio
+import hashlib
+import logging
 import os
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _fingerprint(img: Any, need_bytes: bool) -> Tuple[str, Optional[bytes]]:
+    """Computes the SHA-256 of an uploaded file by streaming through it.
+
+    The file is read in `UPLOAD_CHUNK_SIZE` chunks and rewound afterwards, so
+    it can still be streamed to Cloudinary. When `need_bytes` is set (for
+    preprocessing or perceptual hashing) the content is also returned.
+    """
+    digest = hashlib.sha256()
+    chunks: List[bytes] = []
+    while True:
+        chunk = await img.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        if need_bytes:
+            chunks.append(chunk)
+    await img.seek(0)
+    return digest.hexdigest(), (b''.join(chunks) if need_bytes else None)
+
+
+async def _upload_issue_image(img: Any) -> Optional[Dict[str, Any]]:
+    """Uploads one submitted image and returns its `images` JSONB item.
+
+    With deduplication enabled, the image is fingerprinted first and an
+    existing Cloudinary asset with the same content is reused without
+    uploading (see `image_index`). With preprocessing enabled, the image is
+    resized/re-encoded in the process pool and a thumbnail is uploaded next
+    to it; the item then also records the thumbnail, output dimensions and
+    byte sizes. Otherwise the original is streamed to Cloudinary unchanged.
+
+    Args:
+        img: The uploaded file (e.g. FastAPI's UploadFile).
+
+    Returns:
+        The image item (`url`, `public_id`, ...), or None if Cloudinary
+        returned nothing.
+    """
+    dedup = image_index.is_enabled()
+    preprocess = image_pipeline.is_enabled()
+    use_phash = dedup and settings.IMAGE_PHASH_ENABLED
+    sha256 = phash = raw = None
+    if dedup or preprocess:
+        sha256, raw = await _fingerprint(img, need_bytes=preprocess or use_phash)
+    if use_phash and raw is not None:
+        phash = await image_pipeline.compute_phash(raw)
+    if dedup:
+        existing = await image_index.acquire(sha256, phash)
+        if existing:
+            return existing
+
+    item = await _upload_new_image(img, raw if preprocess else None)
+    if dedup and item:
+        canonical = await image_index.record(sha256, phash, item)
+        if canonical is not item:
+            # lost a race with an identical concurrent upload; drop ours
+            await issue_jobs.enqueue_image_cleanup([item.get(k) for k in ('public_id', 'thumbnail_public_id') if item.get(k)])
+            item = canonical
+    return item
+
+
+async def _upload_new_image(img: Any, raw: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    """Uploads an image (preprocessed when `raw` bytes are given) and builds its item."""
+    processed = await image_pipeline.preprocess(raw) if raw is not None else None
+    if processed is None:
+        res = await upload_image(img)
+        return {'url': res.get('secure_url'), 'public_id': res.get('public_id')} if res else None
+
+    stem = os.path.splitext(os.path.basename(getattr(img, 'filename', None) or 'upload'))[0]
+    res = await upload_image(processed['data'], filename=f"{stem}.{processed['extension']}", content_type=processed['content_type'])
+    if not res:
+        return None
+    item = {
+        'url': res.get('secure_url'),
+        'public_id': res.get('public_id'),
+        'width': processed['width'],
+        'height': processed['height'],
+        'format': processed['format'],
+        'bytes': processed['bytes'],
+        'original_bytes': processed['original_bytes'],
+    }
+    try:
+        thumb = await upload_image(processed['thumbnail'], folder='issues/thumbnails', filename=f"{stem}_thumb.{processed['extension']}", content_type=processed['content_type'])
+        item['thumbnail_url'] = thumb.get('secure_url')
+        item['thumbnail_public_id'] = thumb.get('public_id')
+    except Exception:
+        # a missing thumbnail should not fail the whole report
+        pass
+    return item
 
 
 async def create_issue(data: Union[IssueCreateModel, IssueCreate, Dict[str, Any]], image_files: Optional[List[Any]] = None, user: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """Creates a new issue, processes images, and saves it to the database.
 
     This function performs several steps:
-    1.  Runs spam detection on the issue's title and description.
-    2.  If images are provided, uploads them to Cloudinary.
-    3.  Attempts to auto-detect and assign a department based on the text.
-    4.  Saves the final issue data to the Supabase database.
-    5.  If any step fails, it attempts to clean up uploaded images.
+    1.  Runs the moderation engine on the issue's title and description.
+    2.  If images are provided, reuses already uploaded copies (see
+        `image_index`), optionally preprocesses the rest (see
+        `image_pipeline`) and uploads them to Cloudinary concurrently (up to
+        `UPLOAD_CONCURRENCY` at a time).
+    3.  Saves the issue to the Supabase database and returns it right away.
+    4.  Enqueues a background job that detects and assigns a department
+        based on the text (see `issue_jobs`).
+    5.  If any step fails, it schedules cleanup of the uploaded images.
 
     Args:
         data: A Pydantic model or dictionary containing the issue data (title,
@@ -30,7 +131,8 @@ async def create_issue(data: Union[IssueCreateModel, IssueCreate, Dict[str, Any]
 
     Returns:
         A dictionary representing the newly created issue from the database.
-        If spam is detected, it returns a dictionary with an error message.
+        If the text is flagged, it returns a dictionary with an error message
+        and the moderation reasons.
 
     Raises:
         Exception: If the database operation fails, it re-raises the exception
@@ -45,42 +147,30 @@ async def create_issue(data: Union[IssueCreateModel, IssueCreate, Dict[str, Any]
         title = getattr(data, 'title', None)
         description = getattr(data, 'description', None)
     text = (title or '') + ' ' + (description or '')
-    if detect_unwanted_submission(text):
-        return {'ok': False, 'error': 'Submission flagged as spam'}
+    verdict = await moderation.moderate(text)
+    if verdict['flagged']:
+        return {'ok': False, 'error': 'Submission flagged as spam', 'reasons': verdict['reasons']}
 
     uploaded: List[Dict[str, Any]] = []
     try:
         if image_files:
-            for img in image_files:
-                if not img:
-                    continue
-                # img is UploadFile - write to temp file
-                tmp = tempfile.NamedTemporaryFile(delete=False)
-                try:
-                    shutil.copyfileobj(img.file, tmp)
-                    tmp.flush()
-                    # await the async upload
-                    res = await upload_image(tmp.name)
-                    if res:
-                        uploaded.append({'url': res.get('secure_url'), 'public_id': res.get('public_id')})
-                finally:
-                    tmp.close()
-                    try:
-                        os.unlink(tmp.name)
-                    except Exception:
-                        pass
-
-        # attempt to auto-detect department from title/description
-        combined_text = f"{title or ''} {description or ''}"
-        dept_name = detect_department_from_text(combined_text)
-        department_id = None
-        if dept_name:
-            # fetch departments once and map name->id
-            dres = await supabase_request('GET', 'departments')
-            rows = dres.get('data') or []
-            # build mapping id->name
-            id_to_name = {r.get('id'): r.get('name') for r in rows}
-            department_id = map_department_name_to_id(id_to_name, dept_name)
+            # stream each UploadFile straight to Cloudinary, a few at a time
+            semaphore = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
+
+            async def _upload(img):
+                async with semaphore:
+                    return await _upload_issue_image(img)
+
+            results = await asyncio.gather(*[_upload(img) for img in image_files if img], return_exceptions=True)
+            failure = None
+            for res in results:
+                if isinstance(res, BaseException):
+                    failure = failure or res
+                elif res:
+                    uploaded.append(res)
+            if failure is not None:
+                # the successful uploads are already in `uploaded` and get cleaned up below
+                raise failure
 
         payload = {
             'title': title,
@@ -88,27 +178,31 @@ async def create_issue(data: Union[IssueCreateModel, IssueCreate, Dict[str, Any]
             'status': getattr(data, 'status', None) or 'pending',
             'images': uploaded,
             'user_id': user.get('id') if user else None,
-            'department_id': department_id
+            'department_id': None
         }
 
-        # pass a single payload mapping
-        r = await supabase_request('POST', 'issues', payload=payload)
+        # pass a single payload mapping; ask PostgREST to return the inserted row
+        r = await supabase_request('POST', 'issues', payload=payload, headers={'Prefer': 'return=representation'})
         if r.get('status_code') in (200, 201):
             created = r.get('data')
             # Supabase may return list
             if isinstance(created, list) and created:
-                return created[0]
+                created = created[0]
+            # department detection runs in the background once the row exists
+            if isinstance(created, dict) and created.get('id'):
+                try:
+                    await issue_jobs.enqueue_routing(created)
+                except Exception:
+                    logger.exception('could not enqueue routing for issue %s', created.get('id'))
             return created
         # on failure raise to be handled by caller
         raise Exception(r.get('data'))
     except Exception as exc:
-        # attempt to cleanup uploaded images on failure
-        for u in uploaded:
-            if u.get('public_id'):
-                try:
-                    await delete_image(u.get('public_id'))
-                except Exception:
-                    pass
+        # attempt to cleanup uploaded images on failure (shared assets are only released)
+        try:
+            await issue_jobs.enqueue_image_cleanup(await image_index.release(uploaded))
+        except Exception:
+            pass
         # Re-raise the original exception so callers (routes) can convert to HTTP errors
         raise
 
@@ -139,12 +233,48 @@ async def get_issue(id: str) -> Optional[Dict[str, Any]]:
     return rows[0] if rows else None
 
 
-async def update_issue(id: str, data: Union[IssueUpdateModel, IssueUpdate, Dict[str, Any]], user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+class IssueConflictError(Exception):
+    """Raised when an update's `updated_at` precondition no longer holds.
+
+    Attributes:
+        current: The issue row as it currently is in the database.
+    """
+
+    def __init__(self, current: Optional[Dict[str, Any]] = None):
+        super().__init__('Issue was modified concurrently')
+        self.current = current
+
+
+UPDATE_ISSUE_RPC = 'update_issue_with_notification'
+
+
+def _update_payload(data: Union[IssueUpdateModel, IssueUpdate, Dict[str, Any]]) -> Dict[str, Any]:
+    """Extracts the non-None fields to update from a model, dict or object."""
+    # accept Pydantic model or dict-like
+    if hasattr(data, 'dict'):
+        return {k: v for k, v in data.dict().items() if v is not None}
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if v is not None}
+    # fallback for objects with attributes
+    return {k: getattr(data, k) for k in ('title', 'description', 'status', 'department_id') if getattr(data, k, None) is not None}
+
+
+def _rpc_missing(r: Dict[str, Any]) -> bool:
+    """Detects PostgREST's "function not found" answer (schema not migrated yet)."""
+    data = r.get('data')
+    return r.get('status_code') == 404 and isinstance(data, dict) and data.get('code') == 'PGRST202'
+
+
+async def update_issue(id: str, data: Union[IssueUpdateModel, IssueUpdate, Dict[str, Any]], user: Optional[Dict[str, Any]], expected_updated_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """Updates an existing issue in the database.
 
-    This function updates an issue's fields based on the provided data.
-    If the 'status' of the issue is changed, it creates a notification for the
-    user who originally created the issue.
+    The update runs server-side through the `update_issue_with_notification`
+    SQL function (see `supabase/schema.sql`): in one round trip and one
+    transaction it applies the changes, maintains `updated_at`/`resolved_at`,
+    inserts a notification for the reporter when the status changed, and
+    returns the old and new row. On databases without the function it falls
+    back to a single PATCH with `return=representation` plus a queued
+    notification.
 
     Args:
         id: The unique identifier of the issue to update.
@@ -152,49 +282,186 @@ async def update_issue(id: str, data: Union[IssueUpdateModel, IssueUpdate, Dict[
             Only non-None fields will be updated.
         user: The user performing the update (not currently used for permissions,
             but available for future use).
+        expected_updated_at: Optional `updated_at` value the caller last saw.
+            If given, the update only applies when the row is unchanged since.
 
     Returns:
         A dictionary representing the updated issue if successful, otherwise None.
+
+    Raises:
+        IssueConflictError: If `expected_updated_at` no longer matches.
     """
+    payload = _update_payload(data)
+    params = {'p_issue_id': id, 'p_changes': payload, 'p_expected_updated_at': expected_updated_at}
+    r = await supabase_rpc(UPDATE_ISSUE_RPC, params)
+    if _rpc_missing(r):
+        return await _update_issue_legacy(id, payload, expected_updated_at)
+    result = r.get('data')
+    if r.get('status_code') != 200 or not isinstance(result, dict):
+        return None
+    if result.get('status') == 'conflict':
+        raise IssueConflictError(result.get('old'))
+    if result.get('status') != 'ok':
+        return None
+    return result.get('new')
+
+
+async def _update_issue_legacy(id: str, payload: Dict[str, Any], expected_updated_at: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Fallback for `update_issue` when the SQL function is not installed."""
     # fetch existing to detect status changes
     existing = await get_issue(id)
-    # accept Pydantic model or dict-like
-    if hasattr(data, 'dict'):
-        payload = {k: v for k, v in data.dict().items() if v is not None}
-    elif isinstance(data, dict):
-        payload = {k: v for k, v in data.items() if v is not None}
-    else:
-        # fallback for objects with attributes
-        payload = {k: getattr(data, k) for k in ('title', 'description', 'status', 'department_id') if getattr(data, k, None) is not None}
+    if not existing:
+        return None
+    payload = dict(payload, updated_at=datetime.now(timezone.utc).isoformat())
+    new_status = payload.get('status')
+    old_status = existing.get('status')
+    if new_status and new_status != old_status:
+        payload['resolved_at'] = payload['updated_at'] if new_status == 'resolved' else None
     filters = {'id.eq': id}
-    r = await supabase_request('PATCH', 'issues', payload=payload, filters=filters)
-    if r.get('status_code') in (200, 204):
-        # notify user if status changed
+    if expected_updated_at:
+        filters['updated_at.eq'] = expected_updated_at
+    r = await supabase_request('PATCH', 'issues', payload=payload, filters=filters, headers={'Prefer': 'return=representation'})
+    if r.get('status_code') not in (200, 204):
+        return None
+    rows = r.get('data') if isinstance(r.get('data'), list) else []
+    if not rows:
+        if expected_updated_at:
+            raise IssueConflictError(await get_issue(id))
+        return None
+    # notify user if status changed (delivered by the job worker)
+    try:
+        if new_status and old_status and new_status != old_status:
+            await issue_jobs.enqueue_notification(
+                existing.get('user_id'),
+                'Issue status updated',
+                f'Your issue status changed from {old_status} to {new_status}',
+                {'issue_id': id, 'old_status': old_status, 'new_status': new_status},
+            )
+    except Exception:
+        pass
+    return rows[0]
+
+
+async def _bulk_update_chunk(ids: List[str], changes: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]], Optional[str]]:
+    """Applies `changes` to one chunk of issues with filtered PATCHes.
+
+    A status change also sets `resolved_at`, but only on the issues whose
+    status actually changes: one PATCH filtered on the old status covers
+    those, and a second one applies `changes` to the rest of the chunk.
+
+    Returns:
+        The updated rows by ID, the notifications to insert, and an error
+        message if a PATCH itself failed.
+    """
+    id_list = '(' + ','.join(f'"{i}"' for i in ids) + ')'
+    before = await supabase_request('GET', 'issues', filters={'id.in': id_list}, select='id,status,user_id')
+    old = {str(row.get('id')): row for row in (before.get('data') or [])} if before.get('status_code') == 200 else {}
+    rows: Dict[str, Dict[str, Any]] = {}
+    error = None
+    rest = ids
+    if 'status' in changes:
+        if changes['status'] == 'resolved':
+            transition = {'status.neq': 'resolved'}
+            payload = dict(changes, resolved_at=changes['updated_at'])
+        else:
+            transition = {'status.eq': 'resolved'}
+            payload = dict(changes, resolved_at=None)
+        r = await supabase_request('PATCH', 'issues', payload=payload, filters={'id.in': id_list, **transition}, headers={'Prefer': 'return=representation'})
+        if r.get('status_code') != 200:
+            return {}, [], str(r.get('data'))
+        rows.update((str(row.get('id')), row) for row in (r.get('data') or []))
+        rest = [i for i in ids if i not in rows]
+    if rest:
+        rest_list = '(' + ','.join(f'"{i}"' for i in rest) + ')'
+        r = await supabase_request('PATCH', 'issues', payload=changes, filters={'id.in': rest_list}, headers={'Prefer': 'return=representation'})
+        if r.get('status_code') == 200:
+            rows.update((str(row.get('id')), row) for row in (r.get('data') or []))
+        else:
+            error = str(r.get('data'))
+    notes = []
+    for issue_id, row in rows.items():
+        prev = old.get(issue_id) or {}
+        old_status, new_status = prev.get('status'), row.get('status')
+        if prev.get('user_id') and old_status and new_status != old_status:
+            notes.append({
+                'user_id': prev.get('user_id'),
+                'title': 'Issue status updated',
+                'body': f'Your issue status changed from {old_status} to {new_status}',
+                'metadata': {'issue_id': issue_id, 'old_status': old_status, 'new_status': new_status},
+            })
+    return rows, notes, error
+
+
+async def bulk_update_issues(ids: List[str], changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Applies the same change to many issues in as few round trips as possible.
+
+    IDs are split into chunks of `ISSUE_BULK_CHUNK_SIZE` to keep URLs short;
+    each chunk costs one GET (old statuses, for notifications) and one PATCH
+    filtered with `id=in.(...)`, or two for a status change (see
+    `_bulk_update_chunk`). Status-change notifications for all chunks
+    are inserted with a single batch POST, falling back to the job queue if
+    that insert fails.
+
+    IDs that are not UUIDs are reported as failed without being sent, since
+    one of them would make PostgREST reject its whole chunk.
+
+    Args:
+        ids: The issue IDs to update. Duplicates are ignored.
+        changes: The columns to set, e.g. `{'status': 'resolved'}`.
+
+    Returns:
+        One result per ID with `id`, `ok`, the resulting `status` and an
+        `error` for issues that were not updated.
+    """
+    unique = list(dict.fromkeys(str(i) for i in ids))
+    # the canonical (lower-case) form PostgREST returns, or None if not a UUID
+    canonical: Dict[str, Optional[str]] = {}
+    for issue_id in unique:
         try:
-            new_status = payload.get('status')
-            old_status = existing.get('status') if existing else None
-            if new_status and old_status and new_status != old_status:
-                note = {
-                    'user_id': existing.get('user_id'),
-                    'issue_id': id,
-                    'message': f'Your issue status changed from {old_status} to {new_status}'
-                }
-                await supabase_request('POST', 'notifications', payload={'entries': [note]})
-        except Exception:
-            pass
-        # return the updated row
-        updated = await get_issue(id)
-        return updated
-    return None
+            canonical[issue_id] = str(uuid.UUID(issue_id))
+        except ValueError:
+            canonical[issue_id] = None
+    now = datetime.now(timezone.utc).isoformat()
+    changes = dict(changes, updated_at=now)
+    size = max(1, settings.ISSUE_BULK_CHUNK_SIZE)
+    keys = list(dict.fromkeys(key for key in canonical.values() if key))
+    chunks = [keys[i:i + size] for i in range(0, len(keys), size)]
+    outcomes = await asyncio.gather(*(_bulk_update_chunk(chunk, changes) for chunk in chunks))
+
+    by_key: Dict[str, Dict[str, Any]] = {}
+    notes: List[Dict[str, Any]] = []
+    for chunk, (rows, chunk_notes, error) in zip(chunks, outcomes):
+        notes.extend(chunk_notes)
+        for key in chunk:
+            row = rows.get(key)
+            if row is not None:
+                by_key[key] = {'ok': True, 'status': row.get('status')}
+            else:
+                by_key[key] = {'ok': False, 'error': error or 'Not found'}
+    results = [
+        {'id': issue_id, **by_key[canonical[issue_id]]} if canonical[issue_id]
+        else {'id': issue_id, 'ok': False, 'error': 'Invalid issue id'}
+        for issue_id in unique
+    ]
+
+    if notes:
+        r = await supabase_request('POST', 'notifications', payload=notes)
+        if r.get('status_code') not in (200, 201, 204):
+            logger.warning('bulk notification insert failed, queueing %d notifications', len(notes))
+            for note in notes:
+                try:
+                    await issue_jobs.enqueue_notification(note['user_id'], note['title'], note['body'], note['metadata'])
+                except Exception:
+                    logger.exception('could not queue notification for issue %s', note['metadata'].get('issue_id'))
+    return results
 
 
 async def delete_issue(id: str, user) -> Dict[str, Any]:
     """Deletes an issue from the database.
 
     Before deletion, this function verifies that the user attempting to delete
-    the issue is the same user who created it. It also cleans up any
-
-    associated images from Cloudinary.
+    the issue is the same user who created it. Once the row is gone, the
+    associated Cloudinary images are handed to the background cleanup job.
 
     Args:
         id: The unique identifier of the issue to delete.
@@ -209,16 +476,15 @@ async def delete_issue(id: str, user) -> Dict[str, Any]:
         return {'ok': False, 'status_code': 404, 'error': 'Not found'}
     if str(issue.get('user_id')) != str(user.get('id')):
         return {'ok': False, 'status_code': 403, 'error': 'Forbidden'}
-    # handle multiple images cleanup
-    imgs = issue.get('images') or []
-    for im in imgs:
-        if im.get('public_id'):
-            try:
-                await delete_image(im.get('public_id'))
-            except Exception:
-                pass
     filters = {'id.eq': id}
     r = await supabase_request('DELETE', 'issues', filters=filters)
-    if r.get('status_code') in (200, 204):
-        return {'ok': True}
-    return {'ok': False, 'error': r.get('data')}
+    if r.get('status_code') not in (200, 204):
+        return {'ok': False, 'error': r.get('data')}
+    issue_snapshot.forget(id)
+    # images deduplicated into other issues are only released, not deleted;
+    # the rest is removed from Cloudinary by the cleanup job
+    try:
+        await issue_jobs.enqueue_image_cleanup(await image_index.release(issue.get('images') or []))
+    except Exception:
+        logger.exception('image cleanup for deleted issue %s failed', id)
+    return {'ok': True}
@@ -0,0 +1,446 @@
+"""In-process columnar snapshot of the issues table for the admin analytics.
+
+With `ANALYTICS_SOURCE=snapshot`, the analytics endpoints (see
+`services/analytics.py` and `services/hotspots.py`) run against NumPy arrays
+held in this process instead of querying aggregate tables:
+
+-   creation, update and resolution times as float64 epoch seconds (NaN when
+    missing),
+-   status, department and category as int32 codes into per-column
+    vocabularies (code 0 is "none"),
+-   latitude and longitude parsed from `location` (NaN when missing).
+
+Every query is a handful of vectorized mask and reduction operations over
+these columns. Issue IDs are kept in a list with an ID-to-row index so rows
+can be updated in place.
+
+The snapshot is built on first use by paging through all issues, then kept
+fresh by delta refreshes: rows whose `changed_at` is at or after the
+watermark (the highest `changed_at` seen, minus
+`ISSUE_SNAPSHOT_OVERLAP_SECONDS` for transactions that committed late) are
+fetched and upserted. A trigger in `supabase/schema.sql` maintains
+`changed_at` for every writer; unlike `updated_at` it also moves when the
+routing job assigns a department, and neither moves for moderation
+verdicts. A delta refresh runs when the snapshot is older than
+`ISSUE_SNAPSHOT_MAX_AGE_SECONDS` or this process wrote to `issues`.
+Deletions made elsewhere are not visible to deltas, so the snapshot is
+rebuilt from scratch every `ISSUE_SNAPSHOT_FULL_REFRESH_SECONDS`. That
+rebuild runs in a background task while requests keep reading the current
+snapshot, which is swapped for the new one when it is complete.
+
+Size and refresh cost are reported by `snapshot_stats` under `/metrics`.
+"""
+import asyncio
+import logging
+import math
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from ..config import settings
+from ..db.supabase_client import add_write_listener, supabase_request
+from ..utils.pagination import keyset_filter
+from .hotspots import parse_location
+
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = 'id,created_at,changed_at,resolved_at,status,department_id,category,location'
+_ORDER = 'changed_at.asc,id.asc'
+_FLOAT_COLUMNS = ('created', 'changed', 'resolved', 'lat', 'lon')
+_CODE_COLUMNS = ('status', 'department', 'category')
+_ROW_KEYS = {'status': 'status', 'department': 'department_id', 'category': 'category'}
+
+
+def _epoch(value: Any) -> float:
+    """Converts a PostgREST timestamp to epoch seconds (NaN if missing or invalid)."""
+    if not value:
+        return math.nan
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return math.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Vocabulary:
+    """Maps the distinct values of a text column to small integer codes."""
+
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[Optional[str]] = [None]
+
+    def code(self, value: Any) -> int:
+        if value is None or value == '':
+            return 0
+        value = str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> int:
+        """Returns the code of a value, or -1 if it never occurred."""
+        return self.codes.get(str(value), -1)
+
+
+class IssueSnapshot:
+    """Columnar arrays of all issues, grown by doubling like a list."""
+
+    def __init__(self, capacity: int = 1024):
+        import numpy as np
+
+        self.size = 0
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.id_bytes = 0
+        self.columns = {name: np.full(capacity, np.nan) for name in _FLOAT_COLUMNS}
+        self.columns.update({name: np.zeros(capacity, dtype=np.int32) for name in _CODE_COLUMNS})
+        self.vocab = {name: _Vocabulary() for name in _CODE_COLUMNS}
+        self.max_changed = math.nan
+
+    @property
+    def capacity(self) -> int:
+        return len(self.columns['created'])
+
+    def _reserve(self, size: int) -> None:
+        import numpy as np
+
+        capacity = self.capacity
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.full(capacity, np.nan) if column.dtype.kind == 'f' else np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def upsert(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """Inserts new rows and overwrites known ones; returns the number of new rows."""
+        import numpy as np
+
+        if not rows:
+            return 0
+        positions = []
+        added = 0
+        for row in rows:
+            issue_id = str(row.get('id'))
+            pos = self.index.get(issue_id)
+            if pos is None:
+                pos = self.index[issue_id] = self.size + added
+                self.ids.append(issue_id)
+                self.id_bytes += sys.getsizeof(issue_id)
+                added += 1
+            positions.append(pos)
+        self._reserve(self.size + added)
+        self.size += added
+        at = np.asarray(positions, dtype=np.int64)
+        points = [parse_location(row.get('location')) for row in rows]
+        values = {
+            'created': [_epoch(row.get('created_at')) for row in rows],
+            'changed': [_epoch(row.get('changed_at')) for row in rows],
+            'resolved': [_epoch(row.get('resolved_at')) for row in rows],
+            'lat': [p[0] if p else math.nan for p in points],
+            'lon': [p[1] if p else math.nan for p in points],
+        }
+        for name in _CODE_COLUMNS:
+            vocab, key = self.vocab[name], _ROW_KEYS[name]
+            values[name] = [vocab.code(row.get(key)) for row in rows]
+        for name, column_values in values.items():
+            self.columns[name][at] = column_values
+        changed = np.asarray(values['changed'])
+        if not np.isnan(changed).all():
+            self.max_changed = float(np.nanmax(np.append(changed, self.max_changed)))
+        return added
+
+    def remove(self, issue_id: str) -> bool:
+        """Drops a row by moving the last row into its place."""
+        pos = self.index.pop(str(issue_id), None)
+        if pos is None:
+            return False
+        last = self.size - 1
+        if pos != last:
+            moved = self.ids[last]
+            self.ids[pos] = moved
+            self.index[moved] = pos
+            for column in self.columns.values():
+                column[pos] = column[last]
+        self.id_bytes -= sys.getsizeof(self.ids.pop())
+        self.size = last
+        return True
+
+    def column(self, name: str) -> 'np.ndarray':
+        """Returns a view of the filled part of a column."""
+        return self.columns[name][:self.size]
+
+    def memory_bytes(self) -> int:
+        """Approximates the memory held: arrays, IDs and the ID index."""
+        arrays = sum(column.nbytes for column in self.columns.values())
+        return arrays + self.id_bytes + sys.getsizeof(self.ids) + sys.getsizeof(self.index)
+
+
+_state: Dict[str, Any] = {
+    'snapshot': None,
+    'built_at': 0.0,
+    'refreshed_at': 0.0,
+    'dirty': False,
+    # the background full rebuild, and the IDs deleted while it runs
+    'rebuild': None,
+    'forgotten': set(),
+}
+_stats = {
+    'full_builds': 0,
+    'delta_refreshes': 0,
+    'rows_fetched': 0,
+    'last_full_build_ms': None,
+    'last_refresh_ms': None,
+    'last_refresh_rows': 0,
+}
+_lock = asyncio.Lock()
+
+
+def _on_write(table: str) -> None:
+    if table == 'issues':
+        _state['dirty'] = True
+
+
+add_write_listener(_on_write)
+
+
+def forget(issue_id: str) -> None:
+    """Removes a deleted issue from the snapshot (deletions are invisible to deltas)."""
+    snapshot = _state['snapshot']
+    if snapshot is not None:
+        snapshot.remove(issue_id)
+    if _state['rebuild'] is not None:
+        _state['forgotten'].add(str(issue_id))
+
+
+async def _pages(since: Optional[str]):
+    """Yields pages of issues in `(changed_at, id)` order, optionally from `since` on."""
+    last = None
+    page_size = settings.ISSUE_SNAPSHOT_PAGE_SIZE
+    while True:
+        filters: Dict[str, Any] = {}
+        if since:
+            filters['changed_at.gte'] = since
+        if last is not None:
+            filters.update(keyset_filter(last['changed_at'], last['id'], descending=False, column='changed_at'))
+        r = await supabase_request('GET', 'issues', filters=filters, select=_COLUMNS, order=_ORDER, limit=page_size)
+        if r.get('status_code') != 200:
+            raise RuntimeError(f"fetching issues for the analytics snapshot failed: {r.get('data')}")
+        rows = r.get('data') or []
+        if rows:
+            yield rows
+        if len(rows) < page_size or rows[-1].get('changed_at') is None:
+            return
+        last = rows[-1]
+
+
+async def _build() -> IssueSnapshot:
+    started = time.perf_counter()
+    snapshot = IssueSnapshot()
+    fetched = 0
+    async for rows in _pages(None):
+        # nobody reads the new snapshot yet, so it can be filled off the event loop
+        await asyncio.to_thread(snapshot.upsert, rows)
+        fetched += len(rows)
+    _stats['full_builds'] += 1
+    _stats['rows_fetched'] += fetched
+    _stats['last_full_build_ms'] = round((time.perf_counter() - started) * 1000.0, 1)
+    logger.info('built issue snapshot: %d rows in %.0f ms', snapshot.size, _stats['last_full_build_ms'])
+    return snapshot
+
+
+async def _rebuild() -> None:
+    """Builds a new snapshot in the background and swaps it in."""
+    snapshot = await _build()
+    async with _lock:
+        for issue_id in _state['forgotten']:
+            snapshot.remove(issue_id)
+        _state['snapshot'] = snapshot
+        _state['built_at'] = time.monotonic()
+        # rows changed after their page was read are picked up by the next delta
+        _state['dirty'] = True
+
+
+def _rebuild_done(task: asyncio.Task) -> None:
+    _state['rebuild'] = None
+    _state['forgotten'] = set()
+    if not task.cancelled() and task.exception() is not None:
+        # keep serving the old snapshot; try again after another full interval
+        _state['built_at'] = time.monotonic()
+        logger.error('rebuilding the issue snapshot failed', exc_info=task.exception())
+
+
+def _start_rebuild() -> None:
+    if _state['rebuild'] is None:
+        _state['forgotten'] = set()
+        task = asyncio.ensure_future(_rebuild())
+        _state['rebuild'] = task
+        task.add_done_callback(_rebuild_done)
+
+
+async def _delta_refresh() -> None:
+    started = time.perf_counter()
+    snapshot = _state['snapshot']
+    since = None
+    if not math.isnan(snapshot.max_changed):
+        since = datetime.fromtimestamp(snapshot.max_changed - settings.ISSUE_SNAPSHOT_OVERLAP_SECONDS, tz=timezone.utc).isoformat()
+    fetched = 0
+    async for rows in _pages(since):
+        snapshot.upsert(rows)
+        fetched += len(rows)
+    _state['refreshed_at'] = time.monotonic()
+    _stats['delta_refreshes'] += 1
+    _stats['rows_fetched'] += fetched
+    _stats['last_refresh_rows'] = fetched
+    _stats['last_refresh_ms'] = round((time.perf_counter() - started) * 1000.0, 1)
+
+
+async def get_snapshot() -> IssueSnapshot:
+    """Returns the snapshot, building or refreshing it first if it is stale.
+
+    Only the first build is awaited; the periodic full rebuild runs in the
+    background (see `_rebuild`) while deltas keep the current one fresh.
+    """
+    def fresh() -> bool:
+        return (
+            _state['snapshot'] is not None
+            and not _state['dirty']
+            and time.monotonic() - _state['refreshed_at'] < settings.ISSUE_SNAPSHOT_MAX_AGE_SECONDS
+        )
+
+    if _state['snapshot'] is not None and time.monotonic() - _state['built_at'] >= settings.ISSUE_SNAPSHOT_FULL_REFRESH_SECONDS:
+        _start_rebuild()
+    if fresh():
+        return _state['snapshot']
+    async with _lock:
+        if not fresh():
+            _state['dirty'] = False
+            if _state['snapshot'] is None:
+                _state['snapshot'] = await _build()
+                _state['built_at'] = _state['refreshed_at'] = time.monotonic()
+            else:
+                await _delta_refresh()
+    return _state['snapshot']
+
+
+def _window_start(days: int) -> float:
+    """Start of the analytics window: today (UTC) minus `days` whole days."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (today - timedelta(days=max(days, 0))).timestamp()
+
+
+def _match(snapshot: IssueSnapshot, mask: 'np.ndarray', column: str, value: Optional[str]) -> 'np.ndarray':
+    if not value:
+        return mask
+    code = snapshot.vocab[column].lookup(value)
+    return mask & (snapshot.column(column) == code)
+
+
+async def issues_by_day(days: int, department_id: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Snapshot implementation of `analytics.issues_by_day`."""
+    import numpy as np
+
+    snapshot = await get_snapshot()
+    created = snapshot.column('created')
+    mask = created >= _window_start(days)
+    mask = _match(snapshot, mask, 'department', department_id)
+    mask = _match(snapshot, mask, 'status', status)
+    day_numbers, counts = np.unique(np.floor(created[mask] / 86400.0).astype(np.int64), return_counts=True)
+    return [
+        {'date': datetime.fromtimestamp(int(d) * 86400, tz=timezone.utc).date().isoformat(), 'count': int(n)}
+        for d, n in zip(day_numbers, counts)
+    ]
+
+
+def _summary(seconds: 'np.ndarray') -> Dict[str, Any]:
+    import numpy as np
+
+    if not len(seconds):
+        return {'average_hours': None, 'count': 0, 'p50_hours': None, 'p90_hours': None, 'p99_hours': None}
+    p50, p90, p99 = np.quantile(seconds, [0.5, 0.9, 0.99], method='lower') / 3600.0
+    return {
+        'average_hours': float(seconds.mean()) / 3600.0,
+        'count': int(len(seconds)),
+        'p50_hours': float(p50),
+        'p90_hours': float(p90),
+        'p99_hours': float(p99),
+    }
+
+
+def _resolution_mask(snapshot: IssueSnapshot, days: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    import numpy as np
+
+    created, resolved = snapshot.column('created'), snapshot.column('resolved')
+    mask = (created >= _window_start(days)) & ~np.isnan(resolved)
+    return mask, np.maximum(resolved - created, 0.0)
+
+
+async def response_time_summary(days: int, department_id: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+    """Snapshot implementation of `analytics.response_time_summary` (exact percentiles)."""
+    snapshot = await get_snapshot()
+    mask, seconds = _resolution_mask(snapshot, days)
+    mask = _match(snapshot, mask, 'department', department_id)
+    mask = _match(snapshot, mask, 'category', category)
+    return _summary(seconds[mask])
+
+
+async def response_time_breakdown(days: int, group_by: str) -> List[Dict[str, Any]]:
+    """Snapshot implementation of `analytics.response_time_breakdown`."""
+    import numpy as np
+
+    if group_by not in ('department', 'category'):
+        raise ValueError(f'cannot group response times by {group_by!r}')
+    snapshot = await get_snapshot()
+    mask, seconds = _resolution_mask(snapshot, days)
+    codes = snapshot.column(group_by)[mask]
+    seconds = seconds[mask]
+    order = np.argsort(codes, kind='stable')
+    codes, seconds = codes[order], seconds[order]
+    groups, starts = np.unique(codes, return_index=True)
+    ends = list(starts[1:]) + [len(codes)]
+    items = []
+    for code, start, end in zip(groups, starts, ends):
+        item = _summary(seconds[start:end])
+        item['key'] = snapshot.vocab[group_by].values[int(code)]
+        items.append(item)
+    items.sort(key=lambda item: item['count'], reverse=True)
+    return items
+
+
+async def locations(days: int) -> Tuple[List[str], 'np.ndarray', 'np.ndarray']:
+    """Returns the IDs and coordinates of issues created in the last `days` days (for hotspots)."""
+    import numpy as np
+
+    snapshot = await get_snapshot()
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).timestamp()
+    lat = snapshot.column('lat')
+    rows = np.flatnonzero((snapshot.column('created') >= since) & ~np.isnan(lat))
+    ids = snapshot.ids
+    return [ids[i] for i in rows], lat[rows], snapshot.column('lon')[rows]
+
+
+def snapshot_stats() -> Dict[str, Any]:
+    """Returns the snapshot size, memory footprint, age and refresh costs."""
+    snapshot = _state['snapshot']
+    return dict(
+        _stats,
+        enabled=settings.ANALYTICS_SOURCE == 'snapshot',
+        rebuilding=_state['rebuild'] is not None,
+        rows=snapshot.size if snapshot else 0,
+        capacity=snapshot.capacity if snapshot else 0,
+        memory_bytes=snapshot.memory_bytes() if snapshot else 0,
+        age_seconds=round(time.monotonic() - _state['refreshed_at'], 1) if snapshot else None,
+        watermark=(
+            datetime.fromtimestamp(snapshot.max_changed, tz=timezone.utc).isoformat()
+            if snapshot and not math.isnan(snapshot.max_changed) else None
+        ),
+    )
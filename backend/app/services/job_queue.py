@@ -0,0 +1,240 @@
+"""Durable background job queue backed by a local SQLite file.
+
+Work that does not have to finish before a response is sent (department
+routing, notifications, Cloudinary cleanup) is enqueued here and processed by
+a worker. The worker runs inside the API process (`JOB_WORKER_IN_PROCESS`,
+started from the lifespan hook) or standalone via `python -m app.cli.worker`.
+Both read the same `JOB_QUEUE_PATH` file, so several processes on a host can
+share the queue.
+
+Jobs are claimed with a lease (`JOB_LEASE_SECONDS`). A job whose worker died
+is picked up again once the lease expires. Failed jobs are retried with
+exponential backoff and jitter until `max_attempts` is reached, then marked
+`failed` and kept for inspection.
+
+Handlers are registered per job kind with the `handler` decorator and receive
+the JSON payload. A handler signals failure by raising.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from ..config import settings
+from ..db.local_store import LocalStore, transaction
+
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    '''create table if not exists jobs (
+        id integer primary key autoincrement,
+        kind text not null,
+        payload text not null,
+        status text not null default 'pending',
+        attempts integer not null default 0,
+        max_attempts integer not null,
+        run_at real not null,
+        locked_by text,
+        locked_until real,
+        last_error text,
+        created_at real not null,
+        updated_at real not null
+    )''',
+    'create index if not exists jobs_status_run_at on jobs (status, run_at)',
+)
+
+_store = LocalStore(settings.JOB_QUEUE_PATH, _SCHEMA)
+_handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {}
+_stats = {'enqueued': 0, 'succeeded': 0, 'retried': 0, 'failed': 0}
+_wakeup: Optional[asyncio.Event] = None
+
+
+def handler(kind: str):
+    """Registers an async function as the handler for a job kind."""
+    def decorator(fn: Callable[[Dict[str, Any]], Awaitable[Any]]):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def _insert(conn, kind: str, payload: Dict[str, Any], run_at: float, max_attempts: int) -> int:
+    now = time.time()
+    cur = conn.execute(
+        'insert into jobs (kind, payload, status, attempts, max_attempts, run_at, created_at, updated_at) values (?, ?, ?, 0, ?, ?, ?, ?)',
+        (kind, json.dumps(payload), 'pending', max_attempts, run_at, now, now),
+    )
+    return cur.lastrowid
+
+
+async def enqueue(kind: str, payload: Dict[str, Any], delay: float = 0.0, max_attempts: Optional[int] = None) -> int:
+    """Adds a job to the queue.
+
+    Args:
+        kind: The registered job kind, e.g. `'route_issue'`.
+        payload: JSON-serializable job arguments.
+        delay: Seconds to wait before the job becomes runnable.
+        max_attempts: Retry budget; defaults to `JOB_MAX_ATTEMPTS`.
+
+    Returns:
+        The job ID, usable with `get_job`.
+    """
+    attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+    job_id = await _store.run(lambda conn: _insert(conn, kind, payload, time.time() + delay, attempts))
+    _stats['enqueued'] += 1
+    if _wakeup is not None and delay <= 0:
+        _wakeup.set()
+    return job_id
+
+
+def _claim(conn, worker_id: str) -> Optional[Dict[str, Any]]:
+    def _do(c):
+        now = time.time()
+        row = c.execute(
+            '''select * from jobs
+               where (status = 'pending' and run_at <= ?)
+                  or (status = 'running' and locked_until < ?)
+               order by run_at limit 1''',
+            (now, now),
+        ).fetchone()
+        if row is None:
+            return None
+        c.execute(
+            "update jobs set status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?, updated_at = ? where id = ?",
+            (worker_id, now + settings.JOB_LEASE_SECONDS, now, row['id']),
+        )
+        job = dict(row)
+        job['attempts'] += 1
+        return job
+    return transaction(conn, _do)
+
+
+def _backoff(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped at `JOB_BACKOFF_MAX_SECONDS`."""
+    ceiling = min(settings.JOB_BACKOFF_MAX_SECONDS, settings.JOB_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return random.uniform(ceiling / 2.0, ceiling)
+
+
+def _finish(conn, job: Dict[str, Any], error: Optional[str]) -> str:
+    now = time.time()
+    if error is None:
+        status, run_at = 'done', job['run_at']
+    elif job['attempts'] >= job['max_attempts']:
+        status, run_at = 'failed', job['run_at']
+    else:
+        status, run_at = 'pending', now + _backoff(job['attempts'])
+    conn.execute(
+        'update jobs set status = ?, run_at = ?, locked_by = null, locked_until = null, last_error = ?, updated_at = ? where id = ?',
+        (status, run_at, error, now, job['id']),
+    )
+    return status
+
+
+async def run_once(worker_id: str) -> bool:
+    """Claims and runs a single runnable job.
+
+    Returns:
+        True if a job was processed, False if the queue had nothing runnable.
+    """
+    job = await _store.run(lambda conn: _claim(conn, worker_id))
+    if job is None:
+        return False
+    fn = _handlers.get(job['kind'])
+    error = None
+    try:
+        if fn is None:
+            raise LookupError(f"no handler registered for job kind {job['kind']!r}")
+        await fn(json.loads(job['payload']))
+    except Exception as exc:
+        error = f'{type(exc).__name__}: {exc}'
+    status = await _store.run(lambda conn: _finish(conn, job, error))
+    if status == 'done':
+        _stats['succeeded'] += 1
+    elif status == 'failed':
+        _stats['failed'] += 1
+        logger.error('job %s (%s) failed permanently after %d attempts: %s', job['id'], job['kind'], job['attempts'], error)
+    else:
+        _stats['retried'] += 1
+        logger.warning('job %s (%s) attempt %d failed, will retry: %s', job['id'], job['kind'], job['attempts'], error)
+    return True
+
+
+def _purge(conn) -> int:
+    cutoff = time.time() - settings.JOB_RETENTION_SECONDS
+    return conn.execute("delete from jobs where status = 'done' and updated_at < ?", (cutoff,)).rowcount
+
+
+async def run_worker(stop: asyncio.Event, concurrency: Optional[int] = None) -> None:
+    """Processes jobs until `stop` is set.
+
+    Args:
+        stop: Event that ends the worker loops when set.
+        concurrency: Number of jobs processed in parallel; defaults to
+            `JOB_WORKER_CONCURRENCY`.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    worker_prefix = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+    async def _loop(n: int):
+        worker_id = f'{worker_prefix}-{n}'
+        while not stop.is_set():
+            try:
+                if await run_once(worker_id):
+                    continue
+            except Exception:
+                logger.exception('job worker %s crashed while polling', worker_id)
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _janitor():
+        while not stop.is_set():
+            try:
+                await _store.run(_purge)
+            except Exception:
+                logger.exception('job queue purge failed')
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=600)
+            except asyncio.TimeoutError:
+                pass
+
+    loops = [asyncio.ensure_future(_loop(n)) for n in range(max(1, concurrency or settings.JOB_WORKER_CONCURRENCY))]
+    loops.append(asyncio.ensure_future(_janitor()))
+    await stop.wait()
+    _wakeup.set()
+    for task in loops:
+        task.cancel()
+    await asyncio.gather(*loops, return_exceptions=True)
+
+
+def _get(conn, job_id: int) -> Optional[Dict[str, Any]]:
+    row = conn.execute('select * from jobs where id = ?', (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+
+async def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """Returns a job's status, attempts, last error and payload, or None."""
+    return await _store.run(lambda conn: _get(conn, job_id))
+
+
+def _depth(conn) -> Dict[str, Any]:
+    counts = {row['status']: row['n'] for row in conn.execute('select status, count(*) as n from jobs group by status')}
+    oldest = conn.execute("select min(created_at) as t from jobs where status = 'pending'").fetchone()['t']
+    return {'counts': counts, 'oldest_pending_age_seconds': round(time.time() - oldest, 1) if oldest else None}
+
+
+async def queue_stats() -> Dict[str, Any]:
+    """Returns queue depth by status plus this process's job counters."""
+    depth = await _store.run(_depth)
+    return dict(depth, processed=dict(_stats), handlers=sorted(_handlers))
+
@@ -0,0 +1,134 @@
+"""Read-through cache for small, rarely changing reference tables.
+
+Tables such as `departments` and `faq` are read on hot paths (issue creation,
+FAQ answering) but change maybe once a week. This module keeps their rows in
+process memory:
+
+-   Entries are fresh for `REFERENCE_CACHE_TTL_SECONDS`. After that, and for up
+    to `REFERENCE_CACHE_STALE_SECONDS` more, the stale rows are served
+    immediately while a background task revalidates them.
+-   At most `REFERENCE_CACHE_MAX_ENTRIES` tables are kept (LRU eviction).
+-   Writes made by this backend through `supabase_request` invalidate the
+    table at once. Writes from elsewhere (other workers, the SQL editor) are
+    picked up when the TTL runs out.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from ..config import settings
+from ..db.supabase_client import supabase_request, add_write_listener
+from ..utils.cache import LRUCache
+
+
+REFERENCE_TABLES = ('departments', 'faq')
+
+
+class _Entry:
+    """Cached rows of one table plus bookkeeping for revalidation."""
+
+    __slots__ = ('rows', 'fetched_at', 'version')
+
+    def __init__(self, rows: List[Dict[str, Any]], version: int):
+        self.rows = rows
+        self.fetched_at = time.monotonic()
+        self.version = version
+
+
+_entries = LRUCache(maxsize=settings.REFERENCE_CACHE_MAX_ENTRIES)
+_generation: Dict[str, int] = {}
+_versions: Dict[str, int] = {}
+_refreshing: Dict[str, asyncio.Task] = {}
+_stats = {'hits': 0, 'misses': 0, 'stale_served': 0, 'refreshes': 0, 'invalidations': 0, 'errors': 0}
+
+
+async def _load(table: str) -> Optional[_Entry]:
+    """Fetches a table from Supabase and stores it, unless invalidated meanwhile."""
+    generation = _generation.get(table, 0)
+    r = await supabase_request('GET', table)
+    rows = r.get('data')
+    if r.get('status_code') != 200 or not isinstance(rows, list):
+        _stats['errors'] += 1
+        return None
+    if _generation.get(table, 0) != generation:
+        # a write invalidated the table while we were reading; don't cache old rows
+        return _Entry(rows, _versions.get(table, 0))
+    _versions[table] = _versions.get(table, 0) + 1
+    entry = _Entry(rows, _versions[table])
+    _entries.set(table, entry)
+    return entry
+
+
+def _schedule_refresh(table: str) -> None:
+    """Starts a background revalidation for `table` unless one is already running."""
+    if table in _refreshing:
+        return
+
+    async def _refresh():
+        try:
+            _stats['refreshes'] += 1
+            await _load(table)
+        except Exception:
+            _stats['errors'] += 1
+        finally:
+            _refreshing.pop(table, None)
+
+    _refreshing[table] = asyncio.ensure_future(_refresh())
+
+
+async def get_entry(table: str) -> Optional[_Entry]:
+    """Returns the cached entry for a reference table, loading it on a miss.
+
+    The entry's `version` increases every time new rows are loaded, which lets
+    callers keep derived structures (such as search indexes) in sync cheaply.
+    """
+    entry = _entries.get(table)
+    if entry is not None:
+        age = time.monotonic() - entry.fetched_at
+        if age < settings.REFERENCE_CACHE_TTL_SECONDS:
+            _stats['hits'] += 1
+            return entry
+        if age < settings.REFERENCE_CACHE_TTL_SECONDS + settings.REFERENCE_CACHE_STALE_SECONDS:
+            _stats['stale_served'] += 1
+            _schedule_refresh(table)
+            return entry
+    _stats['misses'] += 1
+    try:
+        loaded = await _load(table)
+    except Exception:
+        _stats['errors'] += 1
+        loaded = None
+    # fall back to whatever we had if the upstream is unavailable
+    return loaded or entry
+
+
+async def get_reference_rows(table: str) -> List[Dict[str, Any]]:
+    """Returns all rows of a reference table, served from cache when possible.
+
+    Args:
+        table: The table name, e.g. `'departments'` or `'faq'`.
+
+    Returns:
+        A list of row dictionaries (empty if the table could not be loaded).
+    """
+    entry = await get_entry(table)
+    return entry.rows if entry else []
+
+
+def invalidate(table: str) -> None:
+    """Drops the cached rows of `table` so the next read goes upstream."""
+    _generation[table] = _generation.get(table, 0) + 1
+    _entries.delete(table)
+    _stats['invalidations'] += 1
+
+
+def _on_write(table: str) -> None:
+    if table in REFERENCE_TABLES:
+        invalidate(table)
+
+
+def reference_cache_stats() -> Dict[str, Any]:
+    """Returns hit/miss/staleness counters and the cached tables."""
+    return dict(_stats, tables=len(_entries), refreshing=len(_refreshing))
+
+
+add_write_listener(_on_write)
@@ -1,5 +1,38 @@
-from typing import Optional, Dict
+"""Keyword-based department routing.
 
+Routing rules map keywords (or multi-word phrases) to a department with a
+weight. They come from three sources, merged in this order:
+
+1.  `KEYWORD_MAP`, the built-in defaults (weight 1, prefix match so that
+    "potholes" still matches "pothole").
+2.  An optional JSON rules file (`ROUTING_RULES_PATH`) of the form
+    `{"Roads": {"pothole*": 2.0, "road sign": 1.0}, ...}`.
+3.  The `routing_keywords` column of the `departments` table, in the same
+    `{"keyword": weight}` form (a plain list of keywords means weight 1).
+
+All keywords are compiled into one Aho–Corasick automaton, so matching is a
+single pass over the text regardless of the number of keywords. Matches must
+start and end on word boundaries; a trailing `*` on a keyword drops the end
+boundary. Every distinct keyword found adds its weight to its department and
+the departments are ranked by score, with confidence being the share of the
+total score.
+
+Rules are hot-reloaded: `refresh_rules` rebuilds the automaton when the
+cached `departments` rows change (see `reference_cache`) or the rules file's
+modification time changes, checked at most every `ROUTING_RELOAD_INTERVAL`
+seconds.
+"""
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ..config import settings
+from .reference_cache import get_entry
+
+
+logger = logging.getLogger(__name__)
 
 # Simple keyword-based routing engine
 KEYWORD_MAP = {
@@ -11,6 +44,225 @@ KEYWORD_MAP = {
     'overflow': 'Sanitation',
 }
 
+# (keyword, department, weight, prefix)
+Rule = Tuple[str, str, float, bool]
+
+
+class _Automaton:
+    """Aho–Corasick automaton over lower-cased keywords."""
+
+    __slots__ = ('goto', 'fail', 'out')
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Rule]] = [[]]
+        for rule in rules:
+            state = 0
+            for ch in rule[0]:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append(rule)
+        # breadth-first pass to compute failure links and merged outputs
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def matches(self, text: str):
+        """Yields `(rule, start, end)` for every keyword occurrence in `text`."""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for rule in out[state]:
+                yield rule, i + 1 - len(rule[0]), i + 1
+
+
+_state: Dict[str, Any] = {
+    'automaton': None,
+    'rules': 0,
+    'db_version': None,
+    'file_mtime': None,
+    'checked_at': 0.0,
+    'built_at': None,
+    'build_ms': None,
+}
+
+
+def _parse_keyword(keyword: str) -> Tuple[str, bool]:
+    """Normalizes a keyword and reports whether it is a prefix (`foo*`) rule."""
+    kw = ' '.join(str(keyword).lower().split())
+    if kw.endswith('*'):
+        return kw[:-1].rstrip(), True
+    return kw, False
+
+
+def _rules_from_mapping(department: str, keywords: Any) -> List[Rule]:
+    """Turns `{"kw": weight}` or `["kw", ...]` into rules for one department."""
+    if isinstance(keywords, str):
+        try:
+            keywords = json.loads(keywords)
+        except ValueError:
+            keywords = [k.strip() for k in keywords.split(',')]
+    if isinstance(keywords, list):
+        keywords = {k: 1.0 for k in keywords}
+    if not isinstance(keywords, dict):
+        return []
+    rules = []
+    for keyword, weight in keywords.items():
+        kw, prefix = _parse_keyword(keyword)
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            continue
+        if kw and weight > 0:
+            rules.append((kw, department, weight, prefix))
+    return rules
+
+
+def _default_rules() -> List[Rule]:
+    return [(kw, dept, 1.0, True) for kw, dept in KEYWORD_MAP.items()]
+
+
+def _file_rules(path: str) -> List[Rule]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning('could not read routing rules from %s: %s', path, exc)
+        return []
+    rules: List[Rule] = []
+    for department, keywords in (data.items() if isinstance(data, dict) else []):
+        rules.extend(_rules_from_mapping(department, keywords))
+    return rules
+
+
+def _db_rules(departments: List[Dict[str, Any]]) -> List[Rule]:
+    rules: List[Rule] = []
+    for row in departments:
+        if row.get('name') and row.get('routing_keywords'):
+            rules.extend(_rules_from_mapping(row['name'], row['routing_keywords']))
+    return rules
+
+
+def build_rules(departments: Optional[List[Dict[str, Any]]] = None, rules_path: Optional[str] = None) -> List[Rule]:
+    """Merges default, file and database rules; later sources override earlier ones.
+
+    Args:
+        departments: Rows of the `departments` table (optional).
+        rules_path: Path of a JSON rules file (optional).
+
+    Returns:
+        The deduplicated list of `(keyword, department, weight, prefix)` rules.
+    """
+    merged: Dict[Tuple[str, str, bool], Rule] = {}
+    for rule in _default_rules() + (_file_rules(rules_path) if rules_path else []) + _db_rules(departments or []):
+        merged[(rule[0], rule[1], rule[3])] = rule
+    return list(merged.values())
+
+
+def load_rules(rules: List[Rule]) -> None:
+    """Compiles `rules` and makes them the active rule set."""
+    started = time.perf_counter()
+    automaton = _Automaton(rules)
+    _state['automaton'] = automaton
+    _state['rules'] = len(rules)
+    _state['built_at'] = time.time()
+    _state['build_ms'] = round((time.perf_counter() - started) * 1000.0, 2)
+
+
+def _get_automaton() -> _Automaton:
+    if _state['automaton'] is None:
+        load_rules(build_rules(rules_path=settings.ROUTING_RULES_PATH))
+    return _state['automaton']
+
+
+async def refresh_rules(force: bool = False) -> bool:
+    """Rebuilds the matcher if the rules file or the `departments` rows changed.
+
+    Cheap to call on every routing job: the checks run at most every
+    `ROUTING_RELOAD_INTERVAL` seconds and the department rows come from the
+    reference cache.
+
+    Returns:
+        True if the rules were rebuilt.
+    """
+    now = time.monotonic()
+    if not force and _state['automaton'] is not None and now - _state['checked_at'] < settings.ROUTING_RELOAD_INTERVAL:
+        return False
+    _state['checked_at'] = now
+    entry = await get_entry('departments')
+    db_version = entry.version if entry else None
+    path = settings.ROUTING_RULES_PATH
+    try:
+        mtime = os.path.getmtime(path) if path else None
+    except OSError:
+        mtime = None
+    if not force and _state['automaton'] is not None and db_version == _state['db_version'] and mtime == _state['file_mtime']:
+        return False
+    load_rules(build_rules(entry.rows if entry else [], path))
+    _state['db_version'] = db_version
+    _state['file_mtime'] = mtime
+    logger.info('loaded %d routing rules in %.1f ms', _state['rules'], _state['build_ms'])
+    return True
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+def rank_departments(text: str) -> List[Dict[str, Any]]:
+    """Scores every department against `text` in one pass.
+
+    Args:
+        text: The input string to analyze (e.g., an issue title and description).
+
+    Returns:
+        Departments ordered by descending score, each as a dictionary with
+        `department`, `score`, `confidence` (share of the total score, 0-1)
+        and the matched `keywords`. Empty if nothing matched.
+    """
+    if not text:
+        return []
+    t = ' '.join(text.lower().split())
+    n = len(t)
+    seen = set()
+    scores: Dict[str, float] = {}
+    keywords: Dict[str, List[str]] = {}
+    for rule, start, end in _get_automaton().matches(t):
+        kw, dept, weight, prefix = rule
+        if (kw, dept) in seen:
+            continue
+        if start > 0 and _is_word_char(t[start - 1]):
+            continue
+        if not prefix and end < n and _is_word_char(t[end]):
+            continue
+        seen.add((kw, dept))
+        scores[dept] = scores.get(dept, 0.0) + weight
+        keywords.setdefault(dept, []).append(kw)
+    total = sum(scores.values())
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+    return [
+        {'department': dept, 'score': score, 'confidence': round(score / total, 4), 'keywords': keywords[dept]}
+        for dept, score in ranked
+    ]
+
 
 def detect_department_from_text(text: str) -> Optional[str]:
     """Detects a likely department name from text based on keywords.
@@ -19,15 +271,21 @@ def detect_department_from_text(text: str) -> Optional[str]:
         text: The input string to analyze (e.g., an issue description).
 
     Returns:
-        The name of the matched department, or None if no keyword is found.
+        The name of the best-scoring department, or None if no keyword is found.
     """
-    if not text:
-        return None
-    t = text.lower()
-    for kw, dept in KEYWORD_MAP.items():
-        if kw in t:
-            return dept
-    return None
+    ranked = rank_departments(text)
+    return ranked[0]['department'] if ranked else None
+
+
+def routing_stats() -> Dict[str, Any]:
+    """Returns the size and build time of the active rule set."""
+    _get_automaton()
+    return {
+        'rules': _state['rules'],
+        'states': len(_state['automaton'].goto),
+        'build_ms': _state['build_ms'],
+        'db_version': _state['db_version'],
+    }
 
 
 def map_department_name_to_id(departments: Dict[str, str], name: str) -> Optional[str]:
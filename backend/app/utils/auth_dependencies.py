@@ -1,14 +1,99 @@
 from fastapi import HTTPException, Header
 from typing import Optional, Dict, Any
+import hashlib
+import logging
+import time
+from jose import jwt, JWTError
+from ..config import settings
 from ..db.supabase_client import auth_request
+from .cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+# Validated tokens keyed by SHA-256 of the token; entries expire with the token.
+_token_cache = LRUCache(maxsize=settings.JWT_CACHE_SIZE)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _local_verify_enabled() -> bool:
+    """Local verification needs a real secret; without one, tokens are checked remotely."""
+    return bool(settings.JWT_LOCAL_VERIFY and settings.JWT_SECRET)
+
+
+if settings.JWT_LOCAL_VERIFY and not settings.JWT_SECRET:
+    logger.warning('JWT_SECRET is not set; access tokens are verified with Supabase Auth on every cache miss')
+
+
+def _normalize_user(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a Supabase user object (or JWT claims) to the normalized user dictionary."""
+    # Normalize role claim (supabase uses app_metadata or user_metadata; tests expect 'role')
+    role = data.get('role') or (data.get('user_metadata') or {}).get('role') or (data.get('app_metadata') or {}).get('role') or 'citizen'
+    return {
+        'id': data.get('id') or data.get('sub'),
+        'email': data.get('email'),
+        'role': role,
+        'raw': data
+    }
+
+
+def _decode_locally(token: str) -> Optional[Dict[str, Any]]:
+    """Verifies the token signature, expiry and audience against the configured JWT secret.
+
+    Returns:
+        The token claims, or None if the token is invalid or expired.
+    """
+    try:
+        return jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            audience=settings.JWT_AUDIENCE,
+            options={
+                'verify_aud': bool(settings.JWT_AUDIENCE),
+                'require_aud': bool(settings.JWT_AUDIENCE),
+                'require_exp': True,
+                'require_sub': True,
+            },
+        )
+    except JWTError:
+        return None
+
+
+async def _verify_remotely(token: str) -> Optional[Dict[str, Any]]:
+    """Asks Supabase Auth (`/auth/v1/user`) whether the token is still valid."""
+    res = await auth_request('GET', '/user', token=token)
+    status = res.get('status_code') if isinstance(res, dict) else None
+    if status != 200:
+        return None
+    return res.get('data') or {}
+
+
+def invalidate_token(token: str) -> None:
+    """Drops a token from the validated-token cache (e.g. on logout)."""
+    _token_cache.delete(_token_key(token))
+
+
+def token_cache_stats() -> Dict[str, Any]:
+    """Returns hit/miss statistics of the validated-token cache."""
+    return _token_cache.stats()
 
 
 async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
     """FastAPI dependency to get the current user from a Supabase access token.
 
-    This function validates a Supabase JWT passed in the Authorization header
-    by calling the Supabase `/auth/v1/user` endpoint. It returns a normalized
-    user dictionary.
+    When `JWT_SECRET` is set, the token is verified locally against
+    `JWT_SECRET`/`JWT_ALGORITHM` and `JWT_AUDIENCE`, so no upstream call is
+    needed per request. Verified users are kept in a bounded LRU keyed by the
+    token hash until the token expires. With `JWT_REMOTE_VERIFY` enabled, a
+    cache miss is additionally confirmed with Supabase `/auth/v1/user` and
+    cached for at most `JWT_REMOTE_RECHECK_SECONDS`, so revoked sessions are
+    rejected. Without a secret, or with `JWT_LOCAL_VERIFY` disabled, every
+    cache miss is verified remotely.
 
     Args:
         authorization: The 'Authorization' header string, expected to contain
@@ -16,7 +101,7 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[
 
     Returns:
         A dictionary containing the normalized user information, including 'id',
-        'email', 'role', and the raw user data from Supabase.
+        'email', 'role', and the raw user data (or token claims) from Supabase.
 
     Raises:
         HTTPException(401): If the Authorization header is missing, or if the
@@ -27,20 +112,28 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Dict[
 
     token = authorization.split(' ', 1)[1] if authorization.startswith('Bearer ') else authorization
 
-    res = await auth_request('GET', '/user', token=token)
-    status = res.get('status_code') if isinstance(res, dict) else None
+    key = _token_key(token)
+    cached = _token_cache.get(key)
+    if cached is not None:
+        return cached
 
-    if status != 200:
-        raise HTTPException(status_code=401, detail='Invalid or expired token')
+    now = time.time()
+    expires_at = None
+    data = None
+    local = _local_verify_enabled()
+    if local:
+        claims = _decode_locally(token)
+        if claims is None:
+            raise HTTPException(status_code=401, detail='Invalid or expired token')
+        data = claims
+        expires_at = claims.get('exp')
+    if settings.JWT_REMOTE_VERIFY or not local:
+        data = await _verify_remotely(token)
+        if data is None:
+            raise HTTPException(status_code=401, detail='Invalid or expired token')
+        recheck_at = now + settings.JWT_REMOTE_RECHECK_SECONDS
+        expires_at = min(expires_at, recheck_at) if expires_at else recheck_at
 
-    data = res.get('data') or {}
-    # Normalize role claim (supabase uses app_metadata or user_metadata; tests expect 'role')
-    role = data.get('role') or (data.get('user_metadata') or {}).get('role') or (data.get('app_metadata') or {}).get('role') or 'citizen'
-    normalized = {
-        'id': data.get('id'),
-        'email': data.get('email'),
-        'role': role,
-        'raw': data
-    }
+    normalized = _normalize_user(data)
+    _token_cache.set(key, normalized, expires_at=float(expires_at) if expires_at else now + settings.JWT_REMOTE_RECHECK_SECONDS)
     return normalized
-
@@ -0,0 +1,71 @@
+"""A small bounded LRU cache with per-entry expiry.
+
+Used for in-process caches that must not grow without bound, such as the
+validated-token cache in `auth_dependencies`. The cache is meant to be used
+from the event loop thread and does no locking.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """Least-recently-used mapping with a maximum size and optional expiry.
+
+    Each entry may carry an absolute expiry timestamp (`time.time()` based);
+    expired entries are treated as misses and dropped on access. When the
+    cache is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = max(1, int(maxsize))
+        self._data: 'OrderedDict[Hashable, Tuple[Any, Optional[float]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value for `key`, or `default` if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """Stores `value` under `key` until `expires_at` (None means no expiry)."""
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Removes `key` if present."""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
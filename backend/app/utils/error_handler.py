@@ -24,7 +24,8 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
     """Handles FastAPI's `HTTPException`.
 
     This handler catches `HTTPException` and formats it into a JSON response
-    with the corresponding status code and detail message.
+    with the corresponding status code and detail message. Headers set on
+    the exception (such as `Retry-After` on 429) are passed through.
 
     Args:
         request: The incoming request object.
@@ -34,7 +35,7 @@ async def http_exception_handler(request: Request, exc: HTTPException) -> JSONRe
         A `JSONResponse` with the exception's status code and detail.
     """
     detail = exc.detail if hasattr(exc, 'detail') else str(exc)
-    return JSONResponse(status_code=exc.status_code, content={"error": detail})
+    return JSONResponse(status_code=exc.status_code, content={"error": detail}, headers=getattr(exc, 'headers', None))
 
 
 async def generic_exception_handler(request: Request, exc: Exception) -> JSONResponse:
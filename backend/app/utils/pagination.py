@@ -0,0 +1,73 @@
+"""Opaque keyset cursors for paginating ordered PostgREST queries.
+
+Issues are listed newest first, ordered by `(created_at, id)`. Instead of an
+offset, a cursor encodes the sort key of the last row on the previous page, and
+the next page is fetched with a filter that starts strictly after it. Every
+page therefore costs the same index range scan, no matter how deep it is.
+"""
+import base64
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+KEYSET_ORDER_DESC = 'created_at.desc,id.desc'
+KEYSET_ORDER_ASC = 'created_at.asc,id.asc'
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client-supplied cursor cannot be decoded."""
+
+
+def encode_cursor(row: Dict[str, Any]) -> Optional[str]:
+    """Builds an opaque cursor pointing just past the given row.
+
+    Args:
+        row: The last row of a page. Must contain `created_at` and `id`.
+
+    Returns:
+        A URL-safe cursor string, or None if the row lacks a sort key.
+    """
+    created_at = row.get('created_at')
+    row_id = row.get('id')
+    if not created_at or row_id is None:
+        return None
+    raw = json.dumps([str(created_at), str(row_id)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decodes a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor: The opaque cursor string.
+
+    Returns:
+        A `(created_at, id)` tuple.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+
+def keyset_filter(created_at: str, row_id: str, descending: bool = True, column: str = 'created_at') -> Dict[str, str]:
+    """Returns a PostgREST filter selecting rows strictly after a `(created_at, id)` key.
+
+    Args:
+        created_at: The `created_at` value of the last row already seen.
+        row_id: The `id` of the last row already seen.
+        descending: Whether the listing is ordered newest first.
+        column: The timestamp column of the key, for listings ordered by
+            another column such as `updated_at`.
+
+    Returns:
+        A filters dictionary suitable for `supabase_request`.
+    """
+    op = 'lt' if descending else 'gt'
+    # values are double-quoted so timestamps with ':' and '+' survive the or=() syntax
+    return {'or': f'({column}.{op}."{created_at}",and({column}.eq."{created_at}",id.{op}.{row_id}))'}
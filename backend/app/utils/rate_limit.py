@@ -0,0 +1,162 @@
+"""Per-user submission rate limiting.
+
+Submitting an issue or a comment triggers uploads, moderation and database
+writes, so each user may only make `limit` submissions of a kind per
+`RATE_LIMIT_WINDOW_SECONDS`. Limits are enforced by a FastAPI dependency
+(`rate_limit('issues')`) that runs before the route body does any work.
+
+Counting uses the sliding-window counter approximation: per user and action
+only the counts of the current and the previous fixed window are kept, and
+the rate is `previous * (1 - elapsed / window) + current`. That is O(1)
+memory per active user. State lives in an `LRUCache` bounded by
+`RATE_LIMIT_MAX_KEYS` whose entries expire two windows after the last hit,
+so idle users are evicted.
+
+With `RATE_LIMIT_SHARED_PATH` set, counters are kept in a node-local SQLite
+file instead (see `db/local_store.py`), so all workers on a host share one
+budget per user.
+
+Over the limit, requests are rejected with 429 and `Retry-After`. With
+`RATE_LIMIT_MAX_WAIT_SECONDS` > 0, a request that would be allowed within
+that time is delayed instead of rejected.
+"""
+import asyncio
+import math
+import time
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Depends, HTTPException
+from ..config import settings
+from ..db.local_store import LocalStore, transaction
+from .auth_dependencies import get_current_user
+from .cache import LRUCache
+
+
+_SCHEMA = (
+    '''create table if not exists rate_limits (
+        key text primary key,
+        window_start real not null,
+        previous integer not null,
+        current integer not null,
+        updated_at real not null
+    )''',
+    'create index if not exists rate_limits_updated_at on rate_limits (updated_at)',
+)
+
+_counters = LRUCache(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+_store: Optional[LocalStore] = LocalStore(settings.RATE_LIMIT_SHARED_PATH, _SCHEMA) if settings.RATE_LIMIT_SHARED_PATH else None
+_stats = {'allowed': 0, 'rejected': 0, 'delayed': 0}
+_purged = {'at': 0.0}
+
+
+def _limits() -> Dict[str, int]:
+    return {'issues': settings.RATE_LIMIT_ISSUES, 'comments': settings.RATE_LIMIT_COMMENTS}
+
+
+def _advance(state: Tuple[float, int, int], now: float, window: float) -> Tuple[float, int, int]:
+    """Rolls `(window_start, previous, current)` forward to the window containing `now`."""
+    start, previous, current = state
+    elapsed_windows = int((now - start) // window)
+    if elapsed_windows == 1:
+        return start + window, current, 0
+    if elapsed_windows > 1:
+        return start + elapsed_windows * window, 0, 0
+    return state
+
+
+def _check(state: Optional[Tuple[float, int, int]], now: float, window: float, limit: int) -> Tuple[Tuple[float, int, int], float]:
+    """Counts a hit if allowed.
+
+    Returns:
+        The new state and 0.0 if the hit was counted, otherwise the unchanged
+        (advanced) state and the number of seconds until it would be allowed.
+    """
+    if state is None:
+        state = (now - now % window, 0, 0)
+    start, previous, current = _advance(state, now, window)
+    elapsed = now - start
+    rate = previous * (1.0 - elapsed / window) + current
+    if rate + 1 <= limit:
+        return (start, previous, current + 1), 0.0
+    if current + 1 <= limit and previous:
+        # wait until enough of the previous window has slid out
+        wait = (rate + 1 - limit) / previous * window
+    else:
+        # the current window alone is over budget; wait into the next one
+        wait = (window - elapsed) + (window * (1.0 - (limit - 1) / current) if current else 0.0)
+    return (start, previous, current), max(wait, 0.001)
+
+
+def _hit_local(key: str, now: float, window: float, limit: int) -> float:
+    new_state, wait = _check(_counters.get(key), now, window, limit)
+    _counters.set(key, new_state, expires_at=new_state[0] + 2 * window)
+    return wait
+
+
+def _hit_shared(conn, key: str, now: float, window: float, limit: int) -> float:
+    row = conn.execute('select window_start, previous, current from rate_limits where key = ?', (key,)).fetchone()
+    state = (row['window_start'], row['previous'], row['current']) if row else None
+    (start, previous, current), wait = _check(state, now, window, limit)
+    conn.execute(
+        'insert into rate_limits (key, window_start, previous, current, updated_at) values (?, ?, ?, ?, ?) '
+        'on conflict(key) do update set window_start = excluded.window_start, previous = excluded.previous, '
+        'current = excluded.current, updated_at = excluded.updated_at',
+        (key, start, previous, current, now),
+    )
+    # evict idle users now and then
+    if now - _purged['at'] > window:
+        conn.execute('delete from rate_limits where updated_at < ?', (now - 2 * window,))
+        _purged['at'] = now
+    return wait
+
+
+async def hit(action: str, user_key: str) -> float:
+    """Records a submission attempt.
+
+    Args:
+        action: The limited action, `'issues'` or `'comments'`.
+        user_key: Identifies the submitter, normally the user ID.
+
+    Returns:
+        0.0 if the submission is allowed (and counted), otherwise the number
+        of seconds until it would be allowed.
+    """
+    limit = _limits().get(action, 0)
+    if not settings.RATE_LIMIT_ENABLED or limit <= 0:
+        return 0.0
+    window = float(settings.RATE_LIMIT_WINDOW_SECONDS)
+    key = f'{action}:{user_key}'
+    now = time.time()
+    if _store is None:
+        return _hit_local(key, now, window, limit)
+    return await _store.run(lambda conn: transaction(conn, lambda c: _hit_shared(c, key, now, window, limit)))
+
+
+def rate_limit(action: str):
+    """Builds a FastAPI dependency enforcing the per-user limit for `action`.
+
+    The dependency returns the current user, so routes can use it in place of
+    `get_current_user`.
+    """
+    async def dependency(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+        user_key = str(user.get('id') or user.get('email') or 'anonymous')
+        wait = await hit(action, user_key)
+        if wait and wait <= settings.RATE_LIMIT_MAX_WAIT_SECONDS:
+            _stats['delayed'] += 1
+            await asyncio.sleep(wait)
+            wait = await hit(action, user_key)
+        if wait:
+            _stats['rejected'] += 1
+            raise HTTPException(
+                status_code=429,
+                detail='Too many submissions, please try again later',
+                headers={'Retry-After': str(max(1, math.ceil(wait)))},
+            )
+        _stats['allowed'] += 1
+        return user
+
+    return dependency
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Returns allowed/rejected/delayed counters and the tracked key count."""
+    return dict(_stats, tracked_keys=len(_counters), shared=_store is not None)
@@ -0,0 +1,60 @@
+"""Benchmark for the hotspot clustering.
+
+Generates 500 Gaussian clusters of issue locations over a 40 km x 40 km city
+plus 2% uniform background noise, and times parsing and clustering. The clustering
+time should grow roughly linearly with the number of points. Run from the
+backend directory:
+
+    python -m benchmarks.bench_hotspots [--max-points N]
+"""
+import argparse
+import time
+import numpy as np
+from app.services import hotspots
+
+
+def _points(n: int, rng: np.random.Generator):
+    centres = rng.uniform([12.80, 77.45], [13.16, 77.82], size=(500, 2))
+    clustered = int(n * 0.98)
+    which = rng.integers(0, len(centres), clustered)
+    spread = rng.uniform(0.0005, 0.003, len(centres))[which, None]
+    pts = centres[which] + rng.normal(size=(clustered, 2)) * spread
+    noise = rng.uniform([12.80, 77.45], [13.16, 77.82], size=(n - clustered, 2))
+    pts = np.vstack([pts, noise])
+    return pts[:, 0], pts[:, 1]
+
+
+def _best(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Time hotspot clustering on synthetic locations.')
+    parser.add_argument('--max-points', type=int, default=1_000_000)
+    parser.add_argument('--radius', type=float, default=250.0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+    print(f"{'points':>9} {'parse ms':>9} {'cluster ms':>11} {'summary ms':>11} {'hotspots':>9} {'noise':>8}")
+    n = 10_000
+    while n <= args.max_points:
+        lat, lon = _points(n, rng)
+        rows = [{'id': str(i), 'location': f'{a:.6f},{b:.6f}'} for i, (a, b) in enumerate(zip(lat.tolist(), lon.tolist()))]
+        parse_ms = _best(lambda: hotspots.parse_locations(rows), 1)
+        ids, lat, lon = hotspots.parse_locations(rows)
+        # keep the density threshold proportional to the data volume
+        min_points = max(5, n // 10_000)
+        repeat = 3 if n <= 100_000 else 1
+        cluster_ms = _best(lambda: hotspots.cluster(lat, lon, args.radius, min_points), repeat)
+        labels = hotspots.cluster(lat, lon, args.radius, min_points)
+        summary_ms = _best(lambda: hotspots.summarize(ids, lat, lon, labels), repeat)
+        print(f'{n:>9} {parse_ms:>9.1f} {cluster_ms:>11.1f} {summary_ms:>11.1f} {int(labels.max()) + 1:>9} {int((labels < 0).sum()):>8}')
+        n *= 10
+
+
+if __name__ == '__main__':
+    main()
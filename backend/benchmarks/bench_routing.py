@@ -0,0 +1,46 @@
+"""Micro-benchmark for the department routing matcher.
+
+Shows that matching time grows with the length of the text, not with the
+number of keywords. Run from the backend directory:
+
+    python -m benchmarks.bench_routing
+"""
+import random
+import string
+import time
+from app.services import routing_engine
+
+
+def _word(rng: random.Random) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def _rules(n: int, rng: random.Random):
+    departments = [f'Department {i}' for i in range(20)]
+    return [(_word(rng), rng.choice(departments), rng.uniform(0.5, 3.0), rng.random() < 0.3) for _ in range(n)]
+
+
+def _time(text: str, repeat: int = 20) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        routing_engine.rank_departments(text)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    rng = random.Random(42)
+    text_words = [_word(rng) for _ in range(4000)]
+    print(f"{'keywords':>9} {'build ms':>9} {'200 chars':>12} {'2k chars':>12} {'20k chars':>12}")
+    for n in (10, 1_000, 10_000, 50_000):
+        rules = _rules(n, rng)
+        routing_engine.load_rules(rules)
+        build_ms = routing_engine.routing_stats()['build_ms']
+        timings = []
+        for length in (200, 2_000, 20_000):
+            text = ' '.join(text_words)[:length]
+            timings.append(_time(text))
+        print(f'{n:>9} {build_ms:>9.1f} ' + ' '.join(f'{t:>9.1f} us' for t in timings))
+
+
+if __name__ == '__main__':
+    main()
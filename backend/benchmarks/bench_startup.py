@@ -0,0 +1,61 @@
+"""Startup benchmark for the API process.
+
+Measures, in fresh interpreter processes:
+
+-   the time to `import app.main`,
+-   the time from interpreter start to the first `/health` response
+    (lifespan startup included), and
+-   the time until `/health/ready` reports all models loaded.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_startup [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_PROBE = r'''
+import json, time
+t0 = time.perf_counter()
+import app.main
+t_import = time.perf_counter() - t0
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get('/health')
+    t_first = time.perf_counter() - t0
+    while client.get('/health/ready').status_code != 200:
+        time.sleep(0.005)
+    t_ready = time.perf_counter() - t0
+print(json.dumps({'import': t_import, 'first_request': t_first, 'ready': t_ready}))
+'''
+
+
+def _run_once(env: dict) -> dict:
+    out = subprocess.run([sys.executable, '-c', _PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Measure import time and time-to-first-request of app.main.')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.getcwd(),
+            JOB_QUEUE_PATH=os.path.join(tmp, 'jobs.sqlite3'),
+            IMAGE_INDEX_PATH=os.path.join(tmp, 'image_index.sqlite3'),
+        )
+        runs = [_run_once(env) for _ in range(args.runs)]
+    for key in ('import', 'first_request', 'ready'):
+        values = [r[key] * 1000.0 for r in runs]
+        print(f'{key:>14}: median {statistics.median(values):7.1f} ms   min {min(values):7.1f} ms   max {max(values):7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
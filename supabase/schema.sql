@@ -29,9 +29,12 @@ COMMENT ON TABLE profiles IS 'Stores application-specific user profile data, lin
 create table if not exists departments (
   id uuid primary key default gen_random_uuid(),
   name text unique not null,
-  description text
+  description text,
+  routing_keywords jsonb default '{}'::jsonb
 );
+alter table departments add column if not exists routing_keywords jsonb default '{}'::jsonb;
 COMMENT ON TABLE departments IS 'Defines the municipal departments to which issues can be assigned.';
+COMMENT ON COLUMN departments.routing_keywords IS 'Routing rules as {"keyword": weight}; a trailing * on a keyword matches it as a prefix.';
 
 
 -- Issues: images stored as JSONB array of objects {url, public_id}
@@ -45,15 +48,69 @@ create table if not exists issues (
   status text default 'pending',
   created_at timestamptz default now(),
   updated_at timestamptz default now(),
+  changed_at timestamptz default now(),
   resolved_at timestamptz,
   user_id uuid references users(id) on delete set null,
-  department_id uuid references departments(id) on delete set null
+  department_id uuid references departments(id) on delete set null,
+  moderation_score real,
+  moderation_flagged boolean default false,
+  moderation_reasons text[],
+  moderated_at timestamptz
 );
+alter table issues add column if not exists moderation_score real;
+alter table issues add column if not exists moderation_flagged boolean default false;
+alter table issues add column if not exists moderation_reasons text[];
+alter table issues add column if not exists moderated_at timestamptz;
+alter table issues add column if not exists changed_at timestamptz default now();
 COMMENT ON TABLE issues IS 'The core table for tracking civic issues reported by users.';
 COMMENT ON COLUMN issues.status IS 'The current status of the issue (e.g., pending, assigned, resolved).';
 COMMENT ON COLUMN issues.images IS 'A JSONB array of image objects, each with a URL and a public ID for services like Cloudinary.';
 COMMENT ON COLUMN issues.user_id IS 'Foreign key linking to the user who reported the issue.';
 COMMENT ON COLUMN issues.department_id IS 'Foreign key linking to the department responsible for the issue.';
+COMMENT ON COLUMN issues.updated_at IS 'Version of the issue for If-Match; background writes (moderation verdicts, automatic routing) leave it alone.';
+COMMENT ON COLUMN issues.changed_at IS 'Time of the last change to any column the analytics snapshot reads, including automatic routing.';
+COMMENT ON COLUMN issues.moderation_flagged IS 'Set by the re-moderation job (python -m app.cli.remoderate) when the spam score reaches MODERATION_THRESHOLD.';
+-- Supports keyset pagination of GET /issues ordered by (created_at, id) newest first.
+create index if not exists issues_created_at_id_idx on issues (created_at desc, id desc);
+-- Supports the delta refresh of the backend's analytics snapshot (rows changed since a watermark).
+drop index if exists issues_updated_at_id_idx;
+create index if not exists issues_changed_at_id_idx on issues (changed_at, id);
+
+-- Maintains updated_at and changed_at for every writer (bulk PATCHes, SQL editor),
+-- not only update_issue_with_notification. updated_at is the version clients send
+-- in If-Match, so it does not move for background writes: moderation verdicts from
+-- app.cli.remoderate, and the routing job's first department assignment (a write
+-- that fills a null department_id without setting updated_at itself). changed_at
+-- moves for every change except the moderation columns, which the analytics
+-- snapshot does not read, so its delta refresh still sees routed departments.
+create or replace function issues_touch_updated_at() returns trigger
+language plpgsql
+as $$
+declare
+  system_columns constant text[] := array[
+    'moderation_score', 'moderation_flagged', 'moderation_reasons', 'moderated_at', 'updated_at', 'changed_at'
+  ];
+begin
+  if (to_jsonb(new) - system_columns) is not distinct from (to_jsonb(old) - system_columns) then
+    new.updated_at := old.updated_at;
+    new.changed_at := old.changed_at;
+    return new;
+  end if;
+  new.changed_at := now();
+  if old.department_id is null
+     and new.updated_at is not distinct from old.updated_at
+     and (to_jsonb(new) - system_columns - 'department_id') is not distinct from (to_jsonb(old) - system_columns - 'department_id') then
+    return new;
+  end if;
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists issues_touch_updated_at on issues;
+create trigger issues_touch_updated_at
+  before update on issues
+  for each row execute function issues_touch_updated_at();
 
 
 -- Comments on issues
@@ -62,10 +119,21 @@ create table if not exists comments (
   issue_id uuid references issues(id) on delete cascade,
   user_id uuid references users(id) on delete set null,
   text text,
-  created_at timestamptz default now()
+  created_at timestamptz default now(),
+  moderation_score real,
+  moderation_flagged boolean default false,
+  moderation_reasons text[],
+  moderated_at timestamptz
 );
+alter table comments add column if not exists moderation_score real;
+alter table comments add column if not exists moderation_flagged boolean default false;
+alter table comments add column if not exists moderation_reasons text[];
+alter table comments add column if not exists moderated_at timestamptz;
 COMMENT ON TABLE comments IS 'Stores comments made by users or staff on a specific issue.';
 COMMENT ON COLUMN comments.issue_id IS 'Foreign key linking to the issue being commented on.';
+COMMENT ON COLUMN comments.moderation_flagged IS 'Set by the re-moderation job (python -m app.cli.remoderate) when the spam score reaches MODERATION_THRESHOLD.';
+-- Supports the keyset scan of the re-moderation job ordered by (created_at, id).
+create index if not exists comments_created_at_id_idx on comments (created_at, id);
 
 
 -- Devices registered for push notifications
@@ -112,6 +180,305 @@ create table if not exists faq (
 COMMENT ON TABLE faq IS 'Stores questions and answers for the Frequently Asked Questions feature.';
 
 
+-- Atomic issue update used by PATCH /issues/{id}, /assign and /resolve.
+-- Applies the changes, maintains updated_at/resolved_at, records a status-change
+-- notification for the reporter and returns the old and new row in one round trip.
+-- When p_expected_updated_at is given, the update only happens if the row was not
+-- modified since (optimistic concurrency); otherwise status 'conflict' is returned.
+create or replace function update_issue_with_notification(
+  p_issue_id uuid,
+  p_changes jsonb,
+  p_expected_updated_at timestamptz default null
+) returns jsonb
+language plpgsql
+as $$
+declare
+  old_row issues%rowtype;
+  new_row issues%rowtype;
+  new_status text;
+begin
+  select * into old_row from issues where id = p_issue_id for update;
+  if not found then
+    return jsonb_build_object('status', 'not_found');
+  end if;
+  if p_expected_updated_at is not null and old_row.updated_at is distinct from p_expected_updated_at then
+    return jsonb_build_object('status', 'conflict', 'old', to_jsonb(old_row));
+  end if;
+
+  new_status := coalesce(p_changes->>'status', old_row.status);
+  update issues set
+    title = case when p_changes ? 'title' then p_changes->>'title' else title end,
+    description = case when p_changes ? 'description' then p_changes->>'description' else description end,
+    location = case when p_changes ? 'location' then p_changes->>'location' else location end,
+    category = case when p_changes ? 'category' then p_changes->>'category' else category end,
+    department_id = case when p_changes ? 'department_id' then (p_changes->>'department_id')::uuid else department_id end,
+    status = new_status,
+    resolved_at = case
+      when new_status = 'resolved' and old_row.status is distinct from 'resolved' then now()
+      when new_status <> 'resolved' then null
+      else resolved_at
+    end,
+    updated_at = now()
+  where id = p_issue_id
+  returning * into new_row;
+
+  if new_row.status is distinct from old_row.status and old_row.user_id is not null then
+    insert into notifications (user_id, title, body, metadata)
+    values (
+      old_row.user_id,
+      'Issue status updated',
+      format('Your issue status changed from %s to %s', old_row.status, new_row.status),
+      jsonb_build_object('issue_id', p_issue_id, 'old_status', old_row.status, 'new_status', new_row.status)
+    );
+  end if;
+
+  return jsonb_build_object('status', 'ok', 'old', to_jsonb(old_row), 'new', to_jsonb(new_row));
+end;
+$$;
+COMMENT ON FUNCTION update_issue_with_notification(uuid, jsonb, timestamptz) IS 'Updates an issue, maintains updated_at/resolved_at and inserts the status-change notification atomically; returns the old and new row.';
+
+
+
+-- Daily issue rollups read by the admin analytics endpoints (through issue_daily_counts below).
+-- One row per (creation day in UTC, current status, current department). Counts
+-- are kept up to date by a trigger on issues: every insert, delete or relevant
+-- update subtracts the old row's contribution and adds the new one, so the
+-- endpoints read a few rows per day instead of scanning the issues table.
+-- Issues without a department are stored under the nil UUID.
+create table if not exists issue_daily_stats (
+  day date not null,
+  status text not null,
+  department_id uuid not null,
+  issues_count integer not null default 0,
+  primary key (day, status, department_id)
+);
+COMMENT ON TABLE issue_daily_stats IS 'Daily rollup of issues by creation day, status and department, maintained by the issues_daily_stats trigger.';
+
+create or replace function issue_daily_stats_apply(
+  p_created_at timestamptz,
+  p_status text,
+  p_department_id uuid,
+  p_sign integer
+) returns void
+language plpgsql
+as $$
+begin
+  if p_created_at is null then
+    return;
+  end if;
+  insert into issue_daily_stats as s (day, status, department_id, issues_count)
+  values (
+    (p_created_at at time zone 'utc')::date,
+    coalesce(p_status, ''),
+    coalesce(p_department_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    p_sign
+  )
+  on conflict (day, status, department_id) do update set
+    issues_count = s.issues_count + excluded.issues_count;
+end;
+$$;
+
+create or replace function issue_daily_stats_trigger() returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform issue_daily_stats_apply(old.created_at, old.status, old.department_id, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform issue_daily_stats_apply(new.created_at, new.status, new.department_id, 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists issues_daily_stats on issues;
+create trigger issues_daily_stats
+  after insert or delete or update of created_at, status, department_id on issues
+  for each row execute function issue_daily_stats_trigger();
+
+-- resolution times moved to issue_resolution_histograms; nothing reads these any more
+drop function if exists issue_daily_stats_apply(timestamptz, text, uuid, timestamptz, integer);
+alter table issue_daily_stats drop column if exists resolved_count;
+alter table issue_daily_stats drop column if exists resolution_seconds;
+
+-- Rebuilds the rollup from scratch, e.g. after installing the trigger on an existing database.
+create or replace function refresh_issue_daily_stats() returns void
+language plpgsql
+as $$
+begin
+  lock table issues in share mode;
+  delete from issue_daily_stats;
+  insert into issue_daily_stats (day, status, department_id, issues_count)
+  select
+    (created_at at time zone 'utc')::date,
+    coalesce(status, ''),
+    coalesce(department_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    count(*)
+  from issues
+  where created_at is not null
+  group by 1, 2, 3;
+end;
+$$;
+select refresh_issue_daily_stats();
+
+-- Sums the rollup per day on the server for issues_by_day, so the backend reads
+-- one JSON value ({"<day>": count}) instead of days x statuses x departments rows,
+-- which PostgREST's max-rows would silently truncate for long windows.
+create or replace function issue_daily_counts(
+  p_since date,
+  p_department_id uuid default null,
+  p_status text default null
+) returns jsonb
+language sql
+stable
+as $$
+  select coalesce(jsonb_object_agg(d.day, d.issues_count), '{}'::jsonb)
+  from (
+    select day, sum(issues_count) as issues_count
+    from issue_daily_stats
+    where day >= p_since
+      and (p_department_id is null or department_id = p_department_id)
+      and (p_status is null or status = p_status)
+    group by day
+  ) d;
+$$;
+COMMENT ON FUNCTION issue_daily_counts(date, uuid, text) IS 'Issues created per UTC day since p_since, optionally for one department and status.';
+
+
+-- Resolution-time histograms read by GET /admin/analytics/response-times
+-- (through issue_resolution_histogram_merge below).
+-- A log-bucketed (DDSketch-style) histogram per creation day, department and
+-- category: an issue resolved after t seconds is counted in bucket
+-- ceil(ln(max(t, 1)) / ln(gamma)) with gamma = 1.01 / 0.99, so any quantile
+-- read back from the buckets is within 1% of the true value. Histograms of
+-- different days, departments and categories are merged by adding counts.
+-- The backend constant SKETCH_RELATIVE_ACCURACY (services/analytics.py) must match.
+create table if not exists issue_resolution_histograms (
+  day date not null,
+  department_id uuid not null,
+  category text not null,
+  bucket integer not null,
+  count integer not null default 0,
+  total_seconds double precision not null default 0,
+  primary key (day, department_id, category, bucket)
+);
+COMMENT ON TABLE issue_resolution_histograms IS 'Log-bucketed histograms of issue resolution times by creation day, department and category, maintained by the issues_resolution_histogram trigger.';
+
+create or replace function issue_resolution_histogram_apply(
+  p_created_at timestamptz,
+  p_resolved_at timestamptz,
+  p_department_id uuid,
+  p_category text,
+  p_sign integer
+) returns void
+language plpgsql
+as $$
+declare
+  seconds double precision;
+begin
+  if p_created_at is null or p_resolved_at is null then
+    return;
+  end if;
+  seconds := greatest(extract(epoch from p_resolved_at - p_created_at), 0);
+  insert into issue_resolution_histograms as h (day, department_id, category, bucket, count, total_seconds)
+  values (
+    (p_created_at at time zone 'utc')::date,
+    coalesce(p_department_id, '00000000-0000-0000-0000-000000000000'::uuid),
+    coalesce(p_category, ''),
+    ceil(ln(greatest(seconds, 1)) / ln(1.01 / 0.99))::integer,
+    p_sign,
+    p_sign * seconds
+  )
+  on conflict (day, department_id, category, bucket) do update set
+    count = h.count + excluded.count,
+    total_seconds = h.total_seconds + excluded.total_seconds;
+end;
+$$;
+
+create or replace function issue_resolution_histogram_trigger() returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform issue_resolution_histogram_apply(old.created_at, old.resolved_at, old.department_id, old.category, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform issue_resolution_histogram_apply(new.created_at, new.resolved_at, new.department_id, new.category, 1);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists issues_resolution_histogram on issues;
+create trigger issues_resolution_histogram
+  after insert or delete or update of created_at, resolved_at, department_id, category on issues
+  for each row execute function issue_resolution_histogram_trigger();
+
+-- Rebuilds the histograms from scratch, e.g. after installing the trigger on an existing database.
+create or replace function refresh_issue_resolution_histograms() returns void
+language plpgsql
+as $$
+begin
+  lock table issues in share mode;
+  delete from issue_resolution_histograms;
+  insert into issue_resolution_histograms (day, department_id, category, bucket, count, total_seconds)
+  select day, department_id, category, bucket, count(*), sum(seconds)
+  from (
+    select
+      (created_at at time zone 'utc')::date as day,
+      coalesce(department_id, '00000000-0000-0000-0000-000000000000'::uuid) as department_id,
+      coalesce(category, '') as category,
+      greatest(extract(epoch from resolved_at - created_at), 0) as seconds
+    from issues
+    where created_at is not null and resolved_at is not null
+  ) resolved
+  cross join lateral (select ceil(ln(greatest(seconds, 1)) / ln(1.01 / 0.99))::integer as bucket) b
+  group by 1, 2, 3, 4;
+end;
+$$;
+select refresh_issue_resolution_histograms();
+
+-- Merges the histograms of a window on the server, so the backend reads one value
+-- instead of every (day, department, category, bucket) row, which PostgREST's
+-- max-rows would silently truncate. Returns a JSON array with one element per
+-- group: {"key", "buckets": {"<bucket>": count}, "count", "total_seconds"}.
+-- p_group_by is 'department', 'category' or null (one group, key '').
+create or replace function issue_resolution_histogram_merge(
+  p_since date,
+  p_department_id uuid default null,
+  p_category text default null,
+  p_group_by text default null
+) returns jsonb
+language sql
+stable
+as $$
+  select coalesce(jsonb_agg(jsonb_build_object(
+    'key', g.key,
+    'buckets', g.buckets,
+    'count', g.count,
+    'total_seconds', g.total_seconds
+  )), '[]'::jsonb)
+  from (
+    select b.key, jsonb_object_agg(b.bucket, b.count) as buckets, sum(b.count) as count, sum(b.total_seconds) as total_seconds
+    from (
+      select
+        case p_group_by when 'department' then department_id::text when 'category' then category else '' end as key,
+        bucket,
+        sum(count) as count,
+        sum(total_seconds) as total_seconds
+      from issue_resolution_histograms
+      where day >= p_since
+        and (p_department_id is null or department_id = p_department_id)
+        and (p_category is null or category = p_category)
+      group by 1, 2
+      having sum(count) > 0
+    ) b
+    group by b.key
+  ) g;
+$$;
+COMMENT ON FUNCTION issue_resolution_histogram_merge(date, uuid, text, text) IS 'Merged resolution-time histograms of the window since p_since, per department, per category or overall.';
+
 -- =====================================================
 -- Seed data (canonical): departments, sample users, sample issue, device, comment
 -- This file is intended as the single source of truth for schema + optional seed data.